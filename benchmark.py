@@ -0,0 +1,491 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+from datetime import date, timedelta
+
+# Размеры синтетических документов по умолчанию
+BENCHMARK_SIZES = ("10K", "100K", "1M", "10M", "50M")
+# Число замеров для документов до 1 МБ; для больших документов замеров
+# меньше, но не меньше BENCHMARK_MIN_REPEAT
+BENCHMARK_REPEAT = 20
+BENCHMARK_MIN_REPEAT = 3
+# Число вкладок при замере восстановления сеанса
+BENCHMARK_TABS = (10, 100)
+# Предельное время ожидания фоновой операции, с
+BENCHMARK_TIMEOUT = 300
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+
+PLANTS = ("Фикус", "Монстера", "Сансевиерия", "Орхидея", "Хлорофитум", "Замиокулькас",
+          "Спатифиллум", "Алоэ", "Драцена", "Кактус")
+VALUES = ("раз в неделю", "200 мл", "18-24 °C", "умеренная", "рассеянный свет",
+          "комплексное", "весной", "листья желтеют", "паутинный клещ", "всё в порядке")
+
+# Перенаправлены ли настройки и данные приложения (isolate_settings)
+_settings_isolated = False
+
+SIZE_SUFFIXES = {"K": 1024, "M": 1024 * 1024, "G": 1024 * 1024 * 1024}
+
+
+def parse_size(text):
+    text = text.strip().upper().rstrip("B")
+    if text and text[-1] in SIZE_SUFFIXES:
+        return int(float(text[:-1]) * SIZE_SUFFIXES[text[-1]])
+    return int(text)
+
+
+def load_templates():
+    templates = {}
+    for name in sorted(os.listdir(TEMPLATES_DIR)):
+        if name.endswith(".md"):
+            with open(os.path.join(TEMPLATES_DIR, name), encoding='utf-8') as file:
+                templates[name[:-3]] = file.read()
+    return templates
+
+
+def fill_template(text, rng, day):
+    # Пустые поля шаблона заполняются случайными значениями, "..." - названием
+    lines = []
+    for line in text.split('\n'):
+        line = line.replace("...", rng.choice(PLANTS))
+        if line.startswith("## Дата:"):
+            line = f"## Дата: {day.strftime('%d.%m.%Y')}"
+        elif line.rstrip().endswith(":**"):
+            line = f"{line.rstrip()} {rng.choice(VALUES)}"
+        elif "![" in line:
+            line = "![Фото](img/photo.png)"
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+def generate_document(size, templates, seed=0):
+    # Карточка растения из шаблона info, за которой идут записи дневника
+    # и заметки, пока текст не достигнет size байт
+    rng = random.Random(seed)
+    day = date(2020, 1, 1)
+    parts = [fill_template(templates.get("info", ""), rng, day)]
+    total = len(parts[0].encode('utf-8'))
+    entry_templates = [templates[name] for name in ("diary", "notes") if name in templates]
+    while total < size:
+        day += timedelta(days=1)
+        text = fill_template(rng.choice(entry_templates), rng, day)
+        # У записей дневника заголовок первого уровня становится вторым
+        text = text.replace("# ", "## ", 1) if text.startswith("# ") else text
+        parts.append(text)
+        total += len(text.encode('utf-8')) + 2
+    return '\n\n'.join(parts)
+
+
+def format_size(size):
+    for suffix in ("G", "M", "K"):
+        if size >= SIZE_SUFFIXES[suffix] and size % SIZE_SUFFIXES[suffix] == 0:
+            return f"{size // SIZE_SUFFIXES[suffix]}{suffix}"
+    return str(size)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def reset_peak_memory():
+    # Сброс пика памяти процесса (Linux); при неудаче пик считается от старта
+    try:
+        with open("/proc/self/clear_refs", 'w') as file:
+            file.write("5")
+    except OSError:
+        pass
+
+
+def peak_memory():
+    # Пик резидентной памяти процесса, байт
+    try:
+        with open("/proc/self/status") as file:
+            for line in file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except ImportError:
+        return 0
+
+
+def isolate_settings(work_dir):
+    # Настройки, сеанс и индексы замера не смешиваются с данными
+    # пользователя на любой платформе: QStandardPaths переходит в тестовый
+    # режим, а QSettings - с реестра или plist на INI-файлы в рабочей папке.
+    # Вызывается до первого обращения к настройкам и сеансу
+    global _settings_isolated
+    from PyQt6.QtCore import QSettings, QStandardPaths
+    from session import app_data_dir
+
+    QStandardPaths.setTestModeEnabled(True)
+    QSettings.setDefaultFormat(QSettings.Format.IniFormat)
+    QSettings.setPath(QSettings.Format.IniFormat, QSettings.Scope.UserScope,
+                      os.path.join(work_dir, "config"))
+    # Каталог тестового режима общий для прогонов: данные прошлого замера удаляются
+    shutil.rmtree(app_data_dir(), ignore_errors=True)
+    _settings_isolated = True
+
+
+def settings_isolated():
+    from PyQt6.QtCore import QSettings
+    return _settings_isolated and QSettings.defaultFormat() == QSettings.Format.IniFormat
+
+
+class BenchmarkRunner:
+    # Замеры настоящих методов окна редактора на синтетических документах.
+    # Окно создается без экрана, диалоги подтверждения отвечают заранее
+    # заданной кнопкой
+    def __init__(self, work_dir, repeat=BENCHMARK_REPEAT):
+        from PyQt6.QtWidgets import QApplication, QMessageBox
+        from session import app_settings
+
+        # Замер очищает настройки и сеанс, поэтому без isolate_settings не запускается
+        if not settings_isolated():
+            raise RuntimeError("Настройки не перенаправлены: сначала вызовите isolate_settings")
+
+        self.work_dir = work_dir
+        self.project_dir = os.path.join(work_dir, "project")
+        os.makedirs(self.project_dir, exist_ok=True)
+        self.repeat = repeat
+        self.results = []
+        self.templates = load_templates()
+
+        self.application = QApplication.instance() or QApplication([])
+        self.answer = QMessageBox.StandardButton.Cancel
+        QMessageBox.question = staticmethod(lambda *args, **kwargs: self.answer)
+
+        settings = app_settings()
+        settings.clear()
+        # Превью обновляется без задержки, чтобы замерялась сама отрисовка
+        settings.setValue("preview_debounce_ms", 0)
+        settings.setValue("current_directory", self.project_dir)
+        settings.sync()
+
+    def repeat_count(self, size):
+        if size <= 1024 * 1024:
+            return self.repeat
+        return max(BENCHMARK_MIN_REPEAT, self.repeat * 1024 * 1024 // size)
+
+    def wait_until(self, predicate):
+        deadline = time.perf_counter() + BENCHMARK_TIMEOUT
+        while not predicate():
+            if time.perf_counter() > deadline:
+                raise TimeoutError("Фоновая операция не завершилась")
+            self.application.processEvents()
+
+    def settle(self):
+        # Обработка событий, оставшихся от предыдущего замера
+        for _ in range(10):
+            self.application.processEvents()
+
+    def record(self, case, size, durations, peak):
+        result = {
+            "case": case,
+            "size": size,
+            "count": len(durations),
+            "mean_ms": sum(durations) / len(durations) * 1000,
+            "p50_ms": percentile(durations, 0.5) * 1000,
+            "p90_ms": percentile(durations, 0.9) * 1000,
+            "p99_ms": percentile(durations, 0.99) * 1000,
+            "max_ms": max(durations) * 1000,
+            "peak_memory_mb": peak / (1024 * 1024),
+        }
+        self.results.append(result)
+        print(f"{case:<48}{format_size(size):>6}  p50 {result['p50_ms']:9.2f} мс"
+              f"  p90 {result['p90_ms']:9.2f} мс  max {result['max_ms']:9.2f} мс"
+              f"  пик {result['peak_memory_mb']:8.1f} МБ", flush=True)
+
+    def measure(self, case, size, count, step, prepare=None, cleanup=None):
+        # step возвращает замеренное время или None, тогда замеряется весь вызов
+        durations = []
+        reset_peak_memory()
+        for _ in range(count):
+            if prepare is not None:
+                prepare()
+            start = time.perf_counter()
+            duration = step()
+            durations.append(duration if duration is not None else time.perf_counter() - start)
+            if cleanup is not None:
+                cleanup()
+            self.settle()
+        self.record(case, size, durations, peak_memory())
+
+    def create_window(self, startup_profiler=None):
+        from main import PlantCareEditor
+
+        window = PlantCareEditor(startup_profiler)
+        window.show()
+        self.wait_until(lambda: not window.startup_waiting)
+        return window
+
+    def close_window(self, window):
+        from PyQt6.QtCore import QCoreApplication, QEvent
+        from PyQt6.QtWidgets import QMessageBox
+
+        for document in list(window.documents):
+            if document.editor is not None:
+                document.editor.document().setModified(False)
+        self.answer = QMessageBox.StandardButton.No
+        window.close()
+        # Без цикла событий отложенное удаление нужно выполнить явно;
+        # фоновые потоки окна дожидаются завершения при удалении
+        window.deleteLater()
+        QCoreApplication.sendPostedEvents(None, QEvent.Type.DeferredDelete)
+        self.settle()
+
+    def write_document(self, size):
+        path = os.path.join(self.project_dir, f"plant-{format_size(size)}.md")
+        if not os.path.exists(path):
+            with open(path, 'w', encoding='utf-8') as file:
+                file.write(generate_document(size, self.templates, seed=size))
+        return path
+
+    def run_document_cases(self, window, size):
+        from PyQt6.QtGui import QCloseEvent, QTextCursor
+        from PyQt6.QtWidgets import QMessageBox
+
+        file_path = self.write_document(size)
+        count = self.repeat_count(size)
+        opened = []
+
+        def open_document():
+            start = time.perf_counter()
+            document = window.open_document(file_path)
+            self.wait_until(lambda: document.editor is not None)
+            opened.append(document)
+            return time.perf_counter() - start
+
+        def close_document():
+            document = opened.pop()
+            start = time.perf_counter()
+            window.close_tab(window.tab_widget.indexOf(document.widget))
+            return time.perf_counter() - start
+
+        close_durations = []
+        self.measure("open_file", size, count, open_document,
+                     cleanup=lambda: close_durations.append(close_document()))
+        self.record("close_tab (без изменений)", size, close_durations, peak_memory())
+
+        document = window.open_document(file_path)
+        self.wait_until(lambda: document.editor is not None)
+        editor = document.editor
+        renderer = window.preview_renderer
+        rendered = []
+        renderer.rendered.connect(rendered.append)
+
+        def full_preview():
+            rendered.clear()
+            start = time.perf_counter()
+            renderer.render_now(editor)
+            self.wait_until(lambda: rendered)
+            return time.perf_counter() - start
+
+        self.measure("update_preview (полная)", size, count, full_preview)
+
+        undo_steps = []
+
+        def place_cursor():
+            # Курсор на слове в середине документа
+            undo_steps[:] = [editor.document().availableUndoSteps()]
+            cursor = editor.textCursor()
+            cursor.setPosition(editor.document().characterCount() // 2)
+            cursor.select(QTextCursor.SelectionType.WordUnderCursor)
+            editor.setTextCursor(cursor)
+
+        def keystroke_preview():
+            rendered.clear()
+            start = time.perf_counter()
+            editor.textCursor().insertText("ф")
+            self.wait_until(lambda: rendered)
+            return time.perf_counter() - start
+
+        def undo_changes():
+            # Правка может занять несколько шагов отмены
+            while editor.document().availableUndoSteps() > undo_steps[0]:
+                editor.undo()
+
+        self.measure("update_preview (нажатие)", size, count, keystroke_preview,
+                     prepare=place_cursor, cleanup=undo_changes)
+        self.measure("toggle_format_text", size, count,
+                     lambda: window.toggle_format_text("**"),
+                     prepare=place_cursor, cleanup=undo_changes)
+        self.measure("insert_header", size, count,
+                     lambda: window.insert_header("## "),
+                     prepare=place_cursor, cleanup=undo_changes)
+
+        saved = []
+        window.file_saver.saved.connect(saved.append)
+        save_calls = []
+
+        def save_document():
+            saved.clear()
+            start = time.perf_counter()
+            window.save_file_by_path(file_path, editor.toPlainText(), document)
+            save_calls.append(time.perf_counter() - start)
+            self.wait_until(lambda: saved)
+            return time.perf_counter() - start
+
+        self.measure("save_file_by_path (запись)", size, count, save_document,
+                     prepare=lambda: editor.textCursor().insertText(" "))
+        self.record("save_file_by_path (вызов)", size, save_calls, peak_memory())
+        window.file_saver.saved.disconnect(saved.append)
+
+        # Проверка несохраненных изменений; на вопрос отвечается "Отмена"
+        def make_dirty():
+            editor.textCursor().insertText(" ")
+            self.answer = QMessageBox.StandardButton.Cancel
+
+        index = window.tab_widget.indexOf(document.widget)
+        self.measure("close_tab (есть изменения)", size, count,
+                     lambda: window.close_tab(index), prepare=make_dirty)
+        self.measure("closeEvent (есть изменения)", size, count,
+                     lambda: window.closeEvent(QCloseEvent()), prepare=make_dirty)
+
+        renderer.rendered.disconnect(rendered.append)
+        editor.document().setModified(False)
+        window.remove_document_tab(document)
+
+    def run_restore_cases(self, size, tab_count):
+        # Восстановление сеанса из tab_count вкладок; файлы вкладок - жесткие
+        # ссылки на один документ, чтобы не занимать место на диске
+        from documents import new_session_id
+        from session import SessionStore, app_settings
+        from startup import StartupProfiler
+
+        source_path = self.write_document(size)
+        tabs_dir = os.path.join(self.project_dir, f"tabs-{format_size(size)}-{tab_count}")
+        os.makedirs(tabs_dir, exist_ok=True)
+        tab_paths = []
+        for number in range(tab_count):
+            path = os.path.join(tabs_dir, f"tab-{number}.md")
+            if not os.path.exists(path):
+                try:
+                    os.link(source_path, path)
+                except OSError:
+                    shutil.copyfile(source_path, path)
+            tab_paths.append(path)
+
+        records = [{"tab_id": new_session_id(), "path": path, "cursor": 0, "scroll": 0,
+                    "content_hash": None, "body": None} for path in tab_paths]
+        first_paint, interactive = [], []
+
+        def prepare():
+            store = SessionStore()
+            store.clear()
+            store.save_tabs([record["tab_id"] for record in records], records)
+            store.close()
+            settings = app_settings()
+            settings.setValue("current_tab", records[tab_count // 2]["tab_id"])
+            settings.sync()
+
+        def restore():
+            profiler = StartupProfiler(start_time=time.perf_counter())
+            window = self.create_window(profiler)
+            first_paint.append(profiler.paint_time - profiler.start_time)
+            interactive.append(profiler.last_time - profiler.start_time)
+            restored = window.tab_widget.count()
+            self.close_window(window)
+            if restored < tab_count:
+                raise RuntimeError(f"Восстановлено вкладок: {restored} из {tab_count}")
+            return interactive[-1]
+
+        case = f"restore_application_state ({tab_count} вкладок)"
+        self.measure(case, size, max(BENCHMARK_MIN_REPEAT, self.repeat_count(size) // 4),
+                     restore, prepare=prepare)
+        self.record(f"{case}: первая отрисовка", size, first_paint, peak_memory())
+
+    def run(self, sizes, tab_counts):
+        window = self.create_window()
+        try:
+            for size in sizes:
+                self.run_document_cases(window, size)
+        finally:
+            self.close_window(window)
+
+        for size in sizes:
+            for tab_count in tab_counts:
+                self.run_restore_cases(size, tab_count)
+        return self.results
+
+
+def compare_results(results, previous):
+    # Отношение медиан к прошлому прогону: больше 1 - стало медленнее
+    known = {(result["case"], result["size"]): result for result in previous}
+    print("\nСравнение с прошлым прогоном (медиана):")
+    for result in results:
+        old = known.get((result["case"], result["size"]))
+        if old is None or not old["p50_ms"]:
+            continue
+        ratio = result["p50_ms"] / old["p50_ms"]
+        print(f"  {result['case']:<48}{format_size(result['size']):>6}  "
+              f"{old['p50_ms']:9.2f} -> {result['p50_ms']:9.2f} мс  x{ratio:.2f}")
+
+
+def benchmark_main(argv):
+    # Замер без окна: python benchmark.py [--sizes 10K,1M] [--output FILE]
+    parser = argparse.ArgumentParser(
+        prog="benchmark.py", description="Замер скорости редактора на больших документах")
+    parser.add_argument("--sizes", default=",".join(BENCHMARK_SIZES),
+                        help="размеры документов через запятую (10K, 1M, 50M)")
+    parser.add_argument("--tabs", default=",".join(str(count) for count in BENCHMARK_TABS),
+                        help="число вкладок при восстановлении сеанса через запятую")
+    parser.add_argument("--repeat", type=int, default=BENCHMARK_REPEAT,
+                        help="число замеров для документов до 1 МБ")
+    parser.add_argument("--output", default="bench_output.json",
+                        help="файл для результатов в JSON")
+    parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--keep", action="store_true",
+                        help="не удалять рабочую папку с документами")
+    args = parser.parse_args(argv)
+
+    sizes = [parse_size(size) for size in args.sizes.split(",") if size.strip()]
+    tab_counts = [int(count) for count in args.tabs.split(",") if count.strip()]
+
+    work_dir = tempfile.mkdtemp(prefix="plantcare-bench-")
+    os.environ["QT_QPA_PLATFORM"] = "offscreen"
+    isolate_settings(work_dir)
+
+    try:
+        runner = BenchmarkRunner(work_dir, args.repeat)
+        results = runner.run(sizes, tab_counts)
+        # Фоновые задачи завершаются так же, как при выходе из программы
+        runner.application.aboutToQuit.emit()
+    finally:
+        if args.keep:
+            print(f"Рабочая папка: {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    from PyQt6.QtCore import QT_VERSION_STR
+    report = {
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "qt": QT_VERSION_STR,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
+    print(f"Результаты записаны в {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            compare_results(results, json.load(file)["results"])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(benchmark_main(sys.argv[1:]))
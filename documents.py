@@ -0,0 +1,303 @@
+import os
+import re
+import uuid
+import hashlib
+
+from PyQt6.QtCore import (Qt, pyqtSignal)
+from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QLabel, QPlainTextEdit, QProgressBar,
+                             QPushButton, QDialog, QTableWidget, QTableWidgetItem, QHeaderView,
+                             QAbstractItemView)
+
+from instrumentation import format_bytes
+from viewer import LargeFileViewer
+
+# Замены, которые делает QTextDocument.toPlainText(): разделители строк
+# и абзацев становятся переводом строки, неразрывный пробел - пробелом
+PLAIN_TEXT_TABLE = str.maketrans({'\u2028': '\n', '\u2029': '\n', '\ufdd0': '\n',
+                                  '\ufdd1': '\n', '\u00a0': ' '})
+# Служебные данные QTextDocument на один блок (строку), байт. Оценка:
+# запись в таблице блоков, фрагмент и формат
+BLOCK_OVERHEAD_BYTES = 160
+# Символы вне основной плоскости Юникода (эмодзи и т. п.): в QTextDocument
+# каждый занимает две позиции, позиции курсора считаются в единицах UTF-16
+ASTRAL_RE = re.compile('[\U00010000-\U0010ffff]')
+# Предел оценки памяти живых редакторов по умолчанию, МБ, 0 - без ограничения
+EDITOR_MEMORY_LIMIT_MB = 512
+
+
+def content_hash(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def document_hash(text_document):
+    # Хэш содержимого QTextDocument по строкам, без полной копии текста;
+    # совпадает с content_hash(text_document.toPlainText())
+    digest = hashlib.sha1()
+    block = text_document.firstBlock()
+    while block.isValid():
+        digest.update(block.text().translate(PLAIN_TEXT_TABLE).encode('utf-8'))
+        block = block.next()
+        if block.isValid():
+            digest.update(b'\n')
+    return digest.hexdigest()
+
+
+def document_memory(text_document):
+    # Оценка памяти под текст документа: UTF-16 и служебные данные блоков
+    return (text_document.characterCount() * 2
+            + text_document.blockCount() * BLOCK_OVERHEAD_BYTES)
+
+
+def new_session_id():
+    return uuid.uuid4().hex
+
+
+def canonical_path(file_path):
+    return os.path.normcase(os.path.realpath(os.path.abspath(file_path)))
+
+
+def changed_range(old_text, new_text):
+    # Участок, которым различаются два текста: (начало, конец в old_text,
+    # конец в new_text). Общие начало и конец ищутся делением пополам,
+    # сравнение срезов идет на стороне C
+    limit = min(len(old_text), len(new_text))
+    low, high = 0, limit
+    while low < high:
+        middle = (low + high + 1) // 2
+        if old_text[:middle] == new_text[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    prefix = low
+
+    low, high = 0, limit - prefix
+    while low < high:
+        middle = (low + high + 1) // 2
+        if old_text[len(old_text) - middle:] == new_text[len(new_text) - middle:]:
+            low = middle
+        else:
+            high = middle - 1
+    return prefix, len(old_text) - low, len(new_text) - low
+
+
+def utf16_position(text, index):
+    # Позиция QTextCursor для индекса index строки Python text
+    return index + len(ASTRAL_RE.findall(text, 0, index))
+
+
+def utf16_length(text):
+    return utf16_position(text, len(text))
+
+
+def utf16_positions(text, indices):
+    # utf16_position для возрастающих индексов за один проход по тексту
+    if not ASTRAL_RE.search(text):
+        return list(indices)
+    positions = []
+    previous = shift = 0
+    for index in indices:
+        shift += len(ASTRAL_RE.findall(text, previous, index))
+        previous = index
+        positions.append(index + shift)
+    return positions
+
+
+def string_index(text, position):
+    # Индекс строки Python для позиции UTF-16 position, обратно utf16_position
+    index = position
+    for match in ASTRAL_RE.finditer(text):
+        if match.start() >= index:
+            break
+        index -= 1
+    return index
+
+
+class Document:
+    # Открытый документ: путь, виджет вкладки (редактор или заглушка)
+    # и сведения о файле на момент последней загрузки или сохранения
+    def __init__(self, file_path=None, session_id=None):
+        self.file_path = file_path
+        self.session_id = session_id or new_session_id()
+        self.widget = None
+        self.content_hash = None
+        self.file_mtime = None
+        # Счетчик правок: по нему видно, менялся ли текст с момента снимка
+        self.revision = 0
+
+        # Позиция, к которой нужно вернуться после загрузки, если файл
+        # с тех пор не изменился
+        self.cursor_position = 0
+        self.scroll_position = 0
+
+    @property
+    def editor(self):
+        if isinstance(self.widget, QPlainTextEdit):
+            return self.widget
+
+    @property
+    def is_dirty(self):
+        editor = self.editor
+        if editor is None:
+            return False
+        if self.file_path:
+            return editor.document().isModified()
+        # Безымянная вкладка из одних пробелов не считается измененной; блоки
+        # проверяются по одному, без копирования всего текста
+        block = editor.document().begin()
+        while block.isValid():
+            if block.text().strip():
+                return True
+            block = block.next()
+        return False
+
+    @property
+    def title(self):
+        title = os.path.basename(self.file_path) if self.file_path else "Новый файл"
+        if self.editor is not None and self.editor.document().isModified():
+            title += " *"
+        return title
+
+
+class DocumentRegistry:
+    # Открытые документы с поиском по каноническому пути и по виджету вкладки
+    def __init__(self):
+        self.by_path = {}
+        self.by_widget = {}
+
+    def __iter__(self):
+        return iter(list(self.by_widget.values()))
+
+    def __len__(self):
+        return len(self.by_widget)
+
+    def add(self, document):
+        if document.file_path:
+            self.by_path[canonical_path(document.file_path)] = document
+        if document.widget is not None:
+            self.by_widget[document.widget] = document
+
+    def remove(self, document):
+        if document.file_path:
+            key = canonical_path(document.file_path)
+            if self.by_path.get(key) is document:
+                del self.by_path[key]
+        self.by_widget.pop(document.widget, None)
+
+    def find(self, file_path):
+        return self.by_path.get(canonical_path(file_path))
+
+    def for_widget(self, widget):
+        return self.by_widget.get(widget)
+
+    def set_path(self, document, file_path):
+        self.remove(document)
+        document.file_path = file_path
+        self.add(document)
+
+    def set_widget(self, document, widget):
+        self.by_widget.pop(document.widget, None)
+        document.widget = widget
+        self.by_widget[widget] = document
+
+
+class TabPlaceholder(QWidget):
+    # Легкая заглушка вкладки: хранит только путь и сведения о файле,
+    # редактор создается при первой активации вкладки. Пока файл
+    # загружается, показывает ход загрузки и кнопку отмены
+    cancel_requested = pyqtSignal()
+
+    def __init__(self, file_path, parent=None):
+        super().__init__(parent)
+        self.file_path = file_path
+        self.error = None
+
+        try:
+            self.size = os.path.getsize(file_path)
+            self.mtime = os.path.getmtime(file_path)
+        except OSError:
+            self.size, self.mtime = 0, 0
+
+        self.label = QLabel("Загрузка...", self)
+        self.label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.label.setStyleSheet("color: gray;")
+
+        self.progress_bar = QProgressBar(self)
+        self.progress_bar.hide()
+
+        self.cancel_button = QPushButton("Отмена", self)
+        self.cancel_button.clicked.connect(self.cancel_requested)
+        self.cancel_button.hide()
+
+        layout = QVBoxLayout(self)
+        layout.addStretch()
+        layout.addWidget(self.label)
+        layout.addWidget(self.progress_bar)
+        layout.addWidget(self.cancel_button, alignment=Qt.AlignmentFlag.AlignCenter)
+        layout.addStretch()
+
+    def set_progress(self, done, total):
+        # Шкала в промилле: размер файла может не уместиться в int
+        self.progress_bar.setMaximum(1000)
+        self.progress_bar.setValue(min(1000, done * 1000 // max(total, 1)))
+        self.progress_bar.show()
+        self.cancel_button.show()
+
+    def set_error(self, error):
+        self.error = error
+        self.progress_bar.hide()
+        self.cancel_button.hide()
+        self.label.setText(f"Не удалось открыть файл:\n{error}")
+
+
+class MemoryReportDialog(QDialog):
+    # Оценка памяти по вкладкам: текст живых редакторов, выгруженные
+    # вкладки и загружаемые файлы. summary - строки итогов
+    # [(название, байт)], например документ превью и память процесса;
+    # строки с размером None (неизвестен на этой платформе) не показываются
+    def __init__(self, documents, loading_documents, summary, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Память по вкладкам")
+        self.resize(760, 400)
+
+        headers = ["Вкладка", "Состояние", "Символов", "Строк", "Шагов отмены", "Память"]
+        self.table = QTableWidget(0, len(headers), self)
+        self.table.setHorizontalHeaderLabels(headers)
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table.verticalHeader().hide()
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+
+        total = 0
+        for document in documents:
+            editor = document.editor
+            if editor is not None:
+                text_document = editor.document()
+                memory = document_memory(text_document)
+                total += memory
+                self.add_row(document.title, "в памяти", text_document.characterCount() - 1,
+                             text_document.blockCount(), text_document.availableUndoSteps(),
+                             format_bytes(memory))
+            elif isinstance(document.widget, LargeFileViewer):
+                # Файл отображен в память и читается системой по страницам
+                self.add_row(document.title, "просмотр", "", document.widget.line_count or "",
+                             "", format_bytes(0))
+            else:
+                state = "загружается" if document in loading_documents else "выгружена"
+                self.add_row(document.title, state, "", "", "", "")
+
+        self.add_row("Всего в редакторах", "", "", "", "", format_bytes(total))
+        for name, size in summary:
+            if size is not None:
+                self.add_row(name, "", "", "", "", format_bytes(size))
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.table)
+
+    def add_row(self, *values):
+        row = self.table.rowCount()
+        self.table.insertRow(row)
+        for column, value in enumerate(values):
+            item = QTableWidgetItem(str(value))
+            if column >= 2:
+                item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+            self.table.setItem(row, column, item)
@@ -0,0 +1,274 @@
+import os
+import re
+import sys
+import html
+import json
+import shutil
+import hashlib
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from project_index import project_files
+
+# Файл со списком выгруженных страниц и хэшами их исходников
+EXPORT_MANIFEST = ".export-manifest.json"
+# Папка для изображений, лежащих вне папки проекта
+EXPORT_ASSETS_DIR = "_assets"
+# Число страниц, передаваемых процессу за раз
+EXPORT_CHUNK_SIZE = 16
+# Версия формата выгрузки: при ее смене все страницы выгружаются заново
+EXPORT_VERSION = 1
+
+IMAGE_LINK_RE = re.compile(r'(!\[[^\]]*\]\()\s*(<[^>]*>|[^)\s]+)([^)]*\))')
+PAGE_LINK_RE = re.compile(r'((?<!!)\[[^\]]*\]\()\s*(<[^>]*>|[^)\s]+)([^)]*\))')
+TITLE_RE = re.compile(r'^#\s+(.+?)\s*#*\s*$', re.MULTILINE)
+EXTERNAL_LINK_RE = re.compile(r'^[a-zA-Z][a-zA-Z0-9+.-]*:|^//|^#')
+
+_application = None
+
+
+def render_markdown_html(text, title=""):
+    # Отрисовка Markdown тем же движком, что и превью
+    from PyQt6.QtGui import QTextDocument
+
+    document = QTextDocument()
+    document.setMarkdown(text)
+    if title:
+        document.setMetaInformation(QTextDocument.MetaInformation.DocumentTitle, title)
+    return document.toHtml()
+
+
+def page_title(text, file_path):
+    match = TITLE_RE.search(text)
+    return match.group(1) if match else os.path.splitext(os.path.basename(file_path))[0]
+
+
+def link_target(link):
+    # Путь из ссылки Markdown: без угловых скобок, с прямыми слешами
+    if link.startswith('<') and link.endswith('>'):
+        link = link[1:-1]
+    return link.strip().replace('\\', '/')
+
+
+def format_link(path):
+    return f"<{path}>" if ' ' in path or '(' in path or ')' in path else path
+
+
+def copy_if_changed(source, destination):
+    try:
+        source_stat = os.stat(source)
+        destination_stat = os.stat(destination)
+        if (destination_stat.st_size == source_stat.st_size
+                and destination_stat.st_mtime >= source_stat.st_mtime):
+            return
+    except FileNotFoundError:
+        pass
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    # Несколько процессов могут копировать одно изображение одновременно
+    temp_path = f"{destination}.{os.getpid()}.tmp"
+    shutil.copy2(source, temp_path)
+    os.replace(temp_path, destination)
+
+
+def export_image(link, page_dir, source_dir, output_dir):
+    # Копирует изображение по ссылке страницы в папку выгрузки, если оно
+    # изменилось. Возвращает путь копии или None для внешних и
+    # несуществующих изображений
+    target = link_target(link)
+    if not target or EXTERNAL_LINK_RE.match(target):
+        return None
+    image_path = os.path.normpath(os.path.join(page_dir, target))
+    if not os.path.isfile(image_path):
+        return None
+
+    relative_path = os.path.relpath(image_path, source_dir)
+    if relative_path.startswith(os.pardir):
+        # Изображение вне проекта попадает в общую папку под уникальным именем
+        key = hashlib.sha1(image_path.encode('utf-8')).hexdigest()[:12]
+        relative_path = os.path.join(
+            EXPORT_ASSETS_DIR, f"{key}-{os.path.basename(image_path)}")
+    exported_path = os.path.join(output_dir, relative_path)
+    copy_if_changed(image_path, exported_path)
+    return exported_path
+
+
+def copy_images(text, source_path, source_dir, output_dir):
+    # Изображения неизмененной страницы: сама страница не отрисовывается,
+    # но файл изображения мог быть заменен на месте
+    page_dir = os.path.dirname(source_path)
+    for match in IMAGE_LINK_RE.finditer(text):
+        export_image(match.group(2), page_dir, source_dir, output_dir)
+
+
+def rewrite_links(text, source_path, source_dir, output_dir):
+    # Изображения копируются в папку выгрузки и ссылки на них переписываются
+    # относительно страницы; ссылки на другие страницы .md ведут на .html
+    page_dir = os.path.dirname(source_path)
+    output_page_dir = os.path.join(output_dir, os.path.relpath(page_dir, source_dir))
+
+    def rewrite_image(match):
+        exported_path = export_image(match.group(2), page_dir, source_dir, output_dir)
+        if exported_path is None:
+            return match.group(0)
+
+        link = os.path.relpath(exported_path, output_page_dir).replace(os.sep, '/')
+        return match.group(1) + format_link(link) + match.group(3)
+
+    def rewrite_page(match):
+        target = link_target(match.group(2))
+        path, _, anchor = target.partition('#')
+        if EXTERNAL_LINK_RE.match(target) or not path.lower().endswith(".md"):
+            return match.group(0)
+        link = path[:-3] + ".html" + (f"#{anchor}" if anchor else "")
+        return match.group(1) + format_link(link) + match.group(3)
+
+    return PAGE_LINK_RE.sub(rewrite_page, IMAGE_LINK_RE.sub(rewrite_image, text))
+
+
+def _init_worker():
+    # Каждому процессу нужно свое приложение Qt без окон
+    global _application
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt6.QtGui import QGuiApplication
+    _application = QGuiApplication.instance() or QGuiApplication([])
+
+
+def export_page(task):
+    # Выполняется в процессе пула. Возвращает (относительный путь, хэш,
+    # заголовок, выгружена ли страница заново) или ошибку вместо хэша
+    source_path, source_dir, output_dir, known_hash = task
+    relative_path = os.path.relpath(source_path, source_dir)
+    try:
+        with open(source_path, 'rb') as file:
+            data = file.read()
+        digest = hashlib.sha1(data).hexdigest()
+        text = data.decode('utf-8', errors='replace')
+        title = page_title(text, source_path)
+        output_path = os.path.join(output_dir, os.path.splitext(relative_path)[0] + ".html")
+        if digest == known_hash and os.path.exists(output_path):
+            copy_images(text, source_path, source_dir, output_dir)
+            return relative_path, digest, title, False, None
+
+        text = rewrite_links(text, source_path, source_dir, output_dir)
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        with open(output_path, 'w', encoding='utf-8') as file:
+            file.write(render_markdown_html(text, title))
+        return relative_path, digest, title, True, None
+    except Exception as e:
+        return relative_path, None, None, False, str(e)
+
+
+def load_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, EXPORT_MANIFEST), encoding='utf-8') as file:
+            manifest = json.load(file)
+        if manifest.get("version") == EXPORT_VERSION:
+            return manifest.get("pages", {})
+    except (OSError, ValueError):
+        pass
+    return {}
+
+
+def write_manifest(output_dir, pages):
+    path = os.path.join(output_dir, EXPORT_MANIFEST)
+    with open(path + ".tmp", 'w', encoding='utf-8') as file:
+        json.dump({"version": EXPORT_VERSION, "pages": pages}, file, ensure_ascii=False)
+    os.replace(path + ".tmp", path)
+
+
+def write_index(output_dir, pages):
+    # Оглавление: страницы сгруппированы по папкам
+    sections = {}
+    for relative_path, page in sorted(pages.items()):
+        directory = os.path.dirname(relative_path).replace(os.sep, '/')
+        sections.setdefault(directory, []).append((relative_path, page["title"]))
+
+    lines = ['<!DOCTYPE html>', '<html><head><meta charset="utf-8" />',
+             '<title>Справочник по уходу за растениями</title></head><body>',
+             '<h1>Справочник по уходу за растениями</h1>']
+    for directory, entries in sections.items():
+        if directory:
+            lines.append(f'<h2>{html.escape(directory)}</h2>')
+        lines.append('<ul>')
+        for relative_path, title in entries:
+            link = (os.path.splitext(relative_path)[0] + ".html").replace(os.sep, '/')
+            lines.append(f'<li><a href="{html.escape(link, quote=True)}">'
+                         f'{html.escape(title)}</a></li>')
+        lines.append('</ul>')
+    lines.append('</body></html>')
+
+    with open(os.path.join(output_dir, "index.html"), 'w', encoding='utf-8') as file:
+        file.write('\n'.join(lines))
+
+
+def export_project(source_dir, output_dir, jobs=None, force=False, progress=None):
+    # Выгрузка всех страниц папки в HTML в нескольких процессах. Страницы,
+    # хэш исходника которых совпадает с манифестом, не отрисовываются, но
+    # их изменившиеся изображения копируются заново.
+    # Возвращает (выгружено, пропущено, [(путь, ошибка)])
+    source_dir = os.path.abspath(source_dir)
+    output_dir = os.path.abspath(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+
+    known_pages = {} if force else load_manifest(output_dir)
+    output_prefix = os.path.join(output_dir, '')
+    tasks = [(path, source_dir, output_dir,
+              known_pages.get(os.path.relpath(path, source_dir), {}).get("hash"))
+             for path in project_files(source_dir) if not path.startswith(output_prefix)]
+
+    pages, errors = {}, []
+    exported = skipped = 0
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=context,
+                             initializer=_init_worker) as executor:
+        results = executor.map(export_page, tasks, chunksize=EXPORT_CHUNK_SIZE)
+        for done, (relative_path, digest, title, rendered, error) in enumerate(results, 1):
+            if error is not None:
+                errors.append((relative_path, error))
+                # Прошлая выгрузка страницы остается в силе до следующей попытки
+                if relative_path in known_pages:
+                    pages[relative_path] = known_pages[relative_path]
+            else:
+                pages[relative_path] = {"hash": digest, "title": title}
+                if rendered:
+                    exported += 1
+                else:
+                    skipped += 1
+            if progress is not None:
+                progress(done, len(tasks))
+
+    # Страницы, исходники которых удалены, убираются из выгрузки
+    source_pages = {os.path.relpath(task[0], source_dir) for task in tasks}
+    for relative_path in known_pages.keys() - source_pages:
+        stale_path = os.path.join(output_dir, os.path.splitext(relative_path)[0] + ".html")
+        if os.path.exists(stale_path):
+            os.remove(stale_path)
+
+    write_manifest(output_dir, pages)
+    write_index(output_dir, pages)
+    return exported, skipped, errors
+
+
+def export_main(argv):
+    # Выгрузка из командной строки без окна:
+    # main.py --export ПАПКА ВЫХОД [--jobs N] [--force]
+    parser = argparse.ArgumentParser(
+        prog="main.py --export", description="Выгрузка папки проекта в HTML")
+    parser.add_argument("source", help="папка с файлами Markdown")
+    parser.add_argument("output", help="папка для HTML")
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="число процессов (по умолчанию по числу ядер)")
+    parser.add_argument("--force", action="store_true",
+                        help="выгрузить все страницы заново")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.source):
+        print(f"Папка не найдена: {args.source}", file=sys.stderr)
+        return 2
+
+    exported, skipped, errors = export_project(args.source, args.output, args.jobs, args.force)
+    for relative_path, error in errors:
+        print(f"Ошибка при экспорте файла {relative_path}: {error}", file=sys.stderr)
+    print(f"Выгружено: {exported}, без изменений: {skipped}, ошибок: {len(errors)}")
+    return 1 if errors else 0
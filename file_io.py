@@ -0,0 +1,257 @@
+import os
+import mmap
+import codecs
+import shutil
+import hashlib
+import tempfile
+import threading
+
+from PyQt6.QtCore import (QCoreApplication, QObject, QRunnable, QThreadPool, pyqtSignal)
+
+from instrumentation import timed
+
+# Размер порции чтения, байт
+LOAD_CHUNK_SIZE = 1024 * 1024
+# Файлы крупнее порога читаются через отображение в память
+MMAP_THRESHOLD = 16 * 1024 * 1024
+# Число файлов, загружаемых одновременно
+LOADER_THREADS = 4
+# Число файлов, записываемых одновременно
+SAVER_THREADS = 4
+# Маска прав процесса: новый файл получает права 0o666 & ~маска, как при
+# open(). Узнать ее можно только сменой, поэтому она читается один раз при
+# импорте, пока фоновые потоки записи не запущены
+PROCESS_UMASK = os.umask(0)
+os.umask(PROCESS_UMASK)
+
+
+class _LoadSignals(QObject):
+    chunk = pyqtSignal(int, str, int, int)
+    finished = pyqtSignal(int, str)
+    failed = pyqtSignal(int, str)
+
+
+class _LoadTask(QRunnable):
+    def __init__(self, request_id, file_path, signals, cancel_event):
+        super().__init__()
+        self.request_id = request_id
+        self.file_path = file_path
+        self.signals = signals
+        self.cancel_event = cancel_event
+
+    def run(self):
+        try:
+            self.load()
+        except Exception as e:
+            self.signals.failed.emit(self.request_id, str(e))
+
+    @timed("FileLoader.load", "background")
+    def load(self):
+        total = os.path.getsize(self.file_path)
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        digest = hashlib.sha1()
+        done = 0
+        pending_cr = False
+
+        with open(self.file_path, 'rb') as file:
+            source = file
+            if total >= MMAP_THRESHOLD:
+                source = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                while True:
+                    if self.cancel_event.is_set():
+                        return
+
+                    data = source.read(LOAD_CHUNK_SIZE)
+                    done += len(data)
+                    final = not data
+                    text = decoder.decode(data, final)
+
+                    # Переводы строк приводятся к '\n', как при чтении в
+                    # текстовом режиме; '\r' на границе порции ждет следующую
+                    if pending_cr:
+                        text = '\r' + text
+                    pending_cr = not final and text.endswith('\r')
+                    if pending_cr:
+                        text = text[:-1]
+                    text = text.replace('\r\n', '\n').replace('\r', '\n')
+
+                    if text:
+                        digest.update(text.encode('utf-8'))
+                        self.signals.chunk.emit(self.request_id, text, done, total)
+                    if final:
+                        break
+            finally:
+                if source is not file:
+                    source.close()
+
+        self.signals.finished.emit(self.request_id, digest.hexdigest())
+
+
+class FileLoader(QObject):
+    # Чтение и декодирование файлов в фоновых потоках. Текст приходит
+    # порциями в главный поток, context - объект, к которому относится загрузка
+    chunk_loaded = pyqtSignal(object, str, int, int)
+    finished = pyqtSignal(object, str)
+    failed = pyqtSignal(object, str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.requests = {}
+        self.next_request_id = 0
+
+        self.thread_pool = QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(LOADER_THREADS)
+
+        self.signals = _LoadSignals()
+        self.signals.chunk.connect(self.on_chunk)
+        self.signals.finished.connect(self.on_finished)
+        self.signals.failed.connect(self.on_failed)
+
+        QCoreApplication.instance().aboutToQuit.connect(self.shutdown)
+
+    def shutdown(self):
+        for _, cancel_event in self.requests.values():
+            cancel_event.set()
+        self.requests.clear()
+        self.thread_pool.waitForDone()
+
+    def load(self, file_path, context):
+        self.next_request_id += 1
+        cancel_event = threading.Event()
+        self.requests[self.next_request_id] = (context, cancel_event)
+        self.thread_pool.start(_LoadTask(
+            self.next_request_id, file_path, self.signals, cancel_event))
+
+    def cancel(self, context):
+        for request_id, (request_context, cancel_event) in list(self.requests.items()):
+            if request_context is context:
+                cancel_event.set()
+                del self.requests[request_id]
+
+    def on_chunk(self, request_id, text, done, total):
+        # Порции отмененных загрузок, уже стоящие в очереди, отбрасываются
+        if request_id in self.requests:
+            self.chunk_loaded.emit(self.requests[request_id][0], text, done, total)
+
+    def on_finished(self, request_id, digest):
+        if request_id in self.requests:
+            context, _ = self.requests.pop(request_id)
+            self.finished.emit(context, digest)
+
+    def on_failed(self, request_id, error):
+        if request_id in self.requests:
+            context, _ = self.requests.pop(request_id)
+            self.failed.emit(context, error)
+
+
+def write_file_atomic(file_path, content):
+    # Текст пишется во временный файл в той же папке и подменяет исходный
+    # одной операцией, поэтому сбой посреди записи не портит файл
+    directory = os.path.dirname(os.path.abspath(file_path))
+    fd, temp_path = tempfile.mkstemp(
+        dir=directory, prefix=f".{os.path.basename(file_path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            file.write(content)
+            file.flush()
+            os.fsync(file.fileno())
+        # mkstemp создает файл с правами 0o600
+        if os.path.exists(file_path):
+            shutil.copymode(file_path, temp_path)
+        else:
+            os.chmod(temp_path, 0o666 & ~PROCESS_UMASK)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+    return os.path.getmtime(file_path)
+
+
+class _SaveSignals(QObject):
+    finished = pyqtSignal(int, str, float)
+    failed = pyqtSignal(int, str)
+
+
+class _SaveTask(QRunnable):
+    def __init__(self, request_id, file_path, content, signals):
+        super().__init__()
+        self.request_id = request_id
+        self.file_path = file_path
+        self.content = content
+        self.signals = signals
+
+    @timed("FileSaver.write", "background")
+    def run(self):
+        try:
+            mtime = write_file_atomic(self.file_path, self.content)
+            digest = hashlib.sha1(self.content.encode('utf-8')).hexdigest()
+            self.signals.finished.emit(self.request_id, digest, mtime)
+        except Exception as e:
+            self.signals.failed.emit(self.request_id, str(e))
+
+
+class FileSaver(QObject):
+    # Очередь фоновой записи. Запись одного пути идет строго по порядку,
+    # а снимки, накопившиеся за время записи, схлопываются в последний
+    saved = pyqtSignal(object, str, str, float)
+    failed = pyqtSignal(object, str, str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.requests = {}
+        self.active_paths = set()
+        self.pending = {}
+        self.next_request_id = 0
+
+        self.thread_pool = QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(SAVER_THREADS)
+
+        self.signals = _SaveSignals()
+        self.signals.finished.connect(self.on_finished)
+        self.signals.failed.connect(self.on_failed)
+
+        QCoreApplication.instance().aboutToQuit.connect(self.wait_for_done)
+
+    def save(self, file_path, content, context):
+        key = os.path.abspath(file_path)
+        if key in self.active_paths:
+            self.pending[key] = (file_path, content, context)
+            return
+
+        self.next_request_id += 1
+        self.requests[self.next_request_id] = (key, file_path, context)
+        self.active_paths.add(key)
+        self.thread_pool.start(_SaveTask(
+            self.next_request_id, file_path, content, self.signals))
+
+    def is_busy(self):
+        return bool(self.requests)
+
+    def is_saving(self, file_path):
+        return os.path.abspath(file_path) in self.active_paths
+
+    def wait_for_done(self):
+        # Дожидается всех записей, включая отложенные, и доставляет
+        # их результаты
+        while self.requests:
+            self.thread_pool.waitForDone()
+            QCoreApplication.sendPostedEvents()
+
+    def request_done(self, request_id):
+        key, file_path, context = self.requests.pop(request_id)
+        self.active_paths.discard(key)
+        if key in self.pending:
+            self.save(*self.pending.pop(key))
+        return file_path, context
+
+    def on_finished(self, request_id, digest, mtime):
+        file_path, context = self.request_done(request_id)
+        self.saved.emit(context, file_path, digest, mtime)
+
+    def on_failed(self, request_id, error):
+        file_path, context = self.request_done(request_id)
+        self.failed.emit(context, file_path, error)
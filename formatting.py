@@ -0,0 +1,225 @@
+import re
+
+from PyQt6.QtGui import QTextCursor
+from PyQt6.QtWidgets import (QDialog, QFormLayout, QVBoxLayout, QLineEdit, QComboBox, QCheckBox,
+                             QLabel, QDialogButtonBox)
+
+from documents import changed_range, utf16_length, utf16_position
+
+QUOTE_PREFIX = "> "
+# Разметка заголовка в начале строки
+HEADER_RE = re.compile(r'^#{1,6} ')
+# Разметка начала строки, которая остается снаружи выделения: отступ,
+# маркеры цитаты, заголовок или маркер списка с флажком задачи
+LINE_PREFIX_RE = re.compile(
+    r'^(\s*(?:>[ \t]*)*(?:#{1,6}[ \t]+|(?:[-*+]|\d+[.)])[ \t]+(?:\[[ xX]\][ \t]+)?)?)(.*?)(\s*)$')
+
+# Действия для совпадений: название -> (вид, разметка)
+MATCH_ACTIONS = {
+    "Жирный": ("wrap", "**"),
+    "Курсив": ("wrap", "*"),
+    "Подчеркнутый": ("wrap", "_"),
+    "Зачеркнутый": ("wrap", "~~"),
+    "Цитата (строки)": ("quote", QUOTE_PREFIX),
+    **{f"H{level} (строки)": ("header", "#" * level + " ") for level in range(1, 7)},
+}
+
+
+def toggle_quote_lines(lines):
+    # Если все непустые строки уже цитаты, цитирование снимается
+    filled = [line for line in lines if line.strip()]
+    if filled and all(line.startswith(QUOTE_PREFIX) for line in filled):
+        return [line[len(QUOTE_PREFIX):] if line.startswith(QUOTE_PREFIX) else line
+                for line in lines]
+    return [QUOTE_PREFIX + line if line.strip() and not line.startswith(QUOTE_PREFIX) else line
+            for line in lines]
+
+
+def toggle_header_lines(lines, header):
+    # Заголовок того же уровня снимается, другой уровень заменяется
+    filled = [line for line in lines if line.strip()]
+    if filled and all(line.startswith(header) for line in filled):
+        return [line[len(header):] if line.startswith(header) else line for line in lines]
+    return [header + HEADER_RE.sub('', line) if line.strip() else line for line in lines]
+
+
+def toggle_wrap_lines(lines, wrapper):
+    # Каждая непустая строка оборачивается отдельно: разметка Markdown
+    # не переходит через строку. Разметка начала строки остается снаружи
+    parts = [LINE_PREFIX_RE.match(line).groups() for line in lines]
+    filled = [text for _, text, _ in parts if text]
+    unwrap = bool(filled) and all(
+        len(text) > 2 * len(wrapper) and text.startswith(wrapper) and text.endswith(wrapper)
+        for text in filled)
+    result = []
+    for line, (prefix, text, suffix) in zip(lines, parts):
+        if not text:
+            result.append(line)
+        elif unwrap:
+            result.append(prefix + text[len(wrapper):-len(wrapper)] + suffix)
+        else:
+            result.append(prefix + wrapper + text + wrapper + suffix)
+    return result
+
+
+def line_transform(kind, markup):
+    if kind == "quote":
+        return toggle_quote_lines
+    if kind == "header":
+        return lambda lines: toggle_header_lines(lines, markup)
+    return lambda lines: toggle_wrap_lines(lines, markup)
+
+
+def selected_block_range(cursor):
+    document = cursor.document()
+    first = document.findBlock(cursor.selectionStart())
+    last = document.findBlock(cursor.selectionEnd())
+    # Выделение, закончившееся в начале строки, эту строку не захватывает
+    if last.blockNumber() > first.blockNumber() and cursor.selectionEnd() == last.position():
+        last = last.previous()
+    return first, last
+
+
+def spans_lines(cursor):
+    first, last = selected_block_range(cursor)
+    return cursor.hasSelection() and first != last
+
+
+def replace_range(editor, start, end, text):
+    # Замена участка одной правкой: один шаг отмены, одно обновление
+    # превью и индексов
+    cursor = editor.textCursor()
+    cursor.beginEditBlock()
+    cursor.setPosition(start)
+    cursor.setPosition(end, QTextCursor.MoveMode.KeepAnchor)
+    cursor.insertText(text)
+    cursor.endEditBlock()
+    return cursor
+
+
+def replace_text(editor, start, old_text, new_text):
+    # Заменяется только участок, которым тексты различаются. start - позиция
+    # old_text в документе; индексы строк переводятся в позиции UTF-16
+    prefix, old_end, new_end = changed_range(old_text, new_text)
+    if prefix == old_end == new_end:
+        return False
+    replace_range(editor, start + utf16_position(old_text, prefix),
+                  start + utf16_position(old_text, old_end), new_text[prefix:new_end])
+    return True
+
+
+def read_lines(first, last):
+    lines = []
+    block = first
+    while True:
+        lines.append(block.text())
+        if block == last:
+            return lines
+        block = block.next()
+
+
+def transform_selected_lines(editor, transform):
+    # Преобразование всех строк выделения (или строки курсора); выделение
+    # после правки охватывает те же строки целиком
+    first, last = selected_block_range(editor.textCursor())
+    start = first.position()
+    count = last.blockNumber() - first.blockNumber() + 1
+    old_text = '\n'.join(read_lines(first, last))
+    new_text = '\n'.join(transform(old_text.split('\n')))
+    if not replace_text(editor, start, old_text, new_text):
+        return 0
+
+    cursor = editor.textCursor()
+    cursor.setPosition(start)
+    cursor.setPosition(start + utf16_length(new_text), QTextCursor.MoveMode.KeepAnchor)
+    editor.setTextCursor(cursor)
+    return count
+
+
+def format_matches(editor, pattern, kind, markup, selection_only=False):
+    # Форматирование всех совпадений регулярного выражения в документе
+    # или в выделении одной правкой. Возвращает число совпадений
+    regex = re.compile(pattern, re.MULTILINE)
+    cursor = editor.textCursor()
+    if selection_only and cursor.hasSelection():
+        first, last = selected_block_range(cursor)
+        start = first.position()
+        old_text = '\n'.join(read_lines(first, last))
+    else:
+        start = 0
+        old_text = editor.toPlainText()
+
+    if kind == "wrap":
+        count = 0
+
+        def wrap(match):
+            nonlocal count
+            # Пустые совпадения и совпадения через перевод строки не оборачиваются
+            if not match.group(0) or '\n' in match.group(0):
+                return match.group(0)
+            count += 1
+            return markup + match.group(0) + markup
+        new_text = regex.sub(wrap, old_text)
+    else:
+        lines = old_text.split('\n')
+        matched = [index for index, line in enumerate(lines) if regex.search(line)]
+        transform = line_transform(kind, markup)
+        for index, line in zip(matched, transform([lines[index] for index in matched])):
+            lines[index] = line
+        new_text = '\n'.join(lines)
+        count = len(matched)
+
+    replace_text(editor, start, old_text, new_text)
+    return count
+
+
+class FormatMatchesDialog(QDialog):
+    # Параметры форматирования совпадений регулярного выражения
+    def __init__(self, has_selection, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Форматировать совпадения")
+
+        self.pattern_edit = QLineEdit(self)
+        self.pattern_edit.setPlaceholderText("Регулярное выражение")
+        self.pattern_edit.textChanged.connect(self.validate)
+
+        self.action_combo = QComboBox(self)
+        self.action_combo.addItems(MATCH_ACTIONS)
+
+        self.selection_check = QCheckBox("Только в выделенных строках", self)
+        self.selection_check.setEnabled(has_selection)
+        self.selection_check.setChecked(has_selection)
+
+        self.error_label = QLabel(self)
+        self.error_label.setStyleSheet("color: red;")
+
+        self.buttons = QDialogButtonBox(
+            QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel, self)
+        self.buttons.accepted.connect(self.accept)
+        self.buttons.rejected.connect(self.reject)
+
+        form = QFormLayout()
+        form.addRow("Шаблон:", self.pattern_edit)
+        form.addRow("Действие:", self.action_combo)
+
+        layout = QVBoxLayout(self)
+        layout.addLayout(form)
+        layout.addWidget(self.selection_check)
+        layout.addWidget(self.error_label)
+        layout.addWidget(self.buttons)
+        self.validate()
+
+    def validate(self):
+        pattern = self.pattern_edit.text()
+        error = ""
+        if pattern:
+            try:
+                re.compile(pattern)
+            except re.error as e:
+                error = f"Ошибка в шаблоне: {e}"
+        self.error_label.setText(error)
+        self.buttons.button(QDialogButtonBox.StandardButton.Ok).setEnabled(
+            bool(pattern) and not error)
+
+    def action(self):
+        return MATCH_ACTIONS[self.action_combo.currentText()]
@@ -0,0 +1,237 @@
+import os
+from collections import OrderedDict
+
+from PyQt6.QtCore import (Qt, QCoreApplication, QObject, QPoint, QRunnable, QSize, QThreadPool,
+                          QTimer, QUrl, pyqtSignal)
+from PyQt6.QtGui import (QColor, QImage, QImageReader, QPainter, QTextDocument)
+from PyQt6.QtWidgets import QTextEdit
+
+# Предельный объем декодированных изображений в кэше, байт
+IMAGE_CACHE_BYTES = 64 * 1024 * 1024
+# Число потоков декодирования
+IMAGE_LOADER_THREADS = 2
+# Ширина, до которой уменьшаются изображения, округляется до этого шага
+IMAGE_WIDTH_STEP = 128
+# Размер заглушки на месте еще не загруженного изображения
+PLACEHOLDER_SIZE = QSize(160, 120)
+# Задержка поиска видимых изображений после прокрутки или перерисовки, мс
+VISIBLE_SCAN_DELAY_MS = 50
+
+
+def make_placeholder(text):
+    image = QImage(PLACEHOLDER_SIZE, QImage.Format.Format_ARGB32_Premultiplied)
+    image.fill(QColor(235, 235, 235))
+    painter = QPainter(image)
+    painter.setPen(QColor(150, 150, 150))
+    painter.drawRect(0, 0, image.width() - 1, image.height() - 1)
+    painter.drawText(image.rect(), Qt.AlignmentFlag.AlignCenter, text)
+    painter.end()
+    return image
+
+
+class _DecodeSignals(QObject):
+    finished = pyqtSignal(object, object)
+
+
+class _DecodeTask(QRunnable):
+    def __init__(self, key, signals):
+        super().__init__()
+        self.key = key
+        self.signals = signals
+
+    def run(self):
+        # QImageReader уменьшает JPEG еще при декодировании, поэтому полное
+        # изображение в память не попадает
+        file_path, _, _, width = self.key
+        reader = QImageReader(file_path)
+        reader.setAutoTransform(True)
+        size = reader.size()
+        if size.isValid() and size.width() > width:
+            reader.setScaledSize(size.scaled(width, size.height() * width // size.width(),
+                                             Qt.AspectRatioMode.KeepAspectRatio))
+        image = reader.read()
+        self.signals.finished.emit(self.key, None if image.isNull() else image)
+
+
+class ImageCache(QObject):
+    # Декодированные изображения превью. Ключ - путь, время изменения,
+    # размер файла и ширина, до которой изображение уменьшено. Кэш
+    # ограничен по объему и вытесняет давно не использованные изображения
+    image_ready = pyqtSignal(str)
+
+    def __init__(self, max_bytes=IMAGE_CACHE_BYTES, parent=None):
+        super().__init__(parent)
+        self.max_bytes = max_bytes
+        self.images = OrderedDict()
+        self.total_bytes = 0
+        self.pending = set()
+        self.failed = set()
+
+        self.thread_pool = QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(IMAGE_LOADER_THREADS)
+
+        self.signals = _DecodeSignals()
+        self.signals.finished.connect(self.on_decoded)
+
+        QCoreApplication.instance().aboutToQuit.connect(self.shutdown)
+
+    def shutdown(self):
+        self.thread_pool.clear()
+        self.thread_pool.waitForDone()
+
+    @staticmethod
+    def key(file_path, width):
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        return file_path, stat.st_mtime, stat.st_size, width
+
+    def get(self, key):
+        image = self.images.get(key)
+        if image is not None:
+            self.images.move_to_end(key)
+        return image
+
+    def is_failed(self, key):
+        return key in self.failed
+
+    def request(self, key):
+        if key in self.images or key in self.pending or key in self.failed:
+            return
+        self.pending.add(key)
+        self.thread_pool.start(_DecodeTask(key, self.signals))
+
+    def on_decoded(self, key, image):
+        self.pending.discard(key)
+        if image is None:
+            self.failed.add(key)
+        else:
+            self.images[key] = image
+            self.total_bytes += image.sizeInBytes()
+            while self.total_bytes > self.max_bytes and len(self.images) > 1:
+                _, evicted = self.images.popitem(last=False)
+                self.total_bytes -= evicted.sizeInBytes()
+        self.image_ready.emit(key[0])
+
+
+class PreviewTextEdit(QTextEdit):
+    # Превью, которое берет изображения из общего кэша. Пока изображение
+    # не декодировано, на его месте стоит заглушка; декодируются только
+    # изображения, попавшие в видимую часть превью
+    def __init__(self, *args, image_cache=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.image_cache = image_cache or ImageCache(parent=self)
+        self.image_cache.image_ready.connect(self.on_image_ready)
+        self.base_dirs = []
+        # Имена изображений, на месте которых стоит заглушка -> путь к файлу
+        self.waiting_images = {}
+        self.loading_placeholder = make_placeholder("Загрузка...")
+        self.broken_placeholder = make_placeholder("Нет изображения")
+
+        self.scan_timer = QTimer(self)
+        self.scan_timer.setSingleShot(True)
+        self.scan_timer.setInterval(VISIBLE_SCAN_DELAY_MS)
+        self.scan_timer.timeout.connect(self.load_visible_images)
+        # valueChanged передает значение, которое QTimer.start принял бы за интервал
+        self.verticalScrollBar().valueChanged.connect(lambda _: self.scan_timer.start())
+        self.textChanged.connect(self.scan_timer.start)
+
+    def set_base_dirs(self, base_dirs):
+        # Папки, относительно которых ищутся изображения: папка документа
+        # и папка проекта
+        self.base_dirs = [directory for directory in base_dirs if directory]
+
+    def setDocument(self, document):
+        self.waiting_images.clear()
+        super().setDocument(document)
+        self.scan_timer.start()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.scan_timer.start()
+
+    def image_width(self):
+        width = max(self.viewport().width() - 2 * int(self.document().documentMargin()), 1)
+        return -(-width // IMAGE_WIDTH_STEP) * IMAGE_WIDTH_STEP
+
+    def resolve_image(self, url):
+        if url.isLocalFile():
+            return url.toLocalFile()
+        if url.scheme():
+            return None
+        path = url.path().replace('\\', '/')
+        if os.path.isabs(path):
+            return path
+        for directory in self.base_dirs:
+            candidate = os.path.normpath(os.path.join(directory, path))
+            if os.path.isfile(candidate):
+                return candidate
+        return None
+
+    def loadResource(self, resource_type, url):
+        if resource_type != QTextDocument.ResourceType.ImageResource.value:
+            return super().loadResource(resource_type, url)
+
+        file_path = self.resolve_image(url)
+        key = self.image_cache.key(file_path, self.image_width()) if file_path else None
+        if key is None or self.image_cache.is_failed(key):
+            return self.broken_placeholder
+        image = self.image_cache.get(key)
+        if image is not None:
+            return image
+        self.waiting_images[url.toString()] = file_path
+        self.scan_timer.start()
+        return self.loading_placeholder
+
+    def visible_image_fragments(self):
+        # Фрагменты с изображениями-заглушками в видимой части превью
+        document = self.document()
+        top = self.cursorForPosition(QPoint(0, 0)).position()
+        bottom = self.cursorForPosition(
+            QPoint(self.viewport().width(), self.viewport().height())).position()
+        block = document.findBlock(top)
+        while block.isValid() and block.position() <= bottom:
+            iterator = block.begin()
+            while not iterator.atEnd():
+                fragment = iterator.fragment()
+                char_format = fragment.charFormat()
+                if char_format.isImageFormat():
+                    # Ключ совпадает с тем, под которым изображение запрошено
+                    url = QUrl(char_format.toImageFormat().name())
+                    if url.toString() in self.waiting_images:
+                        yield url, fragment
+                iterator += 1
+            block = block.next()
+
+    def load_visible_images(self):
+        if not self.waiting_images:
+            return
+        width = self.image_width()
+        for url, _ in self.visible_image_fragments():
+            key = self.image_cache.key(self.waiting_images[url.toString()], width)
+            if key is not None:
+                self.image_cache.request(key)
+
+    def on_image_ready(self, file_path):
+        # Готовое изображение подменяет заглушку в ресурсах документа,
+        # после чего перестраиваются только блоки с ним
+        document = self.document()
+        width = self.image_width()
+        fragments = [(url, fragment) for url, fragment in self.visible_image_fragments()
+                     if self.waiting_images[url.toString()] == file_path]
+        if not fragments:
+            return
+
+        key = self.image_cache.key(file_path, width)
+        image = self.image_cache.get(key) if key else None
+        if image is None:
+            if key is not None and not self.image_cache.is_failed(key):
+                return  # готово изображение другой ширины
+            image = self.broken_placeholder
+
+        for url, _ in fragments:
+            if self.waiting_images.pop(url.toString(), None) is not None:
+                document.addResource(QTextDocument.ResourceType.ImageResource.value, url, image)
+        for _, fragment in fragments:
+            document.markContentsDirty(fragment.position(), fragment.length())
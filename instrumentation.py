@@ -0,0 +1,234 @@
+import os
+import sys
+import json
+import time
+import threading
+import functools
+from collections import deque
+
+from PyQt6.QtCore import (QObject, QTimer, pyqtSignal)
+
+# Наибольшее число событий трассировки в памяти, старые вытесняются
+TRACE_MAX_EVENTS = 200000
+# Период проверки задержек цикла событий, мс
+STALL_CHECK_INTERVAL_MS = 50
+# Задержка цикла событий сверх периода, которая считается зависанием, мс
+STALL_THRESHOLD_MS = 100
+# Период обновления показателей, мс
+OVERLAY_REFRESH_MS = 1000
+
+
+def process_memory():
+    # Резидентная память процесса, байт, или None, если на этой
+    # платформе ее узнать нельзя
+    try:
+        if sys.platform == "win32":
+            return windows_process_memory()
+        if sys.platform == "darwin":
+            import resource
+            # На macOS ru_maxrss - пик резидентной памяти в байтах
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError, ImportError):
+        return None
+
+
+def windows_process_memory():
+    import ctypes
+    from ctypes import wintypes
+
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [("cb", wintypes.DWORD),
+                    ("PageFaultCount", wintypes.DWORD),
+                    ("PeakWorkingSetSize", ctypes.c_size_t),
+                    ("WorkingSetSize", ctypes.c_size_t),
+                    ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                    ("PagefileUsage", ctypes.c_size_t),
+                    ("PeakPagefileUsage", ctypes.c_size_t)]
+
+    counters = ProcessMemoryCounters()
+    counters.cb = ctypes.sizeof(counters)
+    kernel32 = ctypes.windll.kernel32
+    kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+    kernel32.K32GetProcessMemoryInfo.argtypes = [
+        wintypes.HANDLE, ctypes.POINTER(ProcessMemoryCounters), wintypes.DWORD]
+    if not kernel32.K32GetProcessMemoryInfo(
+            kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+        return None
+    return counters.WorkingSetSize
+
+
+def format_bytes(size):
+    if size >= 1024 * 1024:
+        return f"{size / (1024 * 1024):.1f} МБ"
+    return f"{size / 1024:.0f} КБ"
+
+
+class TraceRecorder:
+    # События трассировки в формате Chrome trace (chrome://tracing,
+    # Perfetto). Пока запись выключена, замеры почти ничего не стоят
+    def __init__(self, max_events=TRACE_MAX_EVENTS):
+        self.enabled = False
+        self.events = deque(maxlen=max_events)
+        self.origin = time.perf_counter()
+        # Последняя длительность каждого замера, мс
+        self.last_durations = {}
+
+    def clear(self):
+        self.events.clear()
+        self.last_durations.clear()
+
+    def timestamp(self, moment):
+        return (moment - self.origin) * 1000000
+
+    def add_complete(self, name, start, duration, category="slot", args=None):
+        if not self.enabled:
+            return
+        event = {"name": name, "cat": category, "ph": "X", "ts": self.timestamp(start),
+                 "dur": duration * 1000000, "pid": os.getpid(), "tid": threading.get_ident()}
+        if args:
+            event["args"] = args
+        self.events.append(event)
+        self.last_durations[name] = duration * 1000
+
+    def add_counter(self, name, values):
+        if self.enabled:
+            self.events.append({"name": name, "ph": "C", "ts": self.timestamp(time.perf_counter()),
+                                "pid": os.getpid(), "args": values})
+
+    def span(self, name, category="slot"):
+        return _Span(self, name, category)
+
+    def export_chrome_trace(self, path):
+        names = [{"name": "thread_name", "ph": "M", "pid": os.getpid(),
+                  "tid": threading.main_thread().ident, "args": {"name": "GUI"}}]
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump({"traceEvents": names + list(self.events), "displayTimeUnit": "ms"},
+                      file, ensure_ascii=False)
+
+
+class _Span:
+    def __init__(self, recorder, name, category):
+        self.recorder = recorder
+        self.name = name
+        self.category = category
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.recorder.add_complete(
+            self.name, self.start, time.perf_counter() - self.start, self.category)
+        return False
+
+
+# Общий журнал замеров приложения
+recorder = TraceRecorder()
+
+
+def timed(name, category="slot"):
+    # Замер длительности метода; при выключенной записи метод вызывается
+    # напрямую
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not recorder.enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                recorder.add_complete(name, start, time.perf_counter() - start, category)
+        return wrapper
+    return decorator
+
+
+class PerformanceMonitor(QObject):
+    # Показатели для строки состояния: задержки цикла событий, число
+    # отрисовок превью в секунду, размер документов по вкладкам и память
+    # процесса. Задержки цикла событий ловит таймер: если он сработал
+    # намного позже срока, главный поток был занят
+    updated = pyqtSignal(str)
+
+    def __init__(self, tab_sizes, parent=None):
+        super().__init__(parent)
+        # tab_sizes() -> [(id вкладки, заголовок, число символов, активна ли)]
+        self.tab_sizes = tab_sizes
+        self.render_times = deque()
+        self.stalls = deque()
+        self.last_tick = None
+
+        self.stall_timer = QTimer(self)
+        self.stall_timer.setInterval(STALL_CHECK_INTERVAL_MS)
+        self.stall_timer.timeout.connect(self.check_stall)
+
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setInterval(OVERLAY_REFRESH_MS)
+        self.refresh_timer.timeout.connect(self.refresh)
+
+    def set_enabled(self, enabled):
+        recorder.enabled = enabled
+        if enabled:
+            self.last_tick = time.perf_counter()
+            self.stall_timer.start()
+            self.refresh_timer.start()
+            self.refresh()
+        else:
+            self.stall_timer.stop()
+            self.refresh_timer.stop()
+
+    def check_stall(self):
+        now = time.perf_counter()
+        delay = (now - self.last_tick) * 1000 - STALL_CHECK_INTERVAL_MS
+        if delay > STALL_THRESHOLD_MS:
+            recorder.add_complete("зависание цикла событий", self.last_tick,
+                                  now - self.last_tick, category="stall")
+            self.stalls.append((now, delay))
+        self.last_tick = now
+
+    def on_preview_rendered(self):
+        if recorder.enabled:
+            self.render_times.append(time.perf_counter())
+
+    def refresh(self):
+        now = time.perf_counter()
+        while self.render_times and now - self.render_times[0] > 1:
+            self.render_times.popleft()
+        # Зависания за последние 10 секунд
+        while self.stalls and now - self.stalls[0][0] > 10:
+            self.stalls.popleft()
+
+        tabs = self.tab_sizes()
+        # Текст QTextDocument хранится в UTF-16
+        total_size = sum(characters for _, _, characters, _ in tabs) * 2
+        current = next((characters for _, _, characters, active in tabs if active), None)
+        memory = process_memory()
+        renders = len(self.render_times)
+        worst_stall = max((delay for _, delay in self.stalls), default=0)
+
+        memory_counters = {"документы": total_size}
+        if memory is not None:
+            memory_counters["процесс"] = memory
+        recorder.add_counter("память", memory_counters)
+        recorder.add_counter("превью", {"отрисовок в секунду": renders})
+        # Одноименные файлы из разных папок различаются по id вкладки
+        recorder.add_counter("вкладки", {f"{title} [{tab_id[:8]}]": characters * 2
+                                         for tab_id, title, characters, _ in tabs})
+
+        parts = [f"Превью: {renders}/с", f"Зависания: {len(self.stalls)}"
+                 + (f", до {worst_stall:.0f} мс" if self.stalls else "")]
+        slowest = max(recorder.last_durations.items(), key=lambda item: item[1], default=None)
+        if slowest is not None:
+            parts.append(f"Дольше всего: {slowest[0]} {slowest[1]:.1f} мс")
+        if current is not None:
+            parts.append(f"Документ: {format_bytes(current * 2)}")
+        parts.append(f"Вкладки: {len(tabs)}, {format_bytes(total_size)}")
+        if memory is not None:
+            parts.append(f"Память: {format_bytes(memory)}")
+        self.updated.emit(" | ".join(parts))
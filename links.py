@@ -0,0 +1,291 @@
+import os
+import re
+import sqlite3
+from urllib.parse import unquote
+
+from PyQt6.QtCore import (Qt, QRunnable, pyqtSignal)
+from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QComboBox, QLabel, QPushButton,
+                             QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView)
+
+from export import IMAGE_LINK_RE, PAGE_LINK_RE, EXTERNAL_LINK_RE, link_target
+from project_index import ProjectIndex
+
+# Наибольшее число строк в списке проблемных ссылок
+LINKS_RESULTS_LIMIT = 1000
+
+# Путь Windows с буквой диска - не схема адреса, хотя похож на "c:"
+DRIVE_PATH_RE = re.compile(r'^[a-zA-Z]:/')
+FENCE_RE = re.compile(r'^ {0,3}(?:```|~~~)')
+
+LINK_IMAGE = "изображение"
+LINK_PAGE = "страница"
+
+STATUS_OK = "ok"
+STATUS_MISSING = "нет файла"
+STATUS_OUTSIDE = "вне проекта"
+# Фильтры панели: подпись -> статусы
+LINK_FILTERS = {
+    "Все проблемы": (STATUS_MISSING, STATUS_OUTSIDE),
+    "Нет файла": (STATUS_MISSING,),
+    "Вне проекта": (STATUS_OUTSIDE,),
+}
+
+
+def extract_links(text):
+    # Локальные ссылки страницы: [(номер строки, вид, путь)]. Внешние
+    # адреса, якоря и ссылки внутри блоков кода пропускаются
+    links = []
+    inside_fence = False
+    for number, line in enumerate(text.split('\n'), 1):
+        if FENCE_RE.match(line):
+            inside_fence = not inside_fence
+            continue
+        if inside_fence or '](' not in line:
+            continue
+        images = list(IMAGE_LINK_RE.finditer(line))
+        # Изображения закрываются пробелами: в ссылке-значке
+        # "[![i](img.png)](page.md)" иначе находится изображение, а не страница
+        masked = line
+        for match in reversed(images):
+            masked = masked[:match.start()] + ' ' * (match.end() - match.start()) + \
+                masked[match.end():]
+        for kind, matches in ((LINK_IMAGE, images), (LINK_PAGE, PAGE_LINK_RE.finditer(masked))):
+            for match in matches:
+                target = link_target(match.group(2))
+                if not target or (EXTERNAL_LINK_RE.match(target)
+                                  and not DRIVE_PATH_RE.match(target)):
+                    continue
+                links.append((number, kind, target))
+    return links
+
+
+class _RecheckTask(QRunnable):
+    # Повторная проверка ссылок на измененные пути (или на все пути, если
+    # file_paths is None) без разбора страниц: меняются только статусы
+    def __init__(self, link_index, generation, file_paths, cancel_event):
+        super().__init__()
+        self.link_index = link_index
+        self.generation = generation
+        self.database_path = link_index.database_path
+        self.file_paths = file_paths
+        self.signals = link_index.signals
+        self.cancel_event = cancel_event
+
+    def run(self):
+        try:
+            connection = self.link_index.open_database(self.database_path)
+            try:
+                self.recheck(connection)
+            finally:
+                connection.close()
+        except Exception as e:
+            self.signals.failed.emit(self.generation, str(e))
+
+    def recheck(self, connection):
+        stat_cache = self.link_index.stat_cache
+        if self.file_paths is None:
+            stat_cache.clear()
+            file_paths = [path for path, in connection.execute(
+                "SELECT DISTINCT resolved FROM links")]
+        else:
+            file_paths = self.file_paths
+            for file_path in file_paths:
+                stat_cache.pop(file_path, None)
+
+        for file_path in file_paths:
+            if self.cancel_event.is_set():
+                connection.commit()
+                return
+            connection.execute("UPDATE links SET status = ? WHERE resolved = ?",
+                               (self.link_index.link_status(file_path), file_path))
+        connection.commit()
+
+        count = connection.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+        self.signals.finished.emit(self.generation, count)
+
+
+class LinkIndex(ProjectIndex):
+    # Ссылки и изображения всех страниц проекта с путями, разрешенными
+    # относительно страницы, и результатом проверки. Наличие файлов
+    # проверяется через общий кэш: путь, на который ссылаются тысячи
+    # страниц, проверяется один раз. Изменение файла на диске перепроверяет
+    # только ссылки на него, страницы при этом заново не читаются
+    kind = "links"
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        # Путь -> существует ли файл; используется только в фоновом потоке
+        self.stat_cache = {}
+
+    def create_tables(self, connection):
+        connection.execute('''CREATE TABLE IF NOT EXISTS links (
+            file_id INTEGER NOT NULL,
+            line INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            target TEXT NOT NULL,
+            resolved TEXT NOT NULL,
+            status TEXT NOT NULL)''')
+        connection.execute("CREATE INDEX IF NOT EXISTS links_file ON links (file_id)")
+        connection.execute("CREATE INDEX IF NOT EXISTS links_resolved ON links (resolved)")
+        connection.execute("CREATE INDEX IF NOT EXISTS links_status ON links (status)")
+
+    def file_exists(self, file_path):
+        exists = self.stat_cache.get(file_path)
+        if exists is None:
+            exists = self.stat_cache[file_path] = os.path.exists(file_path)
+        return exists
+
+    def link_status(self, file_path):
+        if not self.file_exists(file_path):
+            return STATUS_MISSING
+        if not file_path.startswith(os.path.join(self.root, '')):
+            return STATUS_OUTSIDE
+        return STATUS_OK
+
+    def resolve(self, page_dir, target):
+        # Путь без якоря и параметров; "%20" и подобные раскодируются,
+        # если путь как есть не найден
+        path = target.partition('#')[0].partition('?')[0]
+        resolved = os.path.normpath(os.path.join(page_dir, path))
+        if '%' in path and not self.file_exists(resolved):
+            decoded = os.path.normpath(os.path.join(page_dir, unquote(path)))
+            if self.file_exists(decoded):
+                return decoded
+        return resolved
+
+    def index_text(self, connection, file_id, file_path, text):
+        page_dir = os.path.dirname(file_path)
+        rows = []
+        for line, kind, target in extract_links(text):
+            resolved = self.resolve(page_dir, target)
+            rows.append((file_id, line, kind, target, resolved, self.link_status(resolved)))
+        connection.executemany('''INSERT INTO links (file_id, line, kind, target, resolved, status)
+            VALUES (?, ?, ?, ?, ?, ?)''', rows)
+
+    def remove_entries(self, connection, file_id):
+        connection.execute("DELETE FROM links WHERE file_id = ?", (file_id,))
+
+    def set_root(self, root):
+        if os.path.abspath(root) == self.root:
+            return
+        self.stat_cache = {}
+        super().set_root(root)
+        # Страницы, не изменившиеся с прошлого запуска, не разбираются,
+        # но файлы, на которые они ссылаются, могли появиться или исчезнуть
+        self.thread_pool.start(_RecheckTask(self, self.generation, None, self.cancel_event))
+
+    def update_files(self, file_paths):
+        # Измененные страницы разбираются заново, а ссылки на любой
+        # измененный путь - страницу, изображение, удаленный файл -
+        # перепроверяются
+        if self.root is None:
+            return
+        super().update_files(file_paths)
+        file_paths = sorted({os.path.abspath(path) for path in file_paths})
+        if file_paths:
+            self.thread_pool.start(_RecheckTask(
+                self, self.generation, file_paths, self.cancel_event))
+
+    def recheck_all(self):
+        if self.root is not None:
+            self.thread_pool.start(_RecheckTask(self, self.generation, None, self.cancel_event))
+
+    def status_counts(self):
+        if self.connection is None:
+            return {}
+        return dict(self.connection.execute(
+            "SELECT status, COUNT(*) FROM links GROUP BY status").fetchall())
+
+    def problems(self, statuses, limit=LINKS_RESULTS_LIMIT):
+        # Строки (путь страницы, строка, вид, ссылка, статус)
+        if self.connection is None:
+            return []
+        marks = ', '.join('?' * len(statuses))
+        try:
+            return self.connection.execute(f'''SELECT files.path, links.line, links.kind,
+                links.target, links.status
+                FROM links JOIN files ON files.id = links.file_id
+                WHERE links.status IN ({marks})
+                ORDER BY files.path, links.line LIMIT ?''', (*statuses, limit)).fetchall()
+        except sqlite3.Error as e:
+            print(f"Ошибка при запросе к ссылкам: {e}")
+            return []
+
+
+class LinkPanel(QWidget):
+    # Панель проверки ссылок: битые ссылки и изображения вне проекта
+    file_activated = pyqtSignal(str)
+
+    def __init__(self, link_index, parent=None):
+        super().__init__(parent)
+        self.link_index = link_index
+
+        self.filter_combo = QComboBox(self)
+        self.filter_combo.addItems(LINK_FILTERS)
+        self.filter_combo.currentIndexChanged.connect(self.run_query)
+        self.recheck_button = QPushButton("Проверить", self)
+        self.recheck_button.setToolTip("Проверить заново все ссылки проекта")
+        self.recheck_button.clicked.connect(self.recheck)
+
+        self.status_label = QLabel(self)
+        self.status_label.setStyleSheet("color: gray;")
+
+        self.results_table = QTableWidget(0, 4, self)
+        self.results_table.setHorizontalHeaderLabels(["Файл", "Строка", "Ссылка", "Проблема"])
+        self.results_table.horizontalHeader().setSectionResizeMode(
+            QHeaderView.ResizeMode.Stretch)
+        self.results_table.verticalHeader().hide()
+        self.results_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.results_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.results_table.cellActivated.connect(self.on_cell_activated)
+        self.results_table.cellClicked.connect(self.on_cell_activated)
+
+        filter_layout = QHBoxLayout()
+        filter_layout.addWidget(self.filter_combo)
+        filter_layout.addWidget(self.recheck_button)
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addLayout(filter_layout)
+        layout.addWidget(self.status_label)
+        layout.addWidget(self.results_table)
+
+        link_index.indexing_progress.connect(
+            lambda count: self.status_label.setText(f"Проверка ссылок... {count}"))
+        link_index.indexing_finished.connect(self.on_indexing_finished)
+        link_index.indexing_failed.connect(
+            lambda error: self.status_label.setText(f"Ошибка проверки ссылок: {error}"))
+
+    def on_indexing_finished(self, _count):
+        if self.isVisible():
+            self.run_query()
+
+    def recheck(self):
+        self.status_label.setText("Проверка ссылок...")
+        self.link_index.recheck_all()
+
+    def run_query(self):
+        rows = self.link_index.problems(LINK_FILTERS[self.filter_combo.currentText()])
+
+        root = self.link_index.root or ''
+        self.results_table.setRowCount(len(rows))
+        for row, (file_path, line, kind, target, status) in enumerate(rows):
+            file_item = QTableWidgetItem(os.path.relpath(file_path, root))
+            file_item.setToolTip(file_path)
+            file_item.setData(Qt.ItemDataRole.UserRole, file_path)
+            self.results_table.setItem(row, 0, file_item)
+            self.results_table.setItem(row, 1, QTableWidgetItem(str(line)))
+            target_item = QTableWidgetItem(target)
+            target_item.setToolTip(f"{kind}: {target}")
+            self.results_table.setItem(row, 2, target_item)
+            self.results_table.setItem(row, 3, QTableWidgetItem(status))
+
+        counts = self.link_index.status_counts()
+        self.status_label.setText(
+            f"Ссылок: {sum(counts.values())}, нет файла: {counts.get(STATUS_MISSING, 0)}, "
+            f"вне проекта: {counts.get(STATUS_OUTSIDE, 0)}")
+
+    def on_cell_activated(self, row, _column):
+        item = self.results_table.item(row, 0)
+        if item is not None:
+            self.file_activated.emit(item.data(Qt.ItemDataRole.UserRole))
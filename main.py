@@ -1,26 +1,106 @@
 import os
 import sys
 import json
-from PyQt6.QtCore import (Qt, QDir, QEvent, QSettings)
-from PyQt6.QtWidgets import (QApplication, QWidget, QMainWindow, QVBoxLayout, QTextEdit,
-                             QTreeView, QToolBar, QTabWidget, QSplitter, QFileDialog, QLabel, QDialog, QMessageBox)
-from PyQt6.QtGui import (QFileSystemModel, QTextCursor, QAction, QIcon)
+import time
+
+# Момент запуска для замера --profile-startup, до загрузки Qt
+STARTUP_TIME = time.perf_counter()
+
+from PyQt6.QtCore import (Qt, QDir, QEvent, QPoint, QTimer)
+from PyQt6.QtWidgets import (QApplication, QWidget, QMainWindow, QVBoxLayout, QPlainTextEdit,
+                             QPlainTextDocumentLayout, QTreeView, QToolBar, QTabWidget, QSplitter, QFileDialog, QLabel, QDialog, QMessageBox)
+from PyQt6.QtGui import (QTextCursor, QTextDocument, QAction, QIcon)
+
+from preview import PreviewRenderer, DEFAULT_DEBOUNCE_MS
+from documents import (Document, DocumentRegistry, TabPlaceholder, MemoryReportDialog,
+                       changed_range, document_hash, document_memory, new_session_id,
+                       utf16_position, EDITOR_MEMORY_LIMIT_MB)
+from session import SessionStore, SESSION_SAVE_DELAY_MS, app_settings
+from file_io import FileLoader, FileSaver
+from recovery import AutosaveManager, AUTOSAVE_INTERVAL_MS, journal_files, read_journal
+from search import SearchService, SearchPanel
+from metadata import MetadataIndex, MetadataPanel
+from links import LinkIndex, LinkPanel
+from watcher import FileWatcher
+from export import export_main, render_markdown_html, page_title
+from images import PreviewTextEdit
+from project_tree import ProjectTreeModel, is_image_file
+from startup import StartupProfiler
+from instrumentation import PerformanceMonitor, process_memory, recorder, timed
+from viewer import LargeFileViewer, VIEWER_THRESHOLD_MB
+from template_catalog import TemplateService, TemplatePickerDialog, BulkCreateDialog
+from outline import OutlinePanel
+from formatting import (FormatMatchesDialog, format_matches, replace_text, spans_lines,
+                        toggle_header_lines, toggle_quote_lines, toggle_wrap_lines,
+                        transform_selected_lines)
+from replace import ProjectReplace, ProjectReplaceDialog, replace_all
+from project_index import is_indexed_file
 
 
 class PlantCareEditor(QMainWindow):
-    def __init__(self):
+    def __init__(self, startup_profiler=None):
         super().__init__()
+        # Окно показывается с активной вкладкой, остальные вкладки, папка
+        # проекта и значки достраиваются после первой отрисовки
+        self.startup_profiler = startup_profiler or StartupProfiler(parent=self)
+        self.startup_profiler.first_paint.connect(self.run_deferred_startup)
+        self.startup_waiting = {"deferred", "document"}
+        self.deferred_icons = []
+        self.deferred_tabs = []
+        self.startup_document = None
         self.window_width, self.window_height = 800, 600
         self.setMinimumSize(self.window_width, self.window_height)
         self.setWindowTitle('Справочник по уходу за растениями')
         self.setStyleSheet('''QWidget { font-size: 16px; }''')
 
         self.current_directory = QDir.currentPath()
+        # Открытые документы по пути и по вкладке
+        self.documents = DocumentRegistry()
+        # Живые редакторы в порядке последней активации
+        self.editor_history = []
+
+        # Фоновая загрузка файлов: документ -> (QTextDocument, курсор,
+        # оставлять ли вкладку при ошибке)
+        self.file_loader = FileLoader(self)
+        self.file_loader.chunk_loaded.connect(self.on_file_chunk_loaded)
+        self.file_loader.finished.connect(self.on_file_loaded)
+        self.file_loader.failed.connect(self.on_file_load_failed)
+        self.loading_documents = {}
+
+        # Фоновая запись файлов. Снимок текста помечается номером правки,
+        # вкладки из closing_documents закрываются после успешной записи
+        self.file_saver = FileSaver(self)
+        self.file_saver.saved.connect(self.on_file_saved)
+        self.file_saver.failed.connect(self.on_file_save_failed)
+        self.closing_documents = set()
+
+        # Изменения файлов на диске: открытые вкладки перечитываются в фоне,
+        # для измененных пользователем вкладок выдается запрос
+        self.file_watcher = FileWatcher(self)
+        self.file_watcher.files_changed.connect(self.on_files_changed)
+        self.file_reloader = FileLoader(self)
+        self.file_reloader.chunk_loaded.connect(self.on_reload_chunk_loaded)
+        self.file_reloader.finished.connect(self.on_file_reloaded)
+        self.file_reloader.failed.connect(self.on_file_reload_failed)
+        self.reloading_documents = {}
+        self.reload_prompts = []
+        self.reload_prompt_open = False
+
+        # Состояние вкладок записывается понемногу по мере изменений
+        self.session_store = SessionStore()
+        self.session_changed = set()
+        self.session_timer = QTimer(self)
+        self.session_timer.setSingleShot(True)
+        self.session_timer.setInterval(SESSION_SAVE_DELAY_MS)
+        self.session_timer.timeout.connect(self.flush_session)
+
         self.init_ui()
+        self.startup_profiler.watch(self)
 
     def init_ui(self):
         # Создание меню
         self.create_menus()
+        self.startup_profiler.mark("меню")
 
         # Главный виджет и макет
         self.main_widget = QWidget()
@@ -33,22 +113,55 @@ class PlantCareEditor(QMainWindow):
         self.main_layout.addWidget(self.splitter)
 
         # Боковая панель файловой системы
-        self.file_model = QFileSystemModel()
-        self.file_model.setRootPath(self.current_directory)
-        self.file_model.setFilter(
-            QDir.Filter.AllEntries | QDir.Filter.NoDotAndDotDot)
+        # Дерево показывает только папки, страницы и изображения и читает
+        # папки в фоне при раскрытии
+        settings = app_settings()
+        self.file_model = ProjectTreeModel(self)
+        self.file_model.set_show_images(
+            settings.value("tree_show_images", False, type=bool))
+        self.file_watcher.files_changed.connect(self.file_model.on_files_changed)
 
         self.file_view = QTreeView()
         self.file_view.setModel(self.file_model)
-        self.file_view.setRootIndex(
-            self.file_model.index(self.current_directory))
-        self.file_view.setColumnHidden(1, True)
-        self.file_view.setColumnHidden(2, True)
-        self.file_view.setColumnHidden(3, True)
+        self.file_view.setUniformRowHeights(True)
         self.file_view.setHeaderHidden(True)
         self.file_view.setMaximumWidth(self.window_width // 4)
         self.file_view.clicked.connect(self.open_file)
-        self.splitter.addWidget(self.file_view)
+
+        # Поиск по проекту под деревом файлов
+        # Панели поиска и выборки создаются при первом открытии
+        self.search_service = SearchService(self)
+        self.search_panel = None
+
+        # Выборка по полям шаблонов
+        self.metadata_index = MetadataIndex(self)
+        self.metadata_panel = None
+
+        # Проверка ссылок и изображений
+        self.link_index = LinkIndex(self)
+        self.links_panel = None
+
+        # Структура активного документа
+        self.outline_panel = None
+
+        # Индексы по файлам папки проекта
+        self.project_indexes = [self.search_service, self.metadata_index, self.link_index]
+
+        # Поиск и замена по проекту в отдельных процессах
+        self.replace_service = ProjectReplace(parent=self)
+        self.replace_service.applied.connect(self.on_project_replaced)
+        self.replace_dialog = None
+
+        # Каталог шаблонов и массовое создание страниц по шаблону
+        self.template_service = TemplateService(self)
+        self.template_service.pages_progress.connect(
+            lambda done, total: self.statusBar().showMessage(
+                f"Создание страниц: {done} из {total}"))
+        self.template_service.pages_created.connect(self.on_pages_created)
+
+        self.sidebar = QSplitter(Qt.Orientation.Vertical)
+        self.sidebar.addWidget(self.file_view)
+        self.splitter.addWidget(self.sidebar)
 
         # Контейнер для вкладок и редактора с превью
         self.content_splitter = QSplitter(Qt.Orientation.Horizontal)
@@ -61,14 +174,45 @@ class PlantCareEditor(QMainWindow):
         self.tab_widget.currentChanged.connect(
             self.update_preview_on_tab_change)
         self.tab_widget.tabCloseRequested.connect(self.close_tab)
+        self.tab_widget.tabBar().tabMoved.connect(
+            lambda *_: self.schedule_session_save())
         self.tab_widget.tabBar().setMouseTracking(True)
         self.tab_widget.tabBar().installEventFilter(self)
         self.content_splitter.addWidget(self.tab_widget)
 
         # Превью
-        self.preview_widget = QTextEdit(readOnly=True)
+        self.preview_widget = PreviewTextEdit(readOnly=True)
         self.content_splitter.addWidget(self.preview_widget)
 
+        # Отрисовка превью с задержкой и в фоновом потоке
+        self.preview_renderer = PreviewRenderer(
+            self.preview_widget,
+            settings.value("preview_debounce_ms", DEFAULT_DEBOUNCE_MS, type=int), self)
+        # Превью прокручивается вслед за редактором
+        self.preview_scroll_sync = settings.value("preview_scroll_sync", True, type=bool)
+        self.preview_renderer.rendered.connect(
+            lambda _: self.sync_preview_scroll(self.get_current_editor()))
+        # Предел числа живых редакторов, 0 - без ограничения
+        self.max_live_editors = settings.value("max_live_editors", 0, type=int)
+        # Предел оценки памяти живых редакторов, байт, 0 - без ограничения
+        self.max_editor_memory = settings.value(
+            "max_editor_memory_mb", EDITOR_MEMORY_LIMIT_MB, type=int) * 1024 * 1024
+        # Файлы от этого размера открываются только для просмотра, байт
+        self.viewer_threshold = settings.value(
+            "viewer_threshold_mb", VIEWER_THRESHOLD_MB, type=int) * 1024 * 1024
+        # Журналы несохраненных правок для восстановления после сбоя
+        self.autosave = AutosaveManager(
+            settings.value("autosave_interval_ms", AUTOSAVE_INTERVAL_MS, type=int), parent=self)
+
+        # Показатели производительности в строке состояния
+        self.performance_label = QLabel(self)
+        self.performance_label.setStyleSheet("color: gray;")
+        self.performance_label.hide()
+        self.statusBar().addPermanentWidget(self.performance_label)
+        self.performance_monitor = PerformanceMonitor(self.tab_sizes, self)
+        self.performance_monitor.updated.connect(self.performance_label.setText)
+        self.preview_renderer.rendered.connect(self.performance_monitor.on_preview_rendered)
+
         # Информационный текст, если все панели скрыты
         self.info_label = QLabel(
             "Все панели скрыты. Используйте меню 'Вид', чтобы их вернуть.", self)
@@ -76,8 +220,10 @@ class PlantCareEditor(QMainWindow):
         self.info_label.setStyleSheet("font-size: 16px; color: gray;")
         self.info_label.hide()
         self.main_layout.addWidget(self.info_label)
+        self.startup_profiler.mark("интерфейс")
 
         self.restore_application_state()
+        self.startup_profiler.mark("активная вкладка")
 
         # Создание тулбара
         self.toolbar = QToolBar("Стиль")
@@ -86,8 +232,7 @@ class PlantCareEditor(QMainWindow):
 
         # Drag and Drop для открытия файлов/директорий
         self.setAcceptDrops(True)
-
-        self.create_new_tab()
+        self.startup_profiler.mark("панель инструментов")
 
     def create_menus(self):
         # Создание меню
@@ -97,14 +242,13 @@ class PlantCareEditor(QMainWindow):
         file_menu = menu_bar.addMenu("Файл")
 
         new_action = QAction("Создать файл", self)
-        new_action.setIcon(QIcon.fromTheme(QIcon.ThemeIcon.DocumentNew))
+        self.set_theme_icon(new_action, QIcon.ThemeIcon.DocumentNew)
         new_action.setShortcut("Ctrl+N")
         new_action.triggered.connect(self.create_new_tab)
         file_menu.addAction(new_action)
 
         template_action = QAction("Создать из шаблона...", self)
-        template_action.setIcon(QIcon.fromTheme(
-            QIcon.ThemeIcon.DocumentPageSetup))
+        self.set_theme_icon(template_action, QIcon.ThemeIcon.DocumentPageSetup)
         template_action.setShortcut("Alt+N")
         template_action.triggered.connect(self.select_template)
         file_menu.addAction(template_action)
@@ -112,13 +256,12 @@ class PlantCareEditor(QMainWindow):
         file_menu.addSeparator()
 
         open_project_action = QAction("Открыть проект...", self)
-        open_project_action.setIcon(
-            QIcon.fromTheme(QIcon.ThemeIcon.FolderOpen))
+        self.set_theme_icon(open_project_action, QIcon.ThemeIcon.FolderOpen)
         open_project_action.triggered.connect(self.change_working_directory)
         file_menu.addAction(open_project_action)
 
         open_action = QAction("Открыть файл...", self)
-        open_action.setIcon(QIcon.fromTheme(QIcon.ThemeIcon.DocumentOpen))
+        self.set_theme_icon(open_action, QIcon.ThemeIcon.DocumentOpen)
         open_action.setShortcut("Ctrl+O")
         open_action.triggered.connect(self.open_file_dialog)
         file_menu.addAction(open_action)
@@ -126,13 +269,13 @@ class PlantCareEditor(QMainWindow):
         file_menu.addSeparator()
 
         save_action = QAction("Сохранить", self)
-        save_action.setIcon(QIcon.fromTheme(QIcon.ThemeIcon.DocumentSave))
+        self.set_theme_icon(save_action, QIcon.ThemeIcon.DocumentSave)
         save_action.setShortcut("Ctrl+S")
         save_action.triggered.connect(self.save_file)
         file_menu.addAction(save_action)
 
         save_as_action = QAction("Сохранить как...", self)
-        save_as_action.setIcon(QIcon.fromTheme(QIcon.ThemeIcon.DocumentSaveAs))
+        self.set_theme_icon(save_as_action, QIcon.ThemeIcon.DocumentSaveAs)
         save_as_action.triggered.connect(self.save_file_as)
         file_menu.addAction(save_as_action)
 
@@ -143,7 +286,7 @@ class PlantCareEditor(QMainWindow):
         file_menu.addSeparator()
 
         exit_action = QAction("Выход", self)
-        exit_action.setIcon(QIcon.fromTheme(QIcon.ThemeIcon.WindowClose))
+        self.set_theme_icon(exit_action, QIcon.ThemeIcon.WindowClose)
         exit_action.setShortcut("Ctrl+Q")
         exit_action.triggered.connect(self.close)
         file_menu.addAction(exit_action)
@@ -152,23 +295,35 @@ class PlantCareEditor(QMainWindow):
         edit_menu = menu_bar.addMenu("Правка")
 
         cut_action = QAction("Вырезать", self)
-        cut_action.setIcon(QIcon.fromTheme(QIcon.ThemeIcon.EditCut))
+        self.set_theme_icon(cut_action, QIcon.ThemeIcon.EditCut)
         cut_action.setShortcut("Ctrl+X")
         cut_action.triggered.connect(self.cut_text)
         edit_menu.addAction(cut_action)
 
         copy_action = QAction("Копировать", self)
-        copy_action.setIcon(QIcon.fromTheme(QIcon.ThemeIcon.EditCopy))
+        self.set_theme_icon(copy_action, QIcon.ThemeIcon.EditCopy)
         copy_action.setShortcut("Ctrl+C")
         copy_action.triggered.connect(self.copy_text)
         edit_menu.addAction(copy_action)
 
         paste_action = QAction("Вставить", self)
-        paste_action.setIcon(QIcon.fromTheme(QIcon.ThemeIcon.EditPaste))
+        self.set_theme_icon(paste_action, QIcon.ThemeIcon.EditPaste)
         paste_action.setShortcut("Ctrl+V")
         paste_action.triggered.connect(self.paste_text)
         edit_menu.addAction(paste_action)
 
+        edit_menu.addSeparator()
+
+        format_matches_action = QAction("Форматировать совпадения...", self)
+        format_matches_action.setShortcut("Ctrl+Shift+R")
+        format_matches_action.triggered.connect(self.format_matches)
+        edit_menu.addAction(format_matches_action)
+
+        replace_action = QAction("Заменить в проекте...", self)
+        replace_action.setShortcut("Ctrl+Shift+H")
+        replace_action.triggered.connect(self.show_replace_dialog)
+        edit_menu.addAction(replace_action)
+
         # Меню "Вид"
         view_menu = menu_bar.addMenu("Вид")
 
@@ -180,40 +335,91 @@ class PlantCareEditor(QMainWindow):
         toggle_editor_action.triggered.connect(self.toggle_editor_visibility)
         view_menu.addAction(toggle_editor_action)
 
+        view_menu.addSeparator()
+
+        search_action = QAction("Поиск по проекту", self)
+        self.set_theme_icon(search_action, QIcon.ThemeIcon.EditFind)
+        search_action.setShortcut("Ctrl+Shift+F")
+        search_action.triggered.connect(self.show_search_panel)
+        view_menu.addAction(search_action)
+
+        metadata_action = QAction("Поля шаблонов", self)
+        metadata_action.setShortcut("Ctrl+Shift+M")
+        metadata_action.triggered.connect(self.show_metadata_panel)
+        view_menu.addAction(metadata_action)
+
+        links_action = QAction("Проверка ссылок", self)
+        links_action.setShortcut("Ctrl+Shift+L")
+        links_action.triggered.connect(self.show_links_panel)
+        view_menu.addAction(links_action)
+
+        outline_action = QAction("Структура документа", self)
+        outline_action.setShortcut("Ctrl+Shift+O")
+        outline_action.triggered.connect(self.show_outline_panel)
+        view_menu.addAction(outline_action)
+
+        scroll_sync_action = QAction("Синхронная прокрутка превью", self)
+        scroll_sync_action.setCheckable(True)
+        scroll_sync_action.setChecked(app_settings().value(
+            "preview_scroll_sync", True, type=bool))
+        scroll_sync_action.toggled.connect(self.set_preview_scroll_sync)
+        view_menu.addAction(scroll_sync_action)
+
+        view_menu.addSeparator()
+
+        show_images_action = QAction("Изображения в дереве файлов", self)
+        show_images_action.setCheckable(True)
+        show_images_action.setChecked(app_settings().value(
+            "tree_show_images", False, type=bool))
+        show_images_action.toggled.connect(self.set_tree_show_images)
+        view_menu.addAction(show_images_action)
+
+        view_menu.addSeparator()
+
+        performance_action = QAction("Показатели производительности", self)
+        performance_action.setCheckable(True)
+        performance_action.toggled.connect(self.toggle_performance_overlay)
+        view_menu.addAction(performance_action)
+
+        export_trace_action = QAction("Экспорт трассировки...", self)
+        export_trace_action.triggered.connect(self.export_trace)
+        view_menu.addAction(export_trace_action)
+
+        memory_report_action = QAction("Память по вкладкам", self)
+        memory_report_action.triggered.connect(self.show_memory_report)
+        view_menu.addAction(memory_report_action)
+
         # Меню "Справка"
         help_menu = menu_bar.addMenu("Справка")
 
         about_action = QAction("О программе", self)
-        about_action.setIcon(QIcon.fromTheme(QIcon.ThemeIcon.HelpAbout))
+        self.set_theme_icon(about_action, QIcon.ThemeIcon.HelpAbout)
         about_action.triggered.connect(self.show_about_dialog)
         help_menu.addAction(about_action)
 
     def add_toolbar_actions(self):
         # **Жирный**
         bold_action = QAction("Жирный", self)
-        bold_action.setIcon(QIcon.fromTheme(QIcon.ThemeIcon.FormatTextBold))
+        self.set_theme_icon(bold_action, QIcon.ThemeIcon.FormatTextBold)
         bold_action.triggered.connect(lambda: self.toggle_format_text("**"))
         self.toolbar.addAction(bold_action)
 
         # *Курсивный*
         italic_action = QAction("Курсив", self)
-        italic_action.setIcon(QIcon.fromTheme(
-            QIcon.ThemeIcon.FormatTextItalic))
+        self.set_theme_icon(italic_action, QIcon.ThemeIcon.FormatTextItalic)
         italic_action.triggered.connect(lambda: self.toggle_format_text("*"))
         self.toolbar.addAction(italic_action)
 
         # _Подчеркнутый_
         emphasized_action = QAction("Подчеркнутый", self)
-        emphasized_action.setIcon(QIcon.fromTheme(
-            QIcon.ThemeIcon.FormatTextUnderline))
+        self.set_theme_icon(emphasized_action, QIcon.ThemeIcon.FormatTextUnderline)
         emphasized_action.triggered.connect(
             lambda: self.toggle_format_text("_"))
         self.toolbar.addAction(emphasized_action)
 
         # ~~Зачеркнутый~~
         crossed_out_action = QAction("Зачеркнутый", self)
-        crossed_out_action.setIcon(QIcon.fromTheme(
-            QIcon.ThemeIcon.FormatTextStrikethrough))
+        self.set_theme_icon(crossed_out_action, QIcon.ThemeIcon.FormatTextStrikethrough)
         crossed_out_action.triggered.connect(
             lambda: self.toggle_format_text("~~"))
         self.toolbar.addAction(crossed_out_action)
@@ -253,106 +459,458 @@ class PlantCareEditor(QMainWindow):
         h6_action.triggered.connect(lambda: self.insert_header("###### "))
         self.toolbar.addAction(h6_action)
 
-    def create_new_tab(self, template=""):
-        editor = QTextEdit()
-        editor.setAcceptRichText(False)
+    def create_editor(self, document, text_document=None):
+        # Редактор простого текста раскладывает только видимые строки, а
+        # его QTextDocument - единственная копия текста вкладки
+        editor = QPlainTextEdit()
+        if text_document is not None:
+            # Документ, заполненный заранее при загрузке файла
+            text_document.setParent(editor)
+            text_document.setDefaultFont(editor.font())
+            editor.setDocument(text_document)
         editor.setPlaceholderText(
             "Начните писать или выберите шаблон для нового документа")
         editor.textChanged.connect(lambda: self.update_preview(editor))
+        editor.verticalScrollBar().valueChanged.connect(
+            lambda _: self.sync_preview_scroll(editor))
+        editor.document().contentsChanged.connect(
+            lambda: self.on_document_contents_changed(document))
+        editor.document().modificationChanged.connect(
+            lambda: self.update_tab_title(document))
+        self.autosave.attach(document, editor.document())
+        return editor
+
+    def add_document_tab(self, document, widget, index=None):
+        document.widget = widget
+        self.documents.add(document)
+        if document.file_path:
+            self.file_watcher.watch_file(document.file_path)
+        if index is None:
+            index = self.tab_widget.addTab(widget, document.title)
+        else:
+            index = self.tab_widget.insertTab(index, widget, document.title)
+        self.tab_widget.setTabToolTip(index, document.file_path or "")
+        self.schedule_session_save(document)
+        return index
+
+    def document_at(self, index):
+        return self.documents.for_widget(self.tab_widget.widget(index))
+
+    def current_document(self):
+        return self.documents.for_widget(self.tab_widget.currentWidget())
+
+    def mark_file_synced(self, document, digest, mtime=None):
+        # Содержимое редактора совпадает с файлом: запоминаем хэш и время
+        # изменения, чтобы проверки не обращались к диску
+        document.content_hash = digest
+        if mtime is None:
+            try:
+                mtime = os.path.getmtime(document.file_path)
+            except OSError:
+                pass
+        document.file_mtime = mtime
+        document.editor.document().setModified(False)
+        self.autosave.reset(document)
+        self.update_tab_title(document)
+
+    def set_document_path(self, document, file_path):
+        if document.file_path:
+            self.file_watcher.unwatch_file(document.file_path)
+        self.documents.set_path(document, file_path)
+        self.file_watcher.watch_file(file_path)
+        self.update_tab_title(document)
+        self.schedule_session_save(document)
+
+    def update_tab_title(self, document):
+        index = self.tab_widget.indexOf(document.widget)
+        if index < 0:
+            return
+        self.tab_widget.setTabText(index, document.title)
+        self.tab_widget.setTabToolTip(index, document.file_path or "")
+
+    def on_document_contents_changed(self, document):
+        document.content_hash = None
+        document.revision += 1
+        self.schedule_session_save(document)
+
+    def create_new_tab(self, template=""):
+        document = Document()
+        editor = self.create_editor(document)
 
-        self.tab_widget.addTab(editor, "Новый файл")
+        self.add_document_tab(document, editor)
         self.tab_widget.setCurrentWidget(editor)
 
         if template:
             editor.setPlainText(template)
 
         editor.setFocus()
+        return document
+
+    @timed("open_document")
+    def open_document(self, file_path):
+        # Уже открытый файл только активируется, поиск идет по
+        # каноническому пути, а не по имени вкладки
+        document = self.documents.find(file_path)
+        if document is not None:
+            self.tab_widget.setCurrentWidget(document.widget)
+            return document
+
+        if not os.path.isfile(file_path):
+            raise FileNotFoundError(f"Файл не найден: {file_path}")
+
+        document = Document(file_path)
+        if self.opens_in_viewer(file_path):
+            self.add_document_tab(document, self.create_viewer(document))
+            self.tab_widget.setCurrentWidget(document.widget)
+            return document
+
+        # Вкладка появляется сразу, а содержимое читается в фоне
+        self.add_placeholder_tab(document)
+        self.start_loading(document, keep_on_error=False)
+        self.tab_widget.setCurrentWidget(document.widget)
+        return document
+
+    def opens_in_viewer(self, file_path):
+        try:
+            return os.path.getsize(file_path) >= self.viewer_threshold
+        except OSError:
+            return False
+
+    def create_viewer(self, document):
+        # Просмотр без загрузки текста в редактор; превью строится только
+        # по видимым строкам
+        viewer = LargeFileViewer(document.file_path, document.scroll_position)
+        viewer.position_changed.connect(
+            lambda position: self.on_viewer_scrolled(document, position))
+        viewer.source.textChanged.connect(
+            lambda: self.preview_renderer.schedule(viewer.source))
+        try:
+            document.file_mtime = os.path.getmtime(document.file_path)
+        except OSError:
+            pass
+        return viewer
+
+    def on_viewer_scrolled(self, document, position):
+        document.scroll_position = position
+        self.schedule_session_save(document)
+
+    def create_placeholder(self, document):
+        placeholder = TabPlaceholder(document.file_path)
+        placeholder.cancel_requested.connect(
+            lambda: self.cancel_loading(document))
+        return placeholder
+
+    def add_placeholder_tab(self, document):
+        return self.add_document_tab(document, self.create_placeholder(document))
+
+    def start_loading(self, document, keep_on_error=True):
+        text_document = QTextDocument()
+        text_document.setDocumentLayout(QPlainTextDocumentLayout(text_document))
+        text_document.setUndoRedoEnabled(False)
+        self.loading_documents[document] = (
+            text_document, QTextCursor(text_document), keep_on_error)
+        document.widget.set_progress(0, 1)
+        self.file_loader.load(document.file_path, document)
+
+    def cancel_loading(self, document):
+        self.file_loader.cancel(document)
+        self.loading_documents.pop(document, None)
+        if document is self.startup_document:
+            self.startup_step_done("document")
+        if self.documents.for_widget(document.widget) is document:
+            self.remove_document_tab(document)
+
+    def on_file_chunk_loaded(self, document, text, done, total):
+        if document not in self.loading_documents:
+            return
+        _, cursor, _ = self.loading_documents[document]
+        cursor.insertText(text)
+        document.widget.set_progress(done, total)
+
+    @timed("on_file_loaded")
+    def on_file_loaded(self, document, digest):
+        if document not in self.loading_documents:
+            return
+        text_document, _, _ = self.loading_documents.pop(document)
+        text_document.setUndoRedoEnabled(True)
+        text_document.setModified(False)
+
+        expected_hash = document.content_hash
+        editor = self.create_editor(document, text_document)
+        index = self.tab_widget.indexOf(document.widget)
+        self.replace_tab_widget(index, editor)
+        self.mark_file_synced(document, digest)
+
+        # Позиция восстанавливается, только если файл не менялся
+        if expected_hash == document.content_hash:
+            cursor = editor.textCursor()
+            cursor.setPosition(min(document.cursor_position,
+                                   text_document.characterCount() - 1))
+            editor.setTextCursor(cursor)
+            scroll_position = document.scroll_position
+            QTimer.singleShot(
+                0, lambda: editor.verticalScrollBar().setValue(scroll_position))
+
+        if self.tab_widget.currentIndex() == index:
+            self.update_preview_on_tab_change(index)
+            editor.setFocus()
+        if document is self.startup_document:
+            self.startup_step_done("document")
+
+    def on_file_load_failed(self, document, error):
+        if document not in self.loading_documents:
+            return
+        _, _, keep_on_error = self.loading_documents.pop(document)
+        print(f"Ошибка при открытии файла: {error}")
+        if document is self.startup_document:
+            self.startup_step_done("document")
+        if keep_on_error:
+            document.widget.set_error(error)
+        else:
+            self.remove_document_tab(document)
+
+    def replace_tab_widget(self, index, widget):
+        # Подмена содержимого вкладки без лишних сигналов смены вкладки
+        old_widget = self.tab_widget.widget(index)
+        document = self.documents.for_widget(old_widget)
+        is_current = self.tab_widget.currentIndex() == index
+
+        self.tab_widget.blockSignals(True)
+        self.tab_widget.removeTab(index)
+        self.documents.set_widget(document, widget)
+        self.tab_widget.insertTab(index, widget, document.title)
+        self.tab_widget.setTabToolTip(index, document.file_path or "")
+        if is_current:
+            self.tab_widget.setCurrentIndex(index)
+        self.tab_widget.blockSignals(False)
+
+        old_widget.deleteLater()
+
+    def remove_document_tab(self, document):
+        if document in self.loading_documents:
+            self.file_loader.cancel(document)
+            del self.loading_documents[document]
+        self.closing_documents.discard(document)
+        self.autosave.detach(document)
+        if document in self.reloading_documents:
+            self.file_reloader.cancel(document)
+            del self.reloading_documents[document]
+        if document.file_path and self.documents.find(document.file_path) is document:
+            self.file_watcher.unwatch_file(document.file_path)
+        self.tab_widget.removeTab(self.tab_widget.indexOf(document.widget))
+        self.documents.remove(document)
+        if document.widget in self.editor_history:
+            self.editor_history.remove(document.widget)
+        if isinstance(document.widget, LargeFileViewer):
+            document.widget.close_file()
+        document.widget.deleteLater()
+        self.schedule_session_save()
+
+    def materialize_tab(self, index):
+        document = self.document_at(index)
+        if document in self.loading_documents or document.widget.error:
+            return
+        if self.opens_in_viewer(document.file_path):
+            self.replace_tab_widget(index, self.create_viewer(document))
+            return
+        self.start_loading(document)
+
+    def touch_editor(self, editor):
+        if editor in self.editor_history:
+            self.editor_history.remove(editor)
+        self.editor_history.append(editor)
+
+        if self.max_live_editors <= 0 and self.max_editor_memory <= 0:
+            return
+
+        memory = {}
+        if self.max_editor_memory > 0:
+            memory = {old_editor: document_memory(old_editor.document())
+                      for old_editor in self.editor_history}
+        total_memory = sum(memory.values())
+
+        # Давно не использованные сохраненные вкладки снова становятся
+        # заглушками, пока живых редакторов больше предела или их текст
+        # занимает больше памяти, чем разрешено
+        for old_editor in list(self.editor_history):
+            if not (0 < self.max_live_editors < len(self.editor_history)
+                    or 0 < self.max_editor_memory < total_memory):
+                break
+            document = self.documents.for_widget(old_editor)
+            if document is None:
+                self.editor_history.remove(old_editor)
+                total_memory -= memory.get(old_editor, 0)
+                continue
+            if old_editor is editor or not document.file_path or document.is_dirty:
+                continue
+            self.editor_history.remove(old_editor)
+            total_memory -= memory.get(old_editor, 0)
+            self.autosave.detach(document)
+            document.cursor_position = old_editor.textCursor().position()
+            document.scroll_position = old_editor.verticalScrollBar().value()
+            self.replace_tab_widget(self.tab_widget.indexOf(old_editor),
+                                    self.create_placeholder(document))
+
+    def schedule_session_save(self, document=None):
+        if document is not None:
+            self.session_changed.add(document)
+        if not self.session_timer.isActive():
+            self.session_timer.start()
+
+    def session_record(self, document, discard_changes=False, include_body=True):
+        record = {"tab_id": document.session_id, "path": document.file_path or "",
+                  "cursor": document.cursor_position, "scroll": document.scroll_position,
+                  "content_hash": document.content_hash, "body": None}
+
+        editor = document.editor
+        if editor is None:
+            return record
+
+        record.update(cursor=editor.textCursor().position(),
+                      scroll=editor.verticalScrollBar().value())
+        if document.is_dirty:
+            # Текст хранится только для несохраненных буферов. Между
+            # выходами из программы правки сохраняет журнал автосохранения
+            record["content_hash"] = None
+            if not include_body:
+                del record["body"]
+            elif not discard_changes:
+                record["body"] = editor.toPlainText()
+        elif document.file_path and document.content_hash is None:
+            document.content_hash = document_hash(editor.document())
+            record["content_hash"] = document.content_hash
+        return record
+
+    @timed("flush_session")
+    def flush_session(self, all_tabs=False, discard_changes=False):
+        self.session_timer.stop()
+        tab_ids, changed_tabs = [], []
+        for i in range(self.tab_widget.count()):
+            document = self.document_at(i)
+            tab_ids.append(document.session_id)
+            if all_tabs or document in self.session_changed:
+                changed_tabs.append(
+                    self.session_record(document, discard_changes, include_body=all_tabs))
+        self.session_changed.clear()
+
+        try:
+            self.session_store.save_tabs(tab_ids, changed_tabs)
+        except Exception as e:
+            print(f"Ошибка при сохранении сеанса: {e}")
 
     def save_file(self):
-        current_editor = self.get_current_editor()
-        if current_editor:
-            file_path = self.tab_widget.tabToolTip(
-                self.tab_widget.currentIndex())
-            if file_path:
-                try:
-                    with open(file_path, 'w', encoding='utf-8') as file:
-                        file.write(current_editor.toPlainText())
-                    self.current_directory = os.path.dirname(file_path)
-                except Exception as e:
-                    QMessageBox.critical(
-                        self, "Ошибка", f"Ошибка при сохранении файла: {e}")
+        document = self.current_document()
+        if document and document.editor:
+            if document.file_path:
+                self.save_file_by_path(
+                    document.file_path, document.editor.toPlainText(), document)
             else:
                 self.save_file_as()
 
     def save_file_as(self):
-        current_editor = self.get_current_editor()
-        if current_editor:
+        document = self.current_document()
+        if document and document.editor:
             file_path, _ = QFileDialog.getSaveFileName(
                 self, "Сохранить файл как", self.current_directory, "Markdown Files (*.md)")
             if file_path:
-                try:
-                    with open(file_path, 'w', encoding='utf-8') as file:
-                        file.write(current_editor.toPlainText())
-                    self.tab_widget.setTabText(
-                        self.tab_widget.currentIndex(), os.path.basename(file_path))
-                    self.current_directory = os.path.dirname(file_path)
-                    self.tab_widget.setTabToolTip(
-                        self.tab_widget.currentIndex(), file_path)
-                except Exception as e:
-                    QMessageBox.critical(
-                        self, "Ошибка", f"Ошибка при сохранении файла: {e}")
+                self.save_file_by_path(
+                    file_path, document.editor.toPlainText(), document)
+                return True
+        return False
 
     def select_template(self):
-        templates_dir = os.path.join(self.current_directory, "templates")
-        if os.path.exists(templates_dir) and os.path.isdir(templates_dir):
-            templates = [f for f in os.listdir(
-                templates_dir) if f.endswith(".md")]
-
-            if templates:
-                template, _ = QFileDialog.getOpenFileName(
-                    self, "Выберите шаблон", templates_dir, "Markdown Files (*.md)")
-                if template:
-                    with open(template, 'r', encoding='utf-8') as file:
-                        content = file.read()
-                        self.create_new_tab(content)
-            else:
-                QMessageBox.warning(
-                    self, "Ошибка", "В директории нет доступных шаблонов.")
+        # Шаблоны программы, пользователя и проекта; прочитанные шаблоны
+        # берутся из кэша
+        templates = self.template_service.templates(self.current_directory)
+        if not templates:
+            QMessageBox.warning(
+                self, "Ошибка", "Нет доступных шаблонов.")
+            return
+
+        picker = TemplatePickerDialog(templates, self)
+        if picker.exec() != QDialog.DialogCode.Accepted:
+            return
+        template = picker.selected_template()
+        if picker.bulk:
+            self.create_pages_from_template(template)
         else:
+            self.create_new_tab(template.text)
+
+    def create_pages_from_template(self, template):
+        dialog = BulkCreateDialog(template, self.current_directory, self)
+        if dialog.exec() != QDialog.DialogCode.Accepted:
+            return
+        try:
+            self.template_service.create_pages(
+                template, dialog.directory_edit.text(), dialog.pattern_edit.text(),
+                dialog.count_spin.value(), dialog.start_date())
+        except (KeyError, IndexError, ValueError) as e:
             QMessageBox.warning(
-                self, "Ошибка", "Директория с шаблонами не найдена.")
+                self, "Ошибка", f"Неверный шаблон имени файла: {e}")
+
+    def on_pages_created(self, created, failed):
+        self.statusBar().showMessage(f"Создано страниц: {len(created)}", 5000)
+        if failed:
+            details = "\n".join(f"{os.path.basename(file_path)}: {error}"
+                                for file_path, error in failed[:20])
+            QMessageBox.warning(
+                self, "Ошибка", f"Не удалось создать страниц: {len(failed)}\n\n{details}")
 
     def close_tab(self, index):
         self.tab_widget.removeTab(index)
 
+    @timed("update_preview")
     def update_preview(self, editor):
-        if editor:
-            self.preview_widget.setMarkdown(editor.toPlainText())
+        # Превью отображает только активную вкладку
+        if editor and editor is self.get_current_editor():
+            self.preview_renderer.schedule(editor)
 
+    @timed("update_preview_on_tab_change")
     def update_preview_on_tab_change(self, index):
+        if isinstance(self.tab_widget.widget(index), TabPlaceholder):
+            self.materialize_tab(index)
+
         editor = self.get_current_editor()
         if editor:
-            self.preview_widget.setMarkdown(editor.toPlainText())
+            self.touch_editor(editor)
+        elif isinstance(self.tab_widget.currentWidget(), LargeFileViewer):
+            # Превью показывает видимые строки файла
+            editor = self.tab_widget.currentWidget().source
+        self.update_preview_base_dirs()
+        self.preview_renderer.set_editor(editor)
+        if not editor:
+            self.preview_widget.clear()
+        if self.outline_panel is not None:
+            self.outline_panel.set_editor(self.get_current_editor())
+
+    def sync_preview_scroll(self, editor):
+        if self.preview_scroll_sync and editor and editor is self.get_current_editor():
+            # Первый видимый символ редактора
+            self.preview_renderer.scroll_to_source(
+                editor.cursorForPosition(QPoint(0, 0)).position())
+
+    def set_preview_scroll_sync(self, enabled):
+        self.preview_scroll_sync = enabled
+        app_settings().setValue("preview_scroll_sync", enabled)
+        self.sync_preview_scroll(self.get_current_editor())
+
+    def update_preview_base_dirs(self):
+        # Изображения ищутся рядом с документом, затем в папке проекта
+        document = self.current_document()
+        self.preview_widget.set_base_dirs([
+            os.path.dirname(document.file_path) if document and document.file_path else None,
+            self.current_directory])
 
     def open_file(self, index):
-        file_path = self.file_model.filePath(index)
-
-        for i in range(self.tab_widget.count()):
-            tab_text = self.tab_widget.tabText(i)
-            if tab_text == os.path.basename(file_path):
-                self.tab_widget.setCurrentIndex(i)
-                return
+        # Папки раскрываются деревом, изображения в редакторе не открываются
+        file_path = self.file_model.file_path(index)
+        if self.file_model.is_dir(index) or is_image_file(file_path):
+            return
+        self.open_file_path(file_path)
 
+    def open_file_path(self, file_path):
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                content = file.read()
-                self.create_new_tab()
-                current_editor = self.get_current_editor()
-                current_editor.setPlainText(content)
-                self.tab_widget.setTabText(
-                    self.tab_widget.currentIndex(), os.path.basename(file_path))
-                self.tab_widget.setTabToolTip(
-                    self.tab_widget.currentIndex(), file_path)
+            self.open_document(file_path)
         except Exception as e:
             print(f"Ошибка при открытии файла: {e}")
 
@@ -362,13 +920,7 @@ class PlantCareEditor(QMainWindow):
         if file_paths:
             for file_path in file_paths:
                 try:
-                    with open(file_path, 'r', encoding='utf-8') as file:
-                        content = file.read()
-                        self.create_new_tab(content)
-                        self.tab_widget.setTabText(
-                            self.tab_widget.currentIndex(), os.path.basename(file_path))
-                        self.tab_widget.setTabToolTip(
-                            self.tab_widget.currentIndex(), file_path)
+                    self.open_document(file_path)
                 except Exception as e:
                     print(f"Ошибка при открытии файла: {e}")
 
@@ -380,8 +932,10 @@ class PlantCareEditor(QMainWindow):
                 self, "Экспортировать в HTML", self.current_directory, "HTML Files (*.html)")
             if html_path:
                 try:
+                    # Выгружается отрисованный Markdown, а не исходный текст
+                    text = current_editor.toPlainText()
                     with open(html_path, 'w', encoding='utf-8') as file:
-                        file.write(current_editor.toHtml())
+                        file.write(render_markdown_html(text, page_title(text, html_path)))
                     self.current_directory = os.path.dirname(html_path)
                 except Exception as e:
                     QMessageBox.critical(
@@ -389,13 +943,18 @@ class PlantCareEditor(QMainWindow):
 
     def get_current_editor(self):
         current_widget = self.tab_widget.currentWidget()
-        if isinstance(current_widget, QTextEdit):
+        if isinstance(current_widget, QPlainTextEdit):
             return current_widget
 
     def toggle_format_text(self, wrapper):
         editor = self.get_current_editor()
         if editor:
             cursor = editor.textCursor()
+            if spans_lines(cursor):
+                # Несколько строк форматируются одной правкой, каждая отдельно
+                transform_selected_lines(editor, lambda lines: toggle_wrap_lines(lines, wrapper))
+                return
+            cursor.beginEditBlock()
             if cursor.hasSelection():
                 selected_text = cursor.selectedText()
                 cursor.insertText(f"{wrapper}{selected_text}{wrapper}")
@@ -404,11 +963,15 @@ class PlantCareEditor(QMainWindow):
                 cursor.insertText(wrapper)
                 cursor.movePosition(QTextCursor.MoveOperation.EndOfWord)
                 cursor.insertText(wrapper)
+            cursor.endEditBlock()
 
     def insert_quote(self):
         editor = self.get_current_editor()
         if editor:
             cursor = editor.textCursor()
+            if spans_lines(cursor):
+                transform_selected_lines(editor, toggle_quote_lines)
+                return
             cursor.movePosition(QTextCursor.MoveOperation.StartOfBlock)
             current_line = cursor.block().text()
             if current_line.startswith('> '):
@@ -421,6 +984,9 @@ class PlantCareEditor(QMainWindow):
         editor = self.get_current_editor()
         if editor:
             cursor = editor.textCursor()
+            if spans_lines(cursor):
+                transform_selected_lines(editor, lambda lines: toggle_header_lines(lines, header))
+                return
             cursor.movePosition(QTextCursor.MoveOperation.StartOfBlock)
             current_line = cursor.block().text().strip()
 
@@ -428,6 +994,8 @@ class PlantCareEditor(QMainWindow):
                 cursor.insertText(header)
                 return
 
+            # Замена заголовка - один шаг отмены
+            cursor.beginEditBlock()
             if current_line.startswith(header):
                 cursor.select(QTextCursor.SelectionType.BlockUnderCursor)
                 # Удаляем только заголовок, оставляя остальной текст
@@ -444,6 +1012,82 @@ class PlantCareEditor(QMainWindow):
                 # Перемещаем курсор в начало строки перед вставкой
                 cursor.movePosition(QTextCursor.MoveOperation.StartOfBlock)
                 cursor.insertText(header)
+            cursor.endEditBlock()
+
+    def format_matches(self):
+        editor = self.get_current_editor()
+        if not editor:
+            return
+        dialog = FormatMatchesDialog(editor.textCursor().hasSelection(), self)
+        if dialog.exec() != QDialog.DialogCode.Accepted:
+            return
+        kind, markup = dialog.action()
+        count = format_matches(editor, dialog.pattern_edit.text(), kind, markup,
+                               dialog.selection_check.isChecked())
+        self.statusBar().showMessage(f"Отформатировано совпадений: {count}", 5000)
+
+    def show_replace_dialog(self):
+        if self.replace_dialog is None:
+            self.replace_dialog = ProjectReplaceDialog(self.replace_service, self)
+            self.replace_dialog.search_requested.connect(self.start_project_replace_search)
+            self.replace_dialog.replace_requested.connect(self.apply_project_replace)
+            self.replace_dialog.file_activated.connect(self.open_file_path)
+        self.replace_dialog.show()
+        self.replace_dialog.raise_()
+        self.replace_dialog.activateWindow()
+        self.replace_dialog.focus_find()
+
+    def start_project_replace_search(self, options):
+        # Открытые вкладки ищутся по тексту в редакторе, с несохраненными
+        # правками; остальные файлы процессы читают с диска
+        root = os.path.abspath(self.current_directory)
+        prefix = os.path.join(root, '')
+        open_texts = {}
+        for document in self.documents:
+            if (document.editor is not None and document.file_path
+                    and is_indexed_file(document.file_path)
+                    and os.path.abspath(document.file_path).startswith(prefix)):
+                open_texts[document.file_path] = document.editor.toPlainText()
+        self.replace_dialog.root = root
+        self.replace_service.scan(root, options, open_texts, self.viewer_threshold)
+
+    def apply_project_replace(self, files, options):
+        # Открытые вкладки меняются через свои документы: замена - одна
+        # правка с отменой, вкладка без несохраненных правок сразу
+        # записывается. Остальные файлы меняют процессы пула
+        open_results, disk_files = [], []
+        for file_path, digest in files:
+            document = self.documents.find(file_path)
+            if document is not None and document.editor is not None:
+                open_results.append((file_path, self.replace_in_document(document, options), None))
+            else:
+                disk_files.append((file_path, digest))
+        self.replace_service.apply(disk_files, options, open_results)
+
+    def replace_in_document(self, document, options):
+        editor = document.editor
+        text = editor.toPlainText()
+        new_text, count, _ = replace_all(text, options)
+        if not count:
+            return 0
+        was_dirty = document.is_dirty
+        replace_text(editor, 0, text, new_text)
+        # Вкладка записывается, только если правка дала в точности новый
+        # текст: расхождение с документом на диск не попадает
+        if not was_dirty and editor.toPlainText() == new_text:
+            self.file_saver.save(document.file_path, new_text, (document, document.revision))
+        return count
+
+    def on_project_replaced(self, results, seconds, _cancelled):
+        changed = [file_path for file_path, count, error in results if error is None and count]
+        for project_index in self.project_indexes:
+            project_index.update_files(changed)
+        for file_path in changed:
+            # Заглушки и просмотрщики узнают о новом содержимом файла
+            document = self.documents.find(file_path)
+            if document is not None and document.editor is None:
+                self.check_file_on_disk(document)
+        self.statusBar().showMessage(f"Замена выполнена в файлах: {len(changed)}", 5000)
 
     def insert_image(self):
         image_path, _ = QFileDialog.getOpenFileName(
@@ -475,14 +1119,92 @@ class PlantCareEditor(QMainWindow):
         action.setText(
             "Скрыть превью" if not is_visible else "Показать превью")
 
+    def show_search_panel(self):
+        if self.search_panel is None:
+            self.search_panel = SearchPanel(self.search_service)
+            self.search_panel.setMaximumWidth(self.window_width // 4)
+            self.search_panel.file_activated.connect(self.open_file_path)
+            self.sidebar.insertWidget(1, self.search_panel)
+        self.search_panel.show()
+        self.search_panel.focus_query()
+
+    def show_metadata_panel(self):
+        if self.metadata_panel is None:
+            self.metadata_panel = MetadataPanel(self.metadata_index)
+            self.metadata_panel.setMaximumWidth(self.window_width // 4)
+            self.metadata_panel.file_activated.connect(self.open_file_path)
+            self.sidebar.addWidget(self.metadata_panel)
+            self.metadata_panel.refresh_fields()
+        self.metadata_panel.show()
+        self.metadata_panel.run_query()
+
+    def show_links_panel(self):
+        if self.links_panel is None:
+            self.links_panel = LinkPanel(self.link_index)
+            self.links_panel.setMaximumWidth(self.window_width // 4)
+            self.links_panel.file_activated.connect(self.open_file_path)
+            self.sidebar.addWidget(self.links_panel)
+        self.links_panel.show()
+        self.links_panel.run_query()
+
+    def show_outline_panel(self):
+        if self.outline_panel is None:
+            self.outline_panel = OutlinePanel()
+            self.outline_panel.setMaximumWidth(self.window_width // 4)
+            self.sidebar.addWidget(self.outline_panel)
+            self.outline_panel.set_editor(self.get_current_editor())
+        self.outline_panel.show()
+        self.outline_panel.focus_filter()
+
+    def tab_sizes(self):
+        current = self.current_document()
+        return [(document.session_id, document.title,
+                 document.editor.document().characterCount() if document.editor else 0,
+                 document is current)
+                for document in self.documents]
+
+    def toggle_performance_overlay(self, enabled):
+        # Пока показатели скрыты, замеры не записываются
+        self.performance_monitor.set_enabled(enabled)
+        self.performance_label.setVisible(enabled)
+
+    def export_trace(self):
+        if not recorder.events:
+            QMessageBox.warning(
+                self, "Ошибка",
+                "Трассировка пуста. Включите 'Вид' - 'Показатели производительности'.")
+            return
+        trace_path, _ = QFileDialog.getSaveFileName(
+            self, "Экспорт трассировки", self.current_directory, "Chrome Trace (*.json)")
+        if trace_path:
+            try:
+                recorder.export_chrome_trace(trace_path)
+            except Exception as e:
+                QMessageBox.critical(
+                    self, "Ошибка", f"Ошибка при экспорте трассировки: {e}")
+
+    def show_memory_report(self):
+        preview_document = self.preview_widget.document()
+        documents = [self.document_at(i) for i in range(self.tab_widget.count())]
+        dialog = MemoryReportDialog(documents, self.loading_documents, [
+            ("Документ превью", document_memory(preview_document)),
+            ("Память процесса", process_memory())], self)
+        dialog.exec()
+
+    def set_tree_show_images(self, show_images):
+        self.file_model.set_show_images(show_images)
+        app_settings().setValue("tree_show_images", show_images)
+
     def change_working_directory(self, directory=None):
         if not directory:
             directory = QFileDialog.getExistingDirectory(
                 self, "Выбрать папку проекта", self.current_directory)
         if directory:
             self.current_directory = directory
-            self.file_model.setRootPath(directory)
-            self.file_view.setRootIndex(self.file_model.index(directory))
+            self.file_model.set_root(directory)
+            for project_index in self.project_indexes:
+                project_index.set_root(directory)
+            self.file_watcher.set_root(directory)
 
     def dragEnterEvent(self, event):
         if event.mimeData().hasUrls():
@@ -502,15 +1224,7 @@ class PlantCareEditor(QMainWindow):
                     self.change_working_directory(file_path)
             else:
                 try:
-                    with open(file_path, 'r', encoding='utf-8') as file:
-                        content = file.read()
-                        self.create_new_tab()
-                        current_editor = self.get_current_editor()
-                        current_editor.setPlainText(content)
-                        self.tab_widget.setTabText(
-                            self.tab_widget.currentIndex(), os.path.basename(file_path))
-                        self.tab_widget.setTabToolTip(
-                            self.tab_widget.currentIndex(), file_path)
+                    self.open_document(file_path)
                 except Exception as e:
                     print(
                         f"Ошибка при открытии файла через drag and drop: {e}")
@@ -553,135 +1267,245 @@ class PlantCareEditor(QMainWindow):
         if editor:
             editor.paste()
 
+    @timed("close_tab")
     def close_tab(self, index):
-        editor = self.tab_widget.widget(index)
-        if isinstance(editor, QTextEdit):
-            file_path = self.tab_widget.tabToolTip(index)
-            if file_path:
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        content_on_disk = f.read()
-                        if editor.toPlainText() != content_on_disk:
-
-                            reply = QMessageBox.question(self, 'Несохраненные изменения',
-                                                         f"В файле '{os.path.basename(file_path)}' имеются несохраненные изменения. Сохранить?",
-                                                         QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No | QMessageBox.StandardButton.Cancel)
-
-                            if reply == QMessageBox.StandardButton.Yes:
-                                self.save_file_by_path(
-                                    file_path, editor.toPlainText())
-                                self.tab_widget.removeTab(index)
-                            elif reply == QMessageBox.StandardButton.No:
-                                self.tab_widget.removeTab(index)
-                            else:
-                                return
-
-                except FileNotFoundError:
-                    # Обработка случая, когда файл был удален вне приложения
-                    reply = QMessageBox.question(self, 'Файл не найден',
-                                                 f"Файл '{os.path.basename(file_path)}' не найден. Сохранить как?",
-                                                 QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No | QMessageBox.StandardButton.Cancel)
-                    if reply == QMessageBox.StandardButton.Yes:
-                        self.save_file_as()
-                    elif reply == QMessageBox.StandardButton.No:
-                        self.tab_widget.removeTab(index)
-                    else:
-                        return
-
-            elif editor.toPlainText().strip():  # Если файл не существует, но есть текст
-                reply = QMessageBox.question(self, 'Несохраненные изменения',
-                                             "Имеются несохраненные изменения. Сохранить?",
-                                             QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No | QMessageBox.StandardButton.Cancel)
+        document = self.document_at(index)
+        if document is None:
+            self.tab_widget.removeTab(index)
+            return
+
+        if document.is_dirty:
+            if document.file_path:
+                message = f"В файле '{os.path.basename(document.file_path)}' имеются несохраненные изменения. Сохранить?"
+            else:  # Если файл не существует, но есть текст
+                message = "Имеются несохраненные изменения. Сохранить?"
+
+            reply = QMessageBox.question(self, 'Несохраненные изменения', message,
+                                         QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No | QMessageBox.StandardButton.Cancel)
 
-                if reply == QMessageBox.StandardButton.Yes:
-                    self.save_file_as()
-                elif reply == QMessageBox.StandardButton.No:
-                    self.tab_widget.removeTab(index)
+            if reply == QMessageBox.StandardButton.Yes:
+                if document.file_path:
+                    self.save_file_by_path(
+                        document.file_path, document.editor.toPlainText(), document)
                 else:
-                    return  # отмена закрытия вкладки
+                    self.tab_widget.setCurrentWidget(document.widget)
+                    if not self.save_file_as():
+                        return  # сохранение было отменено
+                # Вкладка закроется, когда файл будет записан
+                self.closing_documents.add(document)
+                return
+            elif reply != QMessageBox.StandardButton.No:
+                return  # отмена закрытия вкладки
 
         # Если файл не был изменен или вкладка пустая
-        self.tab_widget.removeTab(index)
+        self.remove_document_tab(document)
 
+    @timed("closeEvent")
     def closeEvent(self, event):
-        self.save_application_state()
+        dirty_documents = [self.document_at(i) for i in range(self.tab_widget.count())
+                           if self.document_at(i).is_dirty]
 
-        unsaved_changes = False
-        for i in range(self.tab_widget.count()):
-            editor = self.tab_widget.widget(i)
-            if isinstance(editor, QTextEdit):
-                file_path = self.tab_widget.tabToolTip(i)
-                if file_path:
-                    try:
-                        with open(file_path, 'r', encoding='utf-8') as f:
-                            content_on_disk = f.read()
-                            if editor.toPlainText() != content_on_disk:
-                                unsaved_changes = True
-                                break
-                    except FileNotFoundError:
-                        unsaved_changes = True
-                        break
-                elif editor.toPlainText().strip():
-                    unsaved_changes = True
-                    break
-
-        if unsaved_changes:
+        if dirty_documents:
             reply = QMessageBox.question(self, 'Несохраненные изменения',
                                          "Имеются несохраненные изменения. Сохранить?",
                                          QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No | QMessageBox.StandardButton.Cancel)
             if reply == QMessageBox.StandardButton.Yes:
-                for i in range(self.tab_widget.count()):
-                    editor = self.tab_widget.widget(i)
-                    if isinstance(editor, QTextEdit):
-                        file_path = self.tab_widget.tabToolTip(i)
-                        if file_path:
-                            try:
-                                with open(file_path, 'r', encoding='utf-8') as f:
-                                    content_on_disk = f.read()
-                                    if editor.toPlainText() != content_on_disk:
-                                        self.save_file_by_path(
-                                            file_path, editor.toPlainText())
-                            except FileNotFoundError:
-                                # Если файл был удален - предлагаем сохранить как...
-                                self.save_file_as()
-                        elif editor.toPlainText().strip():  # Если файла не было, сохраняем как...
-                            self.save_file_as()
+                for document in dirty_documents:
+                    if document.file_path:
+                        self.save_file_by_path(
+                            document.file_path, document.editor.toPlainText(), document)
+                    else:  # Если файла не было, сохраняем как...
+                        self.tab_widget.setCurrentWidget(document.widget)
+                        self.save_file_as()
+
+                # Файлы пишутся параллельно, окно закрывается после того,
+                # как записаны все
+                self.file_saver.wait_for_done()
+                if any(document.is_dirty for document in dirty_documents):
+                    event.ignore()  # сохранение не удалось или было отменено
+                    return
+                self.save_application_state()
+                self.autosave.discard_all()
                 event.accept()
 
             elif reply == QMessageBox.StandardButton.No:
+                # Отброшенные правки не попадают в сохраненный сеанс
+                self.save_application_state(discard_changes=True)
+                self.autosave.discard_all()
                 event.accept()
             else:
                 event.ignore()
         else:
+            self.save_application_state()
+            self.autosave.discard_all()
             event.accept()
 
-    def save_file_by_path(self, file_path, content):
+    @timed("save_file_by_path")
+    def save_file_by_path(self, file_path, content, document=None):
+        # content - снимок текста: запись идет в фоне, а правки, сделанные
+        # после снимка, оставляют документ измененным
+        if document is None:
+            document = self.current_document()
+        if document.file_path != file_path:
+            self.set_document_path(document, file_path)
+        self.current_directory = os.path.dirname(file_path)
+        self.file_saver.save(file_path, content, (document, document.revision))
+
+    @timed("on_file_saved")
+    def on_file_saved(self, context, file_path, digest, mtime):
+        document, revision = context
+        self.statusBar().showMessage(
+            f"Файл '{os.path.basename(file_path)}' сохранен", 3000)
+        for project_index in self.project_indexes:
+            project_index.update_files([file_path])
+        if self.documents.for_widget(document.widget) is not document:
+            return  # вкладка уже закрыта
+        if document.file_path != file_path:
+            return  # документ с тех пор сохранен под другим именем
+
+        if document.editor is not None and document.revision == revision:
+            self.mark_file_synced(document, digest, mtime)
+        else:
+            document.file_mtime = mtime
+
+        if document in self.closing_documents:
+            self.closing_documents.discard(document)
+            if not document.is_dirty:
+                self.remove_document_tab(document)
+
+    def on_file_save_failed(self, context, file_path, error):
+        document, _ = context
+        self.closing_documents.discard(document)
+        if document.editor is not None and document.file_path == file_path:
+            # Текст не попал в файл, вкладка остается измененной
+            document.editor.document().setModified(True)
+        QMessageBox.critical(
+            self, "Ошибка", f"Ошибка при сохранении файла: {error}")
+
+    def on_files_changed(self, file_paths):
+        # Единый поток изменений файлов для индексов и открытых вкладок
+        for project_index in self.project_indexes:
+            project_index.update_files(file_paths)
+        for file_path in file_paths:
+            document = self.documents.find(file_path)
+            if document is not None:
+                self.check_file_on_disk(document)
+
+    def check_file_on_disk(self, document):
+        if self.file_saver.is_saving(document.file_path):
+            return  # файл записывает сам редактор
         try:
-            with open(file_path, 'w', encoding='utf-8') as file:
-                file.write(content)
-            self.tab_widget.setTabText(
-                self.tab_widget.currentIndex(), os.path.basename(file_path))
-            self.current_directory = os.path.dirname(file_path)
-        except Exception as e:
-            QMessageBox.critical(
-                self, "Ошибка", f"Ошибка при сохранении файла: {e}")
+            mtime = os.path.getmtime(document.file_path)
+        except OSError:
+            if document.editor is not None and not document.is_dirty:
+                # Текст удаленного файла остается во вкладке, и его можно сохранить
+                document.editor.document().setModified(True)
+                self.statusBar().showMessage(
+                    f"Файл '{os.path.basename(document.file_path)}' удален с диска", 5000)
+            return
+        if mtime == document.file_mtime:
+            return
+
+        if document in self.loading_documents:
+            # Загрузка началась до изменения файла: чтение начинается заново
+            self.file_loader.cancel(document)
+            self.start_loading(document, self.loading_documents[document][2])
+            return
+        if isinstance(document.widget, LargeFileViewer):
+            document.file_mtime = mtime
+            document.widget.reload()
+            return
+        if document.editor is None:
+            return  # заглушка прочитает файл при активации
+
+        if document in self.reloading_documents:
+            self.file_reloader.cancel(document)
+        self.reloading_documents[document] = []
+        self.file_reloader.load(document.file_path, document)
+
+    def on_reload_chunk_loaded(self, document, text, done, total):
+        if document in self.reloading_documents:
+            self.reloading_documents[document].append(text)
+
+    def on_file_reloaded(self, document, digest):
+        if document not in self.reloading_documents:
+            return
+        text = ''.join(self.reloading_documents.pop(document))
+        if document.editor is None or self.documents.for_widget(document.widget) is not document:
+            return
+
+        if digest == document.content_hash:
+            # Содержимое не изменилось, например файл перезаписан тем же текстом
+            self.mark_file_synced(document, digest)
+        elif document.is_dirty:
+            self.reload_prompts.append((document, text, digest))
+            self.show_reload_prompts()
+        else:
+            self.apply_reloaded_text(document, text, digest)
+
+    def on_file_reload_failed(self, document, error):
+        self.reloading_documents.pop(document, None)
+        print(f"Ошибка при чтении измененного файла: {error}")
+
+    def apply_reloaded_text(self, document, text, digest):
+        # Заменяется только различающийся участок: курсор, прокрутка и
+        # превью остаются на месте, а перезагрузку можно отменить
+        text_document = document.editor.document()
+        old_text = document.editor.toPlainText()
+        start, old_end, new_end = changed_range(old_text, text)
+        # Позиции курсора считаются в единицах UTF-16
+        cursor = QTextCursor(text_document)
+        cursor.setPosition(utf16_position(old_text, start))
+        cursor.setPosition(utf16_position(old_text, old_end), QTextCursor.MoveMode.KeepAnchor)
+        cursor.insertText(text[start:new_end])
+        self.mark_file_synced(document, digest)
+
+    def show_reload_prompts(self):
+        # Запросы показываются по одному, даже если новые изменения
+        # приходят, пока открыт предыдущий
+        if self.reload_prompt_open:
+            return
+        self.reload_prompt_open = True
+        try:
+            while self.reload_prompts:
+                document, text, digest = self.reload_prompts.pop(0)
+                if document.editor is None or \
+                        self.documents.for_widget(document.widget) is not document:
+                    continue
+
+                start, _, new_end = changed_range(document.editor.toPlainText(), text)
+                first_line = text.count('\n', 0, start) + 1
+                last_line = first_line + text.count('\n', start, new_end)
+                reply = QMessageBox.question(
+                    self, 'Файл изменен',
+                    f"Файл '{os.path.basename(document.file_path)}' изменен на диске и "
+                    f"отличается от открытого в строках {first_line}-{last_line}. "
+                    f"Загрузить версию с диска? Несохраненные изменения будут потеряны.",
+                    QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+                if reply == QMessageBox.StandardButton.Yes:
+                    self.apply_reloaded_text(document, text, digest)
+                else:
+                    # Повторный запрос будет только при следующем изменении
+                    try:
+                        document.file_mtime = os.path.getmtime(document.file_path)
+                    except OSError:
+                        pass
+        finally:
+            self.reload_prompt_open = False
 
-    def save_application_state(self):
-        settings = QSettings("harakki", "PlantCareEditor")
+    def save_application_state(self, discard_changes=False):
+        settings = app_settings()
 
         # Сохраняем текущую директорию
         settings.setValue("current_directory", self.current_directory)
+        # Вкладка, которая при следующем запуске откроется первой
+        document = self.current_document()
+        settings.setValue("current_tab", document.session_id if document else "")
 
-        # Сохраняем информацию об открытых файлах
-        open_files = []
-        for i in range(self.tab_widget.count()):
-            editor = self.tab_widget.widget(i)
-            if isinstance(editor, QTextEdit):
-                file_path = self.tab_widget.tabToolTip(i)
-                if file_path:  # Сохраняем только если файл существует
-                    open_files.append(
-                        {"path": file_path, "content": editor.toPlainText()})
-        settings.setValue("open_files", json.dumps(open_files))
+        # Открытые вкладки хранятся в отдельном хранилище сеанса, здесь
+        # дописываются только позиции курсора и прокрутки
+        self.flush_session(all_tabs=True, discard_changes=discard_changes)
+        settings.remove("open_files")
 
         # Сохраняем геометрию окна
         settings.setValue("geometry", self.saveGeometry())
@@ -689,35 +1513,33 @@ class PlantCareEditor(QMainWindow):
         settings.setValue("windowState", self.saveState())
 
     def restore_application_state(self):
-        settings = QSettings("harakki", "PlantCareEditor")
+        settings = app_settings()
 
-        # Восстанавливаем текущую директорию
+        # Восстанавливаем текущую директорию. Дерево и индексы папки
+        # запускаются после первой отрисовки окна
         self.current_directory = settings.value(
             "current_directory", QDir.currentPath())
-        self.file_model.setRootPath(self.current_directory)
-        self.file_view.setRootIndex(
-            self.file_model.index(self.current_directory))
-
-        # Восстанавливаем открытые файлы
-        open_files = json.loads(settings.value("open_files", "[]"))
-        for file_data in open_files:
-            file_path = file_data.get("path")  # получаем путь к файлу
 
-            # проверяем, что файл существует
-            if file_path and os.path.exists(file_path):
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as file:
-                        content = file.read()
-                        self.create_new_tab(content)
-                        self.tab_widget.setTabText(
-                            self.tab_widget.currentIndex(), os.path.basename(file_path))
-                        self.tab_widget.setTabToolTip(
-                            self.tab_widget.currentIndex(), file_path)
-                except Exception as e:
-                    print(f"Ошибка при восстановлении файла: {e}")
-
-            else:
-                self.create_new_tab(file_data.get("content"))
+        # Восстанавливаем открытые файлы. Сначала создается только вкладка,
+        # активная при выходе, остальные добавляются после первой отрисовки.
+        # Вкладки с файлами создаются заглушками и загружаются при первой
+        # активации
+        tabs = self.session_store.load()
+        if not tabs and settings.contains("open_files"):
+            # Перенос вкладок из прежнего формата хранения в QSettings
+            for file_data in json.loads(settings.value("open_files", "[]")):
+                file_path = file_data.get("path")
+                tabs.append({"tab_id": new_session_id(), "path": file_path, "cursor": 0,
+                             "scroll": 0, "content_hash": None,
+                             "body": None if file_path and os.path.exists(file_path)
+                             else file_data.get("content")})
+
+        current_tab = settings.value("current_tab", "")
+        active_tab = next((tab for tab in tabs if tab["tab_id"] == current_tab),
+                          tabs[0] if tabs else None)
+        if active_tab is not None and self.restore_tab(active_tab) is None:
+            active_tab = None
+        self.deferred_tabs = [tab if tab is not active_tab else None for tab in tabs]
 
         # Восстанавливаем геометрию
         if settings.value("geometry"):
@@ -728,14 +1550,156 @@ class PlantCareEditor(QMainWindow):
 
         if self.tab_widget.count() == 0:
             self.create_new_tab()
+        self.update_preview_on_tab_change(self.tab_widget.currentIndex())
+
+        # Готовность к работе отсчитывается до загрузки активной вкладки
+        document = self.current_document()
+        if document in self.loading_documents:
+            self.startup_document = document
+        else:
+            self.startup_step_done("document")
+
+    def restore_tab(self, tab, index=None):
+        file_path = tab["path"]  # получаем путь к файлу
+
+        if tab["body"] is not None:
+            # Несохраненный буфер
+            if not file_path and not tab["body"].strip():
+                return None
+            document = Document(None, tab["tab_id"])
+            editor = self.create_editor(document)
+            self.add_document_tab(document, editor, index)
+            editor.setPlainText(tab["body"])
+            if file_path:
+                self.set_document_path(document, file_path)
+            editor.document().setModified(True)
+            return document
+
+        # проверяем, что файл существует
+        if file_path and os.path.exists(file_path):
+            document = Document(file_path, tab["tab_id"])
+            document.cursor_position = tab["cursor"]
+            document.scroll_position = tab["scroll"]
+            document.content_hash = tab["content_hash"]
+            self.tab_widget.blockSignals(True)
+            self.add_document_tab(document, self.create_placeholder(document), index)
+            self.tab_widget.blockSignals(False)
+            return document
+        return None
+
+    def run_deferred_startup(self):
+        # Отложенная часть запуска идет по шагам, между которыми окно
+        # успевает обработать ввод и перерисоваться
+        steps = [("остальные вкладки", self.restore_deferred_tabs),
+                 ("папка проекта", self.restore_project_root),
+                 ("значки", self.load_theme_icons),
+                 ("шаблоны", lambda: self.template_service.templates(self.current_directory)),
+                 ("восстановление правок", self.offer_recovery)]
+
+        def run_step(number):
+            if number == len(steps):
+                self.startup_step_done("deferred")
+                return
+            phase, step = steps[number]
+            step()
+            self.startup_profiler.mark(phase)
+            QTimer.singleShot(0, lambda: run_step(number + 1))
+
+        run_step(0)
+
+    def startup_step_done(self, step):
+        # Программа готова к работе, когда достроен интерфейс и загружена
+        # активная вкладка
+        if not self.startup_waiting:
+            return
+        self.startup_waiting.discard(step)
+        if step == "document":
+            self.startup_profiler.mark("загрузка активной вкладки")
+        if not self.startup_waiting:
+            self.startup_profiler.finish()
+
+    def restore_deferred_tabs(self):
+        current_widget = self.tab_widget.currentWidget()
+        self.tab_widget.blockSignals(True)
+        index = 0
+        for tab in self.deferred_tabs:
+            # None - место вкладки, восстановленной первой
+            if tab is None or self.restore_tab(tab, index) is not None:
+                index += 1
+        self.deferred_tabs = []
+        self.tab_widget.setCurrentWidget(current_widget)
+        self.tab_widget.blockSignals(False)
+
+    def restore_project_root(self):
+        self.file_model.set_root(self.current_directory)
+        for project_index in self.project_indexes:
+            project_index.set_root(self.current_directory)
+        self.file_watcher.set_root(self.current_directory)
+        self.update_preview_base_dirs()
+
+    def set_theme_icon(self, action, icon):
+        # Значки темы загружаются после первой отрисовки окна
+        if self.deferred_icons is None:
+            action.setIcon(QIcon.fromTheme(icon))
+        else:
+            self.deferred_icons.append((action, icon))
+
+    def load_theme_icons(self):
+        for action, icon in self.deferred_icons:
+            action.setIcon(QIcon.fromTheme(icon))
+        self.deferred_icons = None
+
+    def offer_recovery(self):
+        recovered = []
+        for journal_path in journal_files():
+            try:
+                recovered.append(read_journal(journal_path))
+            except Exception as e:
+                print(f"Ошибка при чтении журнала восстановления: {e}")
+        if not recovered:
+            self.autosave.start()
+            return
+
+        reply = QMessageBox.question(
+            self, 'Восстановление',
+            f"Программа была завершена некорректно. Восстановить несохраненные изменения "
+            f"({len(recovered)})?",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+        if reply == QMessageBox.StandardButton.Yes:
+            sessions = {document.session_id: document for document in self.documents}
+            for session_id, file_path, text in recovered:
+                # Восстановленный текст заменяет вкладку, открытую из сеанса
+                if session_id in sessions:
+                    self.remove_document_tab(sessions[session_id])
+                document = self.create_new_tab(text)
+                if file_path:
+                    self.set_document_path(document, file_path)
+                document.editor.document().setModified(True)
+
+        # Старые журналы удаляются, восстановленные вкладки ведут новые
+        self.autosave.start()
 
 
 if __name__ == '__main__':
+    if '--export' in sys.argv[1:]:
+        # Выгрузка папки в HTML без окна
+        arguments = sys.argv[1:]
+        arguments.remove('--export')
+        sys.exit(export_main(arguments))
+
+    # Замер времени запуска по этапам
+    profile_startup = '--profile-startup' in sys.argv[1:]
+    if profile_startup:
+        sys.argv.remove('--profile-startup')
+
     app = QApplication(sys.argv)
     app.setStyleSheet('QWidget { font-family: Arial; font-size: 14px; }')
+    startup_profiler = StartupProfiler(profile_startup, STARTUP_TIME)
+    startup_profiler.mark("загрузка модулей")
 
-    PlantCareEditor = PlantCareEditor()
+    PlantCareEditor = PlantCareEditor(startup_profiler)
     PlantCareEditor.show()
+    startup_profiler.mark("показ окна")
 
     try:
         sys.exit(app.exec())
@@ -0,0 +1,255 @@
+import os
+import re
+import sqlite3
+from datetime import date, timedelta
+
+from PyQt6.QtCore import (Qt, QTimer, pyqtSignal)
+from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QComboBox, QLineEdit, QLabel,
+                             QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView)
+
+from project_index import ProjectIndex
+
+# Наибольшее число строк в результатах запроса
+METADATA_RESULTS_LIMIT = 1000
+# Задержка запроса после изменения условия, мс
+METADATA_QUERY_DELAY_MS = 150
+
+# Поле шаблона: "- **Частота:** раз в неделю"
+FIELD_RE = re.compile(r'^\s*(?:[-*+]\s+)?\*\*(.+?):\*\*[ \t]*(.*?)\s*$')
+# Заголовок, который сам содержит значение: "## Дата: 01.05.2024"
+HEADING_RE = re.compile(r'^(#{1,6})\s+(.*?)\s*#*\s*$')
+ISO_DATE_RE = re.compile(r'(\d{4})-(\d{1,2})-(\d{1,2})')
+DATE_RE = re.compile(r'(\d{1,2})[./](\d{1,2})[./](\d{4}|\d{2})\b')
+NUMBER_RE = re.compile(r'[-+]?\d+(?:[.,]\d+)?')
+RELATIVE_DATE_RE = re.compile(r'^\s*сегодня\s*(?:([-+])\s*(\d+))?\s*$', re.IGNORECASE)
+
+TITLE_FIELD = "Заголовок"
+OPERATORS = ("содержит", "=", "<", "<=", ">", ">=")
+
+
+def parse_date(value):
+    # Дата из значения поля в формате ISO или None
+    match = ISO_DATE_RE.search(value)
+    if match:
+        year, month, day = (int(part) for part in match.groups())
+    else:
+        match = DATE_RE.search(value)
+        if not match:
+            return None
+        day, month, year = (int(part) for part in match.groups())
+        if year < 100:
+            year += 2000
+    try:
+        return date(year, month, day).isoformat()
+    except ValueError:
+        return None
+
+
+def parse_number(value):
+    match = NUMBER_RE.search(value)
+    if match:
+        return float(match.group().replace(',', '.'))
+
+
+def parse_query_date(value):
+    # В запросе кроме обычной даты понимается "сегодня", "сегодня-7" и т.п.
+    match = RELATIVE_DATE_RE.match(value)
+    if match:
+        days = int(match.group(2) or 0)
+        if match.group(1) == '-':
+            days = -days
+        return (date.today() + timedelta(days=days)).isoformat()
+    return parse_date(value)
+
+
+def extract_fields(text):
+    # Поля шаблонов страницы: [(имя, значение)]. Имя поля включает
+    # раздел, в котором оно стоит ("Полив / Частота"), потому что одни и
+    # те же подписи встречаются в разных разделах
+    fields = []
+    section = ""
+    for line in text.split('\n'):
+        heading = HEADING_RE.match(line)
+        if heading:
+            level, title = len(heading.group(1)), heading.group(2)
+            label, colon, value = title.partition(':')
+            if level == 1:
+                fields.append((TITLE_FIELD, title))
+                section = ""
+            elif colon and value.strip():
+                fields.append((label.strip(), value.strip()))
+                section = label.strip()
+            else:
+                section = label.strip()
+            continue
+
+        field = FIELD_RE.match(line)
+        if field and field.group(2):
+            label = field.group(1).strip()
+            fields.append((f"{section} / {label}" if section else label, field.group(2)))
+    return fields
+
+
+class MetadataIndex(ProjectIndex):
+    # Поля шаблонов всех страниц проекта в SQLite. Значения хранятся вместе
+    # с разобранными числом и датой, поэтому сравнения и выборки по тысячам
+    # страниц выполняются запросом к базе без чтения файлов
+    kind = "metadata"
+
+    def create_tables(self, connection):
+        connection.execute('''CREATE TABLE IF NOT EXISTS fields (
+            file_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            value TEXT NOT NULL,
+            number REAL,
+            date TEXT)''')
+        connection.execute("CREATE INDEX IF NOT EXISTS fields_file ON fields (file_id)")
+        connection.execute("CREATE INDEX IF NOT EXISTS fields_date ON fields (name, date)")
+        connection.execute("CREATE INDEX IF NOT EXISTS fields_number ON fields (name, number)")
+
+    def index_text(self, connection, file_id, file_path, text):
+        connection.executemany(
+            "INSERT INTO fields (file_id, name, value, number, date) VALUES (?, ?, ?, ?, ?)",
+            [(file_id, name, value, parse_number(value), parse_date(value))
+             for name, value in extract_fields(text)])
+
+    def remove_entries(self, connection, file_id):
+        connection.execute("DELETE FROM fields WHERE file_id = ?", (file_id,))
+
+    def field_names(self):
+        # Имена полей с числом страниц, в которых они заполнены
+        if self.connection is None:
+            return []
+        return self.connection.execute('''SELECT name, COUNT(DISTINCT file_id) FROM fields
+            GROUP BY name ORDER BY name''').fetchall()
+
+    def query(self, name, operator, value, limit=METADATA_RESULTS_LIMIT):
+        # Строки (путь, поле, значение), удовлетворяющие условию. Для
+        # сравнений значение запроса понимается как дата, если разбирается
+        # как дата, иначе как число
+        if self.connection is None:
+            return []
+
+        conditions, parameters = [], []
+        if name:
+            conditions.append("fields.name = ?")
+            parameters.append(name)
+
+        value = value.strip()
+        if value:
+            if operator == "содержит":
+                conditions.append("fields.value LIKE ?")
+                parameters.append(f"%{value}%")
+            elif operator == "=":
+                conditions.append("fields.value = ?")
+                parameters.append(value)
+            else:
+                query_date = parse_query_date(value)
+                number = parse_number(value)
+                if query_date is not None:
+                    conditions.append(f"fields.date {operator} ?")
+                    parameters.append(query_date)
+                elif number is not None:
+                    conditions.append(f"fields.number {operator} ?")
+                    parameters.append(number)
+                else:
+                    return []
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        try:
+            return self.connection.execute(f'''SELECT files.path, fields.name, fields.value
+                FROM fields JOIN files ON files.id = fields.file_id {where}
+                ORDER BY fields.date, files.path LIMIT ?''',
+                                           parameters + [limit]).fetchall()
+        except sqlite3.Error as e:
+            print(f"Ошибка при запросе к полям шаблонов: {e}")
+            return []
+
+
+class MetadataPanel(QWidget):
+    # Панель выборки по полям шаблонов: поле, условие и значение
+    file_activated = pyqtSignal(str)
+
+    def __init__(self, metadata_index, parent=None):
+        super().__init__(parent)
+        self.metadata_index = metadata_index
+
+        self.field_combo = QComboBox(self)
+        self.operator_combo = QComboBox(self)
+        self.operator_combo.addItems(OPERATORS)
+        self.value_edit = QLineEdit(self)
+        self.value_edit.setPlaceholderText("Значение, дата или \"сегодня-7\"")
+        self.value_edit.setClearButtonEnabled(True)
+
+        self.status_label = QLabel(self)
+        self.status_label.setStyleSheet("color: gray;")
+
+        self.results_table = QTableWidget(0, 3, self)
+        self.results_table.setHorizontalHeaderLabels(["Файл", "Поле", "Значение"])
+        self.results_table.horizontalHeader().setSectionResizeMode(
+            QHeaderView.ResizeMode.Stretch)
+        self.results_table.verticalHeader().hide()
+        self.results_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.results_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.results_table.cellActivated.connect(self.on_cell_activated)
+        self.results_table.cellClicked.connect(self.on_cell_activated)
+
+        condition_layout = QHBoxLayout()
+        condition_layout.addWidget(self.operator_combo)
+        condition_layout.addWidget(self.value_edit)
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.field_combo)
+        layout.addLayout(condition_layout)
+        layout.addWidget(self.status_label)
+        layout.addWidget(self.results_table)
+
+        self.query_timer = QTimer(self)
+        self.query_timer.setSingleShot(True)
+        self.query_timer.setInterval(METADATA_QUERY_DELAY_MS)
+        self.query_timer.timeout.connect(self.run_query)
+        self.field_combo.currentIndexChanged.connect(self.query_timer.start)
+        self.operator_combo.currentIndexChanged.connect(self.query_timer.start)
+        self.value_edit.textChanged.connect(self.query_timer.start)
+
+        metadata_index.indexing_progress.connect(
+            lambda count: self.status_label.setText(f"Индексирование... {count}"))
+        metadata_index.indexing_finished.connect(self.refresh_fields)
+        metadata_index.indexing_failed.connect(
+            lambda error: self.status_label.setText(f"Ошибка индексирования: {error}"))
+
+    def refresh_fields(self):
+        current = self.field_combo.currentData()
+        self.field_combo.blockSignals(True)
+        self.field_combo.clear()
+        self.field_combo.addItem("Все поля", None)
+        for name, count in self.metadata_index.field_names():
+            self.field_combo.addItem(f"{name} ({count})", name)
+        index = self.field_combo.findData(current)
+        self.field_combo.setCurrentIndex(max(0, index))
+        self.field_combo.blockSignals(False)
+        if self.isVisible():
+            self.run_query()
+
+    def run_query(self):
+        self.query_timer.stop()
+        rows = self.metadata_index.query(
+            self.field_combo.currentData(), self.operator_combo.currentText(),
+            self.value_edit.text())
+
+        root = self.metadata_index.root or ''
+        self.results_table.setRowCount(len(rows))
+        for row, (file_path, name, value) in enumerate(rows):
+            file_item = QTableWidgetItem(os.path.relpath(file_path, root))
+            file_item.setToolTip(file_path)
+            file_item.setData(Qt.ItemDataRole.UserRole, file_path)
+            self.results_table.setItem(row, 0, file_item)
+            self.results_table.setItem(row, 1, QTableWidgetItem(name))
+            self.results_table.setItem(row, 2, QTableWidgetItem(value))
+        self.status_label.setText(f"Найдено записей: {len(rows)}")
+
+    def on_cell_activated(self, row, _column):
+        item = self.results_table.item(row, 0)
+        if item is not None:
+            self.file_activated.emit(item.data(Qt.ItemDataRole.UserRole))
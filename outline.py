@@ -0,0 +1,282 @@
+import re
+from bisect import bisect_left, bisect_right
+
+from PyQt6.QtCore import (Qt, QAbstractListModel, QModelIndex, QObject, QSortFilterProxyModel,
+                          QTimer, pyqtSignal)
+from PyQt6.QtGui import QTextCursor
+from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QLineEdit, QLabel, QListView,
+                             QAbstractItemView)
+
+# Задержка обновления списка заголовков после правки, мс
+OUTLINE_REFRESH_DELAY_MS = 200
+
+
+# Строка с заголовком или границей блока кода
+LINE_RE = re.compile(r'^(?:(#{1,6})[ \t]+(.*?)[ \t]*#*[ \t]*$|( {0,3}(?:```|~~~)))', re.MULTILINE)
+
+
+class HeadingIndex(QObject):
+    # Заголовки документа редактора: номера строк (блоков), уровни
+    # и тексты в порядке следования. Обновляется по contentsChange:
+    # перечитываются только измененные строки, номера ниже правки
+    # сдвигаются на изменение числа строк. Строки, похожие на заголовки,
+    # и границы блоков кода хранятся отдельно; если правка задела
+    # границу блока кода, список заголовков заново отбирается из них
+    # без повторного чтения документа
+    changed = pyqtSignal()
+
+    def __init__(self, text_document):
+        super().__init__(text_document)
+        self.document = text_document
+        # Заголовки вне блоков кода
+        self.numbers = []
+        self.levels = []
+        self.titles = []
+        # Все строки, похожие на заголовки, и границы блоков кода
+        self.candidates = []
+        self.fences = []
+        self.block_count = 0
+        text_document.contentsChange.connect(self.on_contents_change)
+        self.rebuild()
+
+    @staticmethod
+    def parse(lines):
+        # lines - [(номер строки, текст)]
+        headings, fences = [], []
+        for number, text in lines:
+            if not text.startswith(('#', ' ', '`', '~')):
+                continue
+            match = LINE_RE.match(text)
+            if match is None:
+                continue
+            if match.group(3):
+                fences.append(number)
+            else:
+                headings.append((number, len(match.group(1)), match.group(2)))
+        return headings, fences
+
+    def scan(self, first, last):
+        lines = []
+        block = self.document.findBlockByNumber(first)
+        while block.isValid() and block.blockNumber() <= last:
+            lines.append((block.blockNumber(), block.text()))
+            block = block.next()
+        return self.parse(lines)
+
+    def rebuild(self):
+        # Первый проход по всему тексту: регулярное выражение по строкам,
+        # номер строки - число переводов строки до совпадения
+        self.block_count = self.document.blockCount()
+        text = self.document.toPlainText()
+        self.candidates, self.fences = [], []
+        number, position = 0, 0
+        for match in LINE_RE.finditer(text):
+            number += text.count('\n', position, match.start())
+            position = match.start()
+            if match.group(3):
+                self.fences.append(number)
+            else:
+                self.candidates.append((number, len(match.group(1)), match.group(2)))
+        self.select_headings()
+
+    def select_headings(self):
+        # Заголовки внутри блоков кода не считаются
+        fence_iter = iter(self.fences + [self.block_count])
+        inside, next_fence = False, next(fence_iter)
+        self.numbers, self.levels, self.titles = [], [], []
+        for number, level, title in self.candidates:
+            while next_fence < number:
+                inside, next_fence = not inside, next(fence_iter)
+            if not inside:
+                self.numbers.append(number)
+                self.levels.append(level)
+                self.titles.append(title)
+        self.changed.emit()
+
+    def on_contents_change(self, position, removed, added):
+        document = self.document
+        block_count = document.blockCount()
+        delta = block_count - self.block_count
+        self.block_count = block_count
+
+        first = document.findBlock(position).blockNumber()
+        last_block = document.findBlock(position + added)
+        last = last_block.blockNumber() if last_block.isValid() else block_count - 1
+        if first < 0:
+            self.rebuild()
+            return
+        # Строки first..old_last до правки стали строками first..last
+        old_last = last - delta
+        headings, fences = self.scan(first, last)
+
+        start = bisect_left(self.candidates, (first,))
+        end = bisect_left(self.candidates, (old_last + 1,))
+        if delta:
+            self.candidates[end:] = [(number + delta, level, title)
+                                     for number, level, title in self.candidates[end:]]
+        self.candidates[start:end] = headings
+
+        fence_start = bisect_left(self.fences, first)
+        fence_end = bisect_right(self.fences, old_last)
+        if delta:
+            self.fences[fence_end:] = [number + delta for number in self.fences[fence_end:]]
+        if fences or fence_start != fence_end:
+            self.fences[fence_start:fence_end] = fences
+            self.select_headings()
+            return
+        if fence_start % 2:
+            headings = []  # правка внутри блока кода
+
+        start = bisect_left(self.numbers, first)
+        end = bisect_right(self.numbers, old_last)
+        if delta:
+            self.numbers[end:] = [number + delta for number in self.numbers[end:]]
+        if start == end and not headings:
+            if delta:
+                self.changed.emit()
+            return
+        self.numbers[start:end] = [number for number, _, _ in headings]
+        self.levels[start:end] = [level for _, level, _ in headings]
+        self.titles[start:end] = [title for _, _, title in headings]
+        self.changed.emit()
+
+    def heading_at(self, block_number):
+        # Номер заголовка раздела, в котором стоит строка, или -1
+        return bisect_right(self.numbers, block_number) - 1
+
+
+def heading_index(text_document):
+    # Индекс создается при первом обращении и живет вместе с документом
+    index = text_document.findChild(HeadingIndex)
+    if index is None:
+        index = HeadingIndex(text_document)
+    return index
+
+
+class OutlineModel(QAbstractListModel):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.heading_index = None
+
+    def set_heading_index(self, heading_index):
+        self.beginResetModel()
+        self.heading_index = heading_index
+        self.endResetModel()
+
+    def refresh(self):
+        self.beginResetModel()
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid() or self.heading_index is None:
+            return 0
+        return len(self.heading_index.numbers)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        headings = self.heading_index
+        if not index.isValid() or headings is None or index.row() >= len(headings.numbers):
+            return None
+        row = index.row()
+        if role == Qt.ItemDataRole.DisplayRole:
+            return "    " * (headings.levels[row] - 1) + headings.titles[row]
+        if role == Qt.ItemDataRole.UserRole:
+            return headings.numbers[row]
+        return None
+
+
+class OutlinePanel(QWidget):
+    # Структура документа: заголовки активной вкладки с переходом
+    # к заголовку и подсветкой раздела, в котором стоит курсор
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.editor = None
+        self.heading_index = None
+
+        self.filter_edit = QLineEdit(self)
+        self.filter_edit.setPlaceholderText("Фильтр заголовков")
+        self.filter_edit.setClearButtonEnabled(True)
+
+        self.status_label = QLabel(self)
+        self.status_label.setStyleSheet("color: gray;")
+
+        self.model = OutlineModel(self)
+        self.proxy_model = QSortFilterProxyModel(self)
+        self.proxy_model.setSourceModel(self.model)
+        self.proxy_model.setFilterCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
+        self.filter_edit.textChanged.connect(self.proxy_model.setFilterFixedString)
+
+        self.heading_list = QListView(self)
+        self.heading_list.setModel(self.proxy_model)
+        self.heading_list.setUniformItemSizes(True)
+        self.heading_list.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.heading_list.activated.connect(self.jump_to_heading)
+        self.heading_list.clicked.connect(self.jump_to_heading)
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.filter_edit)
+        layout.addWidget(self.status_label)
+        layout.addWidget(self.heading_list)
+
+        # Серия правок приводит к одному обновлению списка
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setSingleShot(True)
+        self.refresh_timer.setInterval(OUTLINE_REFRESH_DELAY_MS)
+        self.refresh_timer.timeout.connect(self.refresh)
+
+    def set_editor(self, editor):
+        if editor is self.editor:
+            return
+        if self.editor is not None:
+            try:
+                self.heading_index.changed.disconnect(self.refresh_timer.start)
+                self.editor.cursorPositionChanged.disconnect(self.select_current_heading)
+            except (TypeError, RuntimeError):
+                pass
+
+        self.editor = editor
+        self.heading_index = heading_index(editor.document()) if editor is not None else None
+        if editor is not None:
+            self.heading_index.changed.connect(self.refresh_timer.start)
+            editor.cursorPositionChanged.connect(self.select_current_heading)
+        self.model.set_heading_index(self.heading_index)
+        self.refresh()
+
+    def refresh(self):
+        self.refresh_timer.stop()
+        self.model.refresh()
+        count = len(self.heading_index.numbers) if self.heading_index is not None else 0
+        self.status_label.setText(f"Заголовков: {count}")
+        self.select_current_heading()
+
+    def select_current_heading(self):
+        if self.editor is None or self.refresh_timer.isActive():
+            return
+        row = self.heading_index.heading_at(self.editor.textCursor().blockNumber())
+        index = self.proxy_model.mapFromSource(self.model.index(row)) if row >= 0 else QModelIndex()
+        self.heading_list.selectionModel().clearSelection()
+        if index.isValid():
+            self.heading_list.setCurrentIndex(index)
+            self.heading_list.scrollTo(index)
+
+    def jump_to_heading(self, index):
+        if self.editor is None:
+            return
+        block_number = index.data(Qt.ItemDataRole.UserRole)
+        if block_number is None:
+            return
+        block = self.editor.document().findBlockByNumber(block_number)
+        if not block.isValid():
+            return
+        # Курсор сначала уводится в конец документа: при возврате вверх
+        # редактор прокручивается так, что заголовок оказывается первой строкой
+        cursor = self.editor.textCursor()
+        cursor.movePosition(QTextCursor.MoveOperation.End)
+        self.editor.setTextCursor(cursor)
+        cursor.setPosition(block.position())
+        self.editor.setTextCursor(cursor)
+        self.editor.setFocus()
+
+    def focus_filter(self):
+        self.filter_edit.setFocus()
+        self.filter_edit.selectAll()
@@ -0,0 +1,475 @@
+import re
+import hashlib
+from bisect import bisect_right
+from collections import OrderedDict
+from itertools import accumulate
+
+from PyQt6.QtCore import (QCoreApplication, QObject, QRunnable, QThreadPool, QTimer, pyqtSignal)
+from PyQt6.QtGui import (QTextDocument, QTextCursor, QTextDocumentFragment, QTextFormat)
+
+from documents import utf16_length, utf16_positions
+from instrumentation import timed
+
+# Окно склейки правок по умолчанию, мс
+DEFAULT_DEBOUNCE_MS = 250
+# Правки крупнее этого порога (в символах) перерисовываются целиком в фоне
+FULL_RENDER_THRESHOLD = 64 * 1024
+# Число отрисованных блоков, которые держатся в кэше
+FRAGMENT_CACHE_SIZE = 2048
+
+HEADING_RE = re.compile(r' {0,3}#{1,6}(\s|$)')
+FENCE_RE = re.compile(r' {0,3}(```|~~~)')
+LIST_ITEM_RE = re.compile(r' {0,3}([-*+]|\d{1,9}[.)])(\s|$)')
+# Определение ссылки "[x]: url" действует на весь документ, поэтому
+# такой текст отрисовывается только целиком
+LINK_REFERENCE_RE = re.compile(r'^\s{0,3}\[[^\]]+\]:', re.MULTILINE)
+
+# Виды блоков, которые продолжаются после пустой строки
+BLOCK_TEXT = 0
+BLOCK_LIST = 1
+BLOCK_CODE = 2
+
+
+def indentation(line):
+    expanded = line.expandtabs(4)
+    return len(expanded) - len(expanded.lstrip())
+
+
+def continues_block(kind, line):
+    # Строка после пустой строки остается в блоке: вложенное содержимое
+    # и следующие пункты списка, продолжение блока кода с отступом
+    if kind == BLOCK_LIST:
+        return indentation(line) >= 2 or LIST_ITEM_RE.match(line) is not None
+    return kind == BLOCK_CODE and indentation(line) >= 4
+
+
+def split_blocks(text):
+    # Делит исходник на блоки верхнего уровня: заголовки, абзацы, списки,
+    # цитаты и блоки кода. Список вместе с вложенным содержимым и блок
+    # кода с отступом остаются одним блоком и через пустые строки.
+    # Возвращает список (начало, конец) и признак незакрытого блока кода
+    blocks = []
+    block_start = None
+    block_end = 0
+    block_kind = BLOCK_TEXT
+    after_blank = False
+    fence = None
+    # Блок кода внутри пункта списка не отделяется от списка
+    fence_in_list = False
+    pos = 0
+    length = len(text)
+
+    while pos <= length:
+        line_end = text.find('\n', pos)
+        if line_end == -1:
+            line_end = length
+        line = text[pos:line_end]
+
+        if fence is not None:
+            if line.strip().startswith(fence):
+                if fence_in_list:
+                    block_end = line_end
+                else:
+                    blocks.append((block_start, line_end))
+                    block_start = None
+                fence = None
+            pos = line_end + 1
+            continue
+
+        if not line.strip():
+            if block_start is not None:
+                if block_kind == BLOCK_TEXT:
+                    blocks.append((block_start, block_end))
+                    block_start = None
+                else:
+                    after_blank = True
+            pos = line_end + 1
+            continue
+
+        if after_blank:
+            after_blank = False
+            if not continues_block(block_kind, line):
+                blocks.append((block_start, block_end))
+                block_start = None
+
+        nested = (block_start is not None and block_kind == BLOCK_LIST
+                  and indentation(line) >= 2)
+        fence_match = FENCE_RE.match(line.lstrip() if nested else line)
+        if fence_match:
+            fence = fence_match.group(1)
+            fence_in_list = nested
+            if not nested:
+                if block_start is not None:
+                    blocks.append((block_start, block_end))
+                block_start = pos
+        elif HEADING_RE.match(line) and not nested:
+            # Заголовок всегда занимает отдельный блок
+            if block_start is not None:
+                blocks.append((block_start, block_end))
+                block_start = None
+            blocks.append((pos, line_end))
+        elif block_start is None:
+            block_start = pos
+            if LIST_ITEM_RE.match(line):
+                block_kind = BLOCK_LIST
+            elif indentation(line) >= 4:
+                block_kind = BLOCK_CODE
+            else:
+                block_kind = BLOCK_TEXT
+
+        block_end = line_end
+        pos = line_end + 1
+
+    if fence is not None:
+        block_end = length
+    if block_start is not None:
+        blocks.append((block_start, block_end))
+
+    return blocks, fence is not None
+
+
+def render_blocks(text):
+    # Блоки для отрисовки; текст с определениями ссылок - один блок
+    if LINK_REFERENCE_RE.search(text):
+        return [(0, len(text))]
+    blocks, _ = split_blocks(text)
+    return blocks
+
+
+def block_key(text):
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+
+def render_block(text):
+    document = QTextDocument()
+    document.setMarkdown(text)
+    first_block = document.firstBlock()
+    # Ссылка на список действительна только внутри исходного документа
+    block_format = first_block.blockFormat()
+    block_format.clearProperty(QTextFormat.Property.ObjectIndex)
+    return QTextDocumentFragment(document), block_format, first_block.charFormat()
+
+
+def insert_blocks(cursor, position, rendered_blocks):
+    # Каждый блок превью начинается с разделителя абзацев и вставляется
+    # после предыдущего блока, поэтому соседние блоки не меняют формат.
+    # Возвращает длину каждого вставленного блока в документе превью
+    lengths = []
+    for fragment, block_format, char_format in rendered_blocks:
+        cursor.setPosition(position)
+        cursor.insertBlock(block_format, char_format)
+        cursor.insertFragment(fragment)
+        lengths.append(cursor.position() - position)
+        position = cursor.position()
+    return lengths
+
+
+class _RenderSignals(QObject):
+    finished = pyqtSignal(int, object, object, object, object, bool)
+
+
+class _RenderTask(QRunnable):
+    def __init__(self, revision, text, signals, target_thread):
+        super().__init__()
+        self.revision = revision
+        self.text = text
+        self.signals = signals
+        self.target_thread = target_thread
+
+    @timed("PreviewRenderer.render", "background")
+    def run(self):
+        # Разбор Markdown выполняется вне GUI-потока, готовый документ
+        # передается в главный поток целиком
+        blocks = render_blocks(self.text)
+        keys = [block_key(self.text[start:end]) for start, end in blocks]
+
+        document = QTextDocument()
+        document.setUndoRedoEnabled(False)
+        lengths = insert_blocks(QTextCursor(document), 0, (
+            render_block(self.text[start:end]) for start, end in blocks))
+
+        document.moveToThread(self.target_thread)
+        # Начала блоков хранятся в позициях исходного QTextDocument (UTF-16)
+        starts = utf16_positions(self.text, [start for start, _ in blocks])
+        self.signals.finished.emit(self.revision, document, starts, keys, lengths,
+                                   LINK_REFERENCE_RE.search(self.text) is not None)
+
+
+class PreviewRenderer(QObject):
+    rendered = pyqtSignal(int)
+
+    def __init__(self, preview_widget, debounce_ms=DEFAULT_DEBOUNCE_MS, parent=None):
+        super().__init__(parent)
+        self.preview_widget = preview_widget
+        self.editor = None
+        self.revision = 0
+        self.document = None
+        self.full_render_pending = False
+        self.pending_length = 0
+        # Документ отрисован одним блоком из-за определений ссылок
+        self.whole_document = False
+
+        # Состояние блоков: начало каждого блока в исходнике, ключ содержимого
+        # и длина отрисованного блока в документе превью
+        self.block_starts = []
+        self.block_keys = []
+        self.block_lengths = []
+        self.source_length = 0
+        # Начало каждого блока в документе превью; пересчитывается после
+        # отрисовки при первой прокрутке
+        self.preview_starts = None
+
+        # Измененный участок с момента последней отрисовки: начало и конец
+        # в текущих координатах и суммарный сдвиг длины
+        self.dirty = None
+
+        self.fragment_cache = OrderedDict()
+
+        self.thread_pool = QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(1)
+
+        self.signals = _RenderSignals()
+        self.signals.finished.connect(self.apply_document)
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(debounce_ms)
+        self.timer.timeout.connect(self.flush)
+
+        # Фоновая отрисовка должна завершиться до уничтожения объектов Qt
+        QCoreApplication.instance().aboutToQuit.connect(self.shutdown)
+
+    def shutdown(self):
+        self.cancel()
+        self.thread_pool.waitForDone()
+
+    def set_debounce(self, debounce_ms):
+        self.timer.setInterval(max(0, int(debounce_ms)))
+
+    def set_editor(self, editor):
+        if editor is self.editor:
+            return
+        if self.editor is not None:
+            try:
+                self.editor.document().contentsChange.disconnect(
+                    self.on_contents_change)
+            except (TypeError, RuntimeError):
+                pass
+
+        self.editor = editor
+        if editor is None:
+            self.cancel()
+            return
+
+        editor.document().contentsChange.connect(self.on_contents_change)
+        self.request_full_render()
+
+    def schedule(self, editor):
+        # Каждая новая правка перезапускает таймер, поэтому серия нажатий
+        # приводит к одной перерисовке
+        if editor is self.editor:
+            self.timer.start()
+
+    def render_now(self, editor):
+        if editor is not self.editor:
+            self.set_editor(editor)
+        else:
+            self.request_full_render()
+
+    def cancel(self):
+        self.timer.stop()
+        self.revision += 1
+        self.thread_pool.clear()
+        self.full_render_pending = False
+        self.dirty = None
+        self.block_starts, self.block_keys, self.block_lengths = [], [], []
+        self.preview_starts = None
+
+    def on_contents_change(self, position, removed, added):
+        if self.dirty is None:
+            self.dirty = [position, position + added, added - removed]
+        else:
+            start, end, shift = self.dirty
+            end = max(end, position + removed) + added - removed
+            self.dirty = [min(start, position), end, shift + added - removed]
+
+    def request_full_render(self):
+        self.timer.stop()
+        if self.editor is None:
+            return
+
+        # Правки, пришедшие после снимка, накапливаются заново и
+        # применяются поверх результата фоновой отрисовки
+        text = self.editor.toPlainText()
+        self.dirty = None
+        self.full_render_pending = True
+        # Длина в тех же единицах UTF-16, что и characterCount()
+        self.pending_length = utf16_length(text)
+
+        # Еще не начатые задачи уже устарели
+        self.revision += 1
+        self.thread_pool.clear()
+        self.thread_pool.start(_RenderTask(
+            self.revision, text, self.signals, self.thread()))
+
+    @timed("PreviewRenderer.flush")
+    def flush(self):
+        self.timer.stop()
+        if self.editor is None or self.dirty is None:
+            return
+        if self.full_render_pending:
+            # Изменения будут применены, когда фоновая отрисовка завершится
+            return
+
+        start, end, shift = self.dirty
+        new_length = self.editor.document().characterCount() - 1
+        if (self.document is None or self.whole_document or end - start > FULL_RENDER_THRESHOLD
+                or self.source_length + shift != new_length):
+            self.request_full_render()
+            return
+
+        self.dirty = None
+        if not self.patch_blocks(start, end - shift, shift, new_length):
+            self.request_full_render()
+            return
+        self.source_length = new_length
+        self.rendered.emit(self.revision)
+
+    def patch_blocks(self, start, old_end, shift, new_length):
+        count = len(self.block_starts)
+
+        # Затронутые блоки и по одному соседу с каждой стороны: пустая строка
+        # может слить или разделить соседние блоки
+        first = max(0, bisect_right(self.block_starts, start) - 2)
+        last = min(count, bisect_right(self.block_starts, old_end) + 1)
+        # Блоки, которые могут продолжать список или код перед ними,
+        # разбираются вместе с ним
+        source = self.editor.document()
+        while first > 0 and self.starts_nested(source, self.block_starts[first]):
+            first -= 1
+        while last < count and self.starts_nested(source, self.block_starts[last] + shift):
+            last += 1
+
+        region_start = self.block_starts[first] if first > 0 else 0
+        region_end = self.block_starts[last] + shift if last < count else new_length
+
+        cursor = QTextCursor(source)
+        cursor.setPosition(region_start)
+        cursor.setPosition(region_end, QTextCursor.MoveMode.KeepAnchor)
+        # QTextCursor отдает переводы строк как U+2029
+        region = cursor.selectedText().replace('\u2029', '\n')
+
+        if LINK_REFERENCE_RE.search(region):
+            return False
+        blocks, open_fence = split_blocks(region)
+        if open_fence and last < count:
+            # Незакрытый блок кода поглощает весь остаток документа
+            return False
+
+        texts = [region[block_start:block_end] for block_start, block_end in blocks]
+        new_keys = [block_key(text) for text in texts]
+
+        # Совпадающие по содержимому блоки по краям участка не трогаются
+        old_keys = self.block_keys[first:last]
+        prefix = 0
+        while (prefix < len(old_keys) and prefix < len(new_keys)
+               and old_keys[prefix] == new_keys[prefix]):
+            prefix += 1
+        suffix = 0
+        while (suffix < len(old_keys) - prefix and suffix < len(new_keys) - prefix
+               and old_keys[-1 - suffix] == new_keys[-1 - suffix]):
+            suffix += 1
+
+        replace_from = first + prefix
+        replace_to = last - suffix
+        inserted = range(prefix, len(new_keys) - suffix)
+
+        position = sum(self.block_lengths[:replace_from])
+        preview_cursor = QTextCursor(self.document)
+        preview_cursor.beginEditBlock()
+        preview_cursor.setPosition(position)
+        preview_cursor.setPosition(
+            position + sum(self.block_lengths[replace_from:replace_to]),
+            QTextCursor.MoveMode.KeepAnchor)
+        preview_cursor.removeSelectedText()
+        inserted_lengths = insert_blocks(preview_cursor, position, [
+            self.rendered_block(new_keys[i], texts[i]) for i in inserted])
+        preview_cursor.endEditBlock()
+
+        self.block_starts[first:] = [
+            region_start + position
+            for position in utf16_positions(region, [block_start for block_start, _ in blocks])] + \
+            [block_start + shift for block_start in self.block_starts[last:]]
+        self.block_keys[replace_from:replace_to] = [new_keys[i] for i in inserted]
+        self.block_lengths[replace_from:replace_to] = inserted_lengths
+        self.preview_starts = None
+        return True
+
+    @staticmethod
+    def starts_nested(source, position):
+        line = source.findBlock(position).text()
+        return continues_block(BLOCK_LIST, line) or continues_block(BLOCK_CODE, line)
+
+    def rendered_block(self, key, text):
+        rendered = self.fragment_cache.get(key)
+        if rendered is None:
+            rendered = render_block(text)
+            self.fragment_cache[key] = rendered
+            if len(self.fragment_cache) > FRAGMENT_CACHE_SIZE:
+                self.fragment_cache.popitem(last=False)
+        else:
+            self.fragment_cache.move_to_end(key)
+        return rendered
+
+    @timed("PreviewRenderer.apply_document")
+    def apply_document(self, revision, document, block_starts, block_keys, block_lengths,
+                       whole_document):
+        # Результат устарел, если после его запуска была запрошена новая отрисовка
+        if revision != self.revision:
+            document.deleteLater()
+            return
+
+        # Исходный документ виджета удаляется самим QTextEdit, а
+        # созданные здесь документы нужно освобождать вручную
+        old_document = self.document
+        self.document = document
+        document.setParent(self.preview_widget)
+        self.preview_widget.setDocument(document)
+        if old_document is not None:
+            old_document.deleteLater()
+
+        self.block_starts = block_starts
+        self.block_keys = block_keys
+        self.block_lengths = block_lengths
+        self.preview_starts = None
+        self.whole_document = whole_document
+        self.source_length = self.pending_length
+        self.full_render_pending = False
+        self.rendered.emit(revision)
+
+        if self.dirty is not None:
+            self.timer.start()
+
+    def scroll_to_source(self, source_position):
+        # Прокрутка превью к месту, соответствующему позиции в исходнике:
+        # блок ищется делением пополам, внутри блока положение берется
+        # пропорционально пройденной доле исходного текста
+        if self.document is None or not self.block_starts:
+            return
+        if self.preview_starts is None:
+            self.preview_starts = list(accumulate(self.block_lengths, initial=0))
+
+        index = max(bisect_right(self.block_starts, source_position) - 1, 0)
+        source_start = self.block_starts[index]
+        source_end = (self.block_starts[index + 1] if index + 1 < len(self.block_starts)
+                      else self.source_length)
+        fraction = min(max((source_position - source_start)
+                           / max(source_end - source_start, 1), 0), 1)
+
+        # Блок превью начинается с разделителя абзацев
+        layout = self.document.documentLayout()
+        top = layout.blockBoundingRect(
+            self.document.findBlock(self.preview_starts[index] + 1)).top()
+        bottom = layout.blockBoundingRect(
+            self.document.findBlock(self.preview_starts[index + 1])).bottom()
+        self.preview_widget.verticalScrollBar().setValue(int(top + (bottom - top) * fraction))
@@ -0,0 +1,222 @@
+import os
+import hashlib
+import sqlite3
+import threading
+
+from PyQt6.QtCore import (QCoreApplication, QObject, QRunnable, QThreadPool, pyqtSignal)
+
+from session import app_data_dir
+
+# Число файлов, индексируемых в одной транзакции
+INDEX_BATCH_SIZE = 200
+
+
+def index_path(root, kind):
+    # Индексы хранятся отдельно для каждой папки проекта
+    directory = os.path.join(app_data_dir(), kind)
+    os.makedirs(directory, exist_ok=True)
+    key = hashlib.sha1(os.path.realpath(root).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(directory, key + ".sqlite3")
+
+
+def is_indexed_file(file_path):
+    return file_path.lower().endswith(".md")
+
+
+def project_files(root):
+    for directory, dir_names, file_names in os.walk(root):
+        dir_names[:] = [name for name in dir_names if not name.startswith('.')]
+        for name in file_names:
+            if is_indexed_file(name):
+                yield os.path.join(directory, name)
+
+
+class _IndexSignals(QObject):
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal(int, int)
+    failed = pyqtSignal(int, str)
+
+
+class _IndexTask(QRunnable):
+    # Полный обход папки проекта (file_paths is None) или обновление
+    # отдельных файлов. Неизменившиеся по mtime и размеру файлы не читаются
+    def __init__(self, project_index, generation, file_paths, cancel_event):
+        super().__init__()
+        self.project_index = project_index
+        self.generation = generation
+        self.database_path = project_index.database_path
+        self.root = project_index.root
+        self.file_paths = file_paths
+        self.signals = project_index.signals
+        self.cancel_event = cancel_event
+
+    def run(self):
+        try:
+            connection = self.project_index.open_database(self.database_path)
+            try:
+                self.index(connection)
+            finally:
+                connection.close()
+        except Exception as e:
+            self.signals.failed.emit(self.generation, str(e))
+
+    def index(self, connection):
+        known = {path: (file_id, mtime, size) for file_id, path, mtime, size
+                 in connection.execute("SELECT id, path, mtime, size FROM files")}
+        full_scan = self.file_paths is None
+        file_paths = project_files(self.root) if full_scan else self.file_paths
+        seen = set()
+        changed = 0
+
+        for file_path in file_paths:
+            if self.cancel_event.is_set():
+                connection.commit()
+                return
+            seen.add(file_path)
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+            entry = known.get(file_path)
+            if entry is not None and entry[1:] == (stat.st_mtime, stat.st_size):
+                continue
+
+            self.index_file(connection, file_path, entry and entry[0], stat)
+            changed += 1
+            if changed % INDEX_BATCH_SIZE == 0:
+                connection.commit()
+                self.signals.progress.emit(self.generation, changed)
+
+        # Удаленные файлы убираются из индекса
+        if full_scan:
+            removed = [path for path in known if path not in seen]
+        else:
+            removed = [path for path in self.file_paths
+                       if path in known and not os.path.exists(path)]
+        for file_path in removed:
+            file_id = known[file_path][0]
+            connection.execute("DELETE FROM files WHERE id = ?", (file_id,))
+            self.project_index.remove_entries(connection, file_id)
+        connection.commit()
+
+        count = connection.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+        self.signals.finished.emit(self.generation, count)
+
+    def index_file(self, connection, file_path, file_id, stat):
+        try:
+            with open(file_path, encoding='utf-8', errors='replace') as file:
+                text = file.read()
+        except OSError:
+            return
+
+        if file_id is None:
+            file_id = connection.execute(
+                "INSERT INTO files (path, mtime, size) VALUES (?, ?, ?)",
+                (file_path, stat.st_mtime, stat.st_size)).lastrowid
+        else:
+            connection.execute("UPDATE files SET mtime = ?, size = ? WHERE id = ?",
+                               (stat.st_mtime, stat.st_size, file_id))
+            self.project_index.remove_entries(connection, file_id)
+        self.project_index.index_text(connection, file_id, file_path, text)
+
+
+class ProjectIndex(QObject):
+    # Основа индексов по файлам папки проекта. Индекс строится и обновляется
+    # в фоновом потоке, запросы выполняются в главном потоке по готовой базе.
+    # Наследники задают kind, create_tables, index_text и remove_entries;
+    # последние три вызываются в фоновом потоке
+    kind = None
+
+    indexing_progress = pyqtSignal(int)
+    indexing_finished = pyqtSignal(int)
+    indexing_failed = pyqtSignal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.root = None
+        self.database_path = None
+        self.connection = None
+        self.generation = 0
+        self.cancel_event = threading.Event()
+
+        self.thread_pool = QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(1)
+
+        self.signals = _IndexSignals()
+        self.signals.progress.connect(self.on_progress)
+        self.signals.finished.connect(self.on_finished)
+        self.signals.failed.connect(self.on_failed)
+
+        QCoreApplication.instance().aboutToQuit.connect(self.shutdown)
+
+    def shutdown(self):
+        self.cancel_event.set()
+        self.thread_pool.waitForDone()
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def open_database(self, path):
+        connection = sqlite3.connect(path)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute('''CREATE TABLE IF NOT EXISTS files (
+            id INTEGER PRIMARY KEY,
+            path TEXT UNIQUE NOT NULL,
+            mtime REAL NOT NULL,
+            size INTEGER NOT NULL)''')
+        self.create_tables(connection)
+        connection.commit()
+        return connection
+
+    def create_tables(self, connection):
+        pass
+
+    def index_text(self, connection, file_id, file_path, text):
+        pass
+
+    def remove_entries(self, connection, file_id):
+        pass
+
+    def set_root(self, root):
+        root = os.path.abspath(root)
+        if root == self.root:
+            return
+        # Обход прежней папки больше не нужен
+        self.cancel_event.set()
+        self.thread_pool.clear()
+        self.cancel_event = threading.Event()
+        self.generation += 1
+
+        if self.connection is not None:
+            self.connection.close()
+        self.root = root
+        self.database_path = index_path(root, self.kind)
+        self.connection = self.open_database(self.database_path)
+        self.start_task(None)
+
+    def update_files(self, file_paths):
+        if self.root is None:
+            return
+        root = os.path.join(self.root, '')
+        file_paths = [os.path.abspath(path) for path in file_paths]
+        file_paths = [path for path in file_paths
+                      if path.startswith(root) and is_indexed_file(path)]
+        if file_paths:
+            self.start_task(file_paths)
+
+    def start_task(self, file_paths):
+        self.thread_pool.start(_IndexTask(
+            self, self.generation, file_paths, self.cancel_event))
+
+    def on_progress(self, generation, count):
+        if generation == self.generation:
+            self.indexing_progress.emit(count)
+
+    def on_finished(self, generation, count):
+        if generation == self.generation:
+            self.indexing_finished.emit(count)
+
+    def on_failed(self, generation, error):
+        if generation == self.generation:
+            self.indexing_failed.emit(error)
@@ -0,0 +1,430 @@
+import os
+import json
+import bisect
+import sqlite3
+
+from PyQt6.QtCore import (Qt, QAbstractItemModel, QCoreApplication, QModelIndex, QObject,
+                          QRunnable, QThreadPool, pyqtSignal)
+from PyQt6.QtWidgets import QFileIconProvider
+
+from project_index import index_path, is_indexed_file
+
+# Число строк, добавляемых в дерево за раз для больших папок
+TREE_FETCH_BATCH = 1000
+# Число потоков чтения папок
+TREE_LISTING_THREADS = 2
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif", ".bmp", ".svg", ".webp")
+
+DIRECTORY, PAGE, IMAGE = "dir", "md", "image"
+
+
+def is_image_file(file_path):
+    return file_path.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def entry_sort_key(entry):
+    # Папки перед файлами, имена без учета регистра
+    name, kind = entry
+    return kind != DIRECTORY, name.lower(), name
+
+
+def list_directory(directory):
+    # Содержимое папки, нужное дереву: вложенные папки, страницы и
+    # изображения в порядке показа. Скрытые файлы и остальные типы
+    # пропускаются
+    entries = []
+    with os.scandir(directory) as iterator:
+        for entry in iterator:
+            if entry.name.startswith('.'):
+                continue
+            try:
+                if entry.is_dir():
+                    entries.append((entry.name, DIRECTORY))
+                elif is_indexed_file(entry.name):
+                    entries.append((entry.name, PAGE))
+                elif is_image_file(entry.name):
+                    entries.append((entry.name, IMAGE))
+            except OSError:
+                continue
+    entries.sort(key=entry_sort_key)
+    return entries
+
+
+class _ListSignals(QObject):
+    listed = pyqtSignal(int, str, float, object)
+    unchanged = pyqtSignal(int, str)
+    failed = pyqtSignal(int, str)
+
+
+class _ListTask(QRunnable):
+    # Чтение одной папки. Если mtime папки совпадает с закэшированным,
+    # папка не читается
+    def __init__(self, generation, directory, cached_mtime, signals):
+        super().__init__()
+        self.generation = generation
+        self.directory = directory
+        self.cached_mtime = cached_mtime
+        self.signals = signals
+
+    def run(self):
+        try:
+            mtime = os.stat(self.directory).st_mtime
+            if mtime == self.cached_mtime:
+                self.signals.unchanged.emit(self.generation, self.directory)
+                return
+            entries = list_directory(self.directory)
+        except OSError:
+            self.signals.failed.emit(self.generation, self.directory)
+            return
+        self.signals.listed.emit(self.generation, self.directory, mtime, entries)
+
+
+class _TreeNode:
+    __slots__ = ("name", "directory_path", "kind", "parent", "entries", "row_count", "requested")
+
+    def __init__(self, name, kind, parent, directory_path=None):
+        self.name = name
+        # Путь хранится только у папок, путь файла собирается по запросу
+        self.directory_path = directory_path
+        self.kind = kind
+        self.parent = parent
+        # Все дочерние узлы по порядку; в дереве показаны первые row_count
+        self.entries = None
+        self.row_count = 0
+        self.requested = False
+
+    @property
+    def path(self):
+        return self.directory_path or os.path.join(self.parent.path, self.name)
+
+    def sort_key(self):
+        return entry_sort_key((self.name, self.kind))
+
+
+class ProjectTreeModel(QAbstractItemModel):
+    # Дерево папки проекта: только папки, страницы .md и, по желанию,
+    # изображения. Папки читаются в фоне при первом раскрытии, большие
+    # папки показываются порциями. Содержимое папок кэшируется в SQLite
+    # вместе с mtime папки: закэшированная папка показывается сразу, а
+    # в фоне только сверяется mtime
+    directory_loaded = pyqtSignal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.root = None
+        self.root_node = None
+        self.nodes = {}
+        self.generation = 0
+        self.show_images = False
+        self.connection = None
+        # Идет вставка порции строк: представления и прокси могут вызвать
+        # fetchMore повторно изнутри beginInsertRows
+        self.fetching = False
+        self.icon_provider = QFileIconProvider()
+        self.icons = {
+            DIRECTORY: self.icon_provider.icon(QFileIconProvider.IconType.Folder),
+            PAGE: self.icon_provider.icon(QFileIconProvider.IconType.File),
+            IMAGE: self.icon_provider.icon(QFileIconProvider.IconType.File),
+        }
+
+        self.thread_pool = QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(TREE_LISTING_THREADS)
+
+        self.signals = _ListSignals()
+        self.signals.listed.connect(self.on_listed)
+        self.signals.unchanged.connect(self.on_unchanged)
+        self.signals.failed.connect(self.on_failed)
+
+        QCoreApplication.instance().aboutToQuit.connect(self.shutdown)
+
+    def shutdown(self):
+        self.thread_pool.clear()
+        self.thread_pool.waitForDone()
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def open_cache(self, root):
+        try:
+            connection = sqlite3.connect(index_path(root, "tree"))
+            connection.execute('''CREATE TABLE IF NOT EXISTS listings (
+                path TEXT PRIMARY KEY,
+                mtime REAL NOT NULL,
+                entries TEXT NOT NULL)''')
+            connection.commit()
+            return connection
+        except sqlite3.Error as e:
+            print(f"Ошибка при открытии кэша дерева файлов: {e}")
+            return None
+
+    def cached_listing(self, directory):
+        if self.connection is None:
+            return None
+        try:
+            row = self.connection.execute(
+                "SELECT mtime, entries FROM listings WHERE path = ?", (directory,)).fetchone()
+        except sqlite3.Error:
+            return None
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def store_listing(self, directory, mtime, entries):
+        if self.connection is None:
+            return
+        try:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO listings (path, mtime, entries) VALUES (?, ?, ?)",
+                (directory, mtime, json.dumps(entries, ensure_ascii=False)))
+            self.connection.commit()
+        except sqlite3.Error as e:
+            print(f"Ошибка при записи кэша дерева файлов: {e}")
+
+    def set_root(self, root):
+        root = os.path.abspath(root)
+        if root == self.root:
+            return
+        self.generation += 1
+        self.thread_pool.clear()
+        if self.connection is not None:
+            self.connection.close()
+
+        self.beginResetModel()
+        self.root = root
+        self.root_node = _TreeNode(os.path.basename(root), DIRECTORY, None, root)
+        self.nodes = {root: self.root_node}
+        self.connection = self.open_cache(root)
+        self.endResetModel()
+        self.request_listing(self.root_node)
+
+    def set_show_images(self, show_images):
+        # Изображения есть в кэше вместе со страницами, поэтому для их
+        # показа папки заново не читаются
+        if show_images == self.show_images:
+            return
+        self.show_images = show_images
+        for node in list(self.nodes.values()):
+            if self.nodes.get(node.path) is node and node.entries is not None:
+                cached = self.cached_listing(node.path)
+                if cached is not None:
+                    self.apply_listing(node, cached[1])
+
+    def request_listing(self, node):
+        node.requested = True
+        cached = self.cached_listing(node.path)
+        cached_mtime = None
+        if cached is not None:
+            cached_mtime = cached[0]
+            self.apply_listing(node, cached[1])
+        self.thread_pool.start(
+            _ListTask(self.generation, node.path, cached_mtime, self.signals))
+
+    def on_listed(self, generation, directory, mtime, entries):
+        if generation != self.generation:
+            return
+        self.store_listing(directory, mtime, entries)
+        node = self.nodes.get(directory)
+        if node is not None:
+            self.apply_listing(node, entries)
+            self.directory_loaded.emit(directory)
+
+    def on_unchanged(self, generation, directory):
+        if generation == self.generation and directory in self.nodes:
+            self.directory_loaded.emit(directory)
+
+    def on_failed(self, generation, directory):
+        # Папка удалена: ее содержимое перечитывается у родителя
+        if generation != self.generation:
+            return
+        node = self.nodes.get(directory)
+        if node is None:
+            return
+        if node.parent is None:
+            self.apply_listing(node, [])
+        else:
+            self.refresh_directory(node.parent.path)
+
+    def apply_listing(self, node, entries):
+        # Сравнение со старым содержимым: раскрытые вложенные папки
+        # сохраняются, строки удаляются и вставляются по одной
+        entries = [(name, kind) for name, kind in entries
+                   if kind != IMAGE or self.show_images]
+        if not node.entries:
+            self.fill_node(node, entries)
+            return
+
+        old = {child.name: child for child in node.entries}
+        new = dict(entries)
+        added = [(name, kind) for name, kind in entries
+                 if name not in old or old[name].kind != kind]
+        if len(added) > TREE_FETCH_BATCH:
+            # Много новых строк: папка заполняется заново
+            self.clear_node(node)
+            self.fill_node(node, entries)
+            return
+
+        parent_index = self.node_index(node)
+        for row in range(len(node.entries) - 1, -1, -1):
+            child = node.entries[row]
+            if new.get(child.name) == child.kind:
+                continue
+            if row < node.row_count:
+                self.beginRemoveRows(parent_index, row, row)
+                del node.entries[row]
+                node.row_count -= 1
+                self.forget_node(child)
+                self.endRemoveRows()
+            else:
+                del node.entries[row]
+                self.forget_node(child)
+
+        for name, kind in added:
+            child = self.create_node(node, name, kind)
+            row = bisect.bisect_left(node.entries, child.sort_key(), key=_TreeNode.sort_key)
+            # Строка видна, если попадает в уже показанную часть папки
+            if row < node.row_count or node.row_count == len(node.entries):
+                self.beginInsertRows(parent_index, row, row)
+                node.entries.insert(row, child)
+                node.row_count += 1
+                self.endInsertRows()
+            else:
+                node.entries.insert(row, child)
+
+    def create_node(self, parent, name, kind):
+        if kind != DIRECTORY:
+            return _TreeNode(name, kind, parent)
+        node = _TreeNode(name, kind, parent, os.path.join(parent.directory_path, name))
+        self.nodes[node.directory_path] = node
+        return node
+
+    def fill_node(self, node, entries):
+        # Первая порция строк показывается сразу, остальные по мере прокрутки.
+        # Содержимое папок приходит уже упорядоченным
+        node.entries = [self.create_node(node, name, kind) for name, kind in entries]
+        node.row_count = 0
+        self.fetch_rows(node)
+
+    def clear_node(self, node):
+        if node.row_count:
+            self.beginRemoveRows(self.node_index(node), 0, node.row_count - 1)
+            node.row_count = 0
+            self.endRemoveRows()
+        for child in node.entries:
+            self.forget_node(child)
+        node.entries = []
+
+    def forget_node(self, node):
+        if node.kind != DIRECTORY:
+            return
+        prefix = os.path.join(node.path, '')
+        for path in [path for path in self.nodes
+                     if path == node.path or path.startswith(prefix)]:
+            del self.nodes[path]
+
+    def fetch_rows(self, node):
+        count = min(TREE_FETCH_BATCH, len(node.entries or ()) - node.row_count)
+        if count <= 0 or self.fetching:
+            return
+        self.fetching = True
+        try:
+            self.beginInsertRows(self.node_index(node), node.row_count,
+                                 node.row_count + count - 1)
+            node.row_count += count
+            self.endInsertRows()
+        finally:
+            self.fetching = False
+
+    def refresh_directory(self, directory):
+        node = self.nodes.get(directory)
+        if node is not None and node.requested:
+            self.thread_pool.start(_ListTask(self.generation, directory, None, self.signals))
+
+    def on_files_changed(self, file_paths):
+        # Перечитываются только уже показанные папки. Для файла в новой
+        # папке перечитывается ближайшая известная папка над ней
+        if self.root is None:
+            return
+        directories = set()
+        for file_path in file_paths:
+            directory = os.path.dirname(file_path)
+            while len(directory) > len(self.root):
+                node = self.nodes.get(directory)
+                if node is not None and node.requested:
+                    break
+                directory = os.path.dirname(directory)
+            directories.add(directory)
+        for directory in directories:
+            self.refresh_directory(directory)
+
+    def node(self, index):
+        if index.isValid():
+            return index.internalPointer()
+        return self.root_node
+
+    def node_index(self, node):
+        if node is None or node.parent is None:
+            return QModelIndex()
+        # Строки папки упорядочены, поэтому номер строки ищется делением пополам
+        row = bisect.bisect_left(node.parent.entries, node.sort_key(), key=_TreeNode.sort_key)
+        return self.createIndex(row, 0, node)
+
+    def file_path(self, index):
+        node = self.node(index)
+        return node.path if node is not None else None
+
+    def is_dir(self, index):
+        node = self.node(index)
+        return node is not None and node.kind == DIRECTORY
+
+    def index(self, row, column, parent=QModelIndex()):
+        node = self.node(parent)
+        if node is None or column != 0 or not 0 <= row < node.row_count:
+            return QModelIndex()
+        return self.createIndex(row, 0, node.entries[row])
+
+    def parent(self, index=QModelIndex()):
+        if not index.isValid():
+            return QModelIndex()
+        return self.node_index(index.internalPointer().parent)
+
+    def rowCount(self, parent=QModelIndex()):
+        node = self.node(parent)
+        return node.row_count if node is not None else 0
+
+    def columnCount(self, parent=QModelIndex()):
+        return 1
+
+    def hasChildren(self, parent=QModelIndex()):
+        node = self.node(parent)
+        if node is None or node.kind != DIRECTORY:
+            return False
+        # Непрочитанная папка считается непустой, чтобы ее можно было раскрыть
+        return node.entries is None or bool(node.entries)
+
+    def canFetchMore(self, parent):
+        node = self.node(parent)
+        if node is None or node.kind != DIRECTORY or self.fetching:
+            return False
+        return not node.requested or node.row_count < len(node.entries or ())
+
+    def fetchMore(self, parent):
+        node = self.node(parent)
+        if node is None:
+            return
+        if not node.requested:
+            self.request_listing(node)
+        else:
+            self.fetch_rows(node)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        node = index.internalPointer()
+        if role == Qt.ItemDataRole.DisplayRole:
+            return node.name
+        if role == Qt.ItemDataRole.DecorationRole:
+            return self.icons[node.kind]
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return node.path
+        return None
@@ -0,0 +1,319 @@
+import os
+import json
+import hashlib
+
+from PyQt6.QtCore import (QCoreApplication, QObject, QRunnable, QThreadPool, QTimer, pyqtSignal)
+from PyQt6.QtGui import QTextCursor
+
+from documents import string_index, utf16_length
+from session import app_data_dir
+
+# Период автосохранения, мс
+AUTOSAVE_INTERVAL_MS = 5000
+# Журнал пересобирается в один снимок, когда в нем накопилось
+# столько записей или столько байт правок
+JOURNAL_COMPACT_RECORDS = 256
+JOURNAL_COMPACT_BYTES = 4 * 1024 * 1024
+
+JOURNAL_SUFFIX = ".journal"
+
+
+def recovery_dir():
+    path = os.path.join(app_data_dir(), "recovery")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def read_journal(journal_path):
+    # Журнал - строки JSON: заголовок с исходным текстом (или ссылкой на
+    # файл и его хэш), затем правки [позиция, удалено, вставлено] и
+    # записи {"path": ...} при смене пути. Позиция и число удаленных
+    # символов записаны, как их сообщает QTextDocument, в единицах UTF-16.
+    # Недописанный при сбое хвост отбрасывается. Возвращает (id вкладки,
+    # путь, текст)
+    with open(journal_path, encoding='utf-8') as file:
+        lines = file.read().split('\n')
+
+    header = json.loads(lines[0])
+    session_id = header["session_id"]
+    file_path = header.get("path")
+    if "text" in header:
+        text = header["text"]
+    else:
+        with open(header["base_path"], encoding='utf-8') as file:
+            text = file.read()
+        if hashlib.sha1(text.encode('utf-8')).hexdigest() != header["base_hash"]:
+            raise ValueError(f"Файл изменился: {header['base_path']}")
+
+    for line in lines[1:]:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            break
+        if isinstance(record, dict):
+            file_path = record.get("path", file_path)
+            continue
+        position, removed, inserted = record
+        start = string_index(text, position)
+        end = string_index(text, position + removed)
+        text = text[:start] + inserted + text[end:]
+
+    return session_id, file_path, text
+
+
+def journal_files(directory=None):
+    directory = directory or recovery_dir()
+    return [os.path.join(directory, name) for name in sorted(os.listdir(directory))
+            if name.endswith(JOURNAL_SUFFIX)]
+
+
+class _JournalSignals(QObject):
+    compact_failed = pyqtSignal(str, str)
+
+
+class _JournalTask(QRunnable):
+    # Все операции с журналами выполняет один поток, поэтому запись,
+    # сжатие и удаление одного журнала идут в порядке постановки
+    def __init__(self, action, journal_path, signals, data=None):
+        super().__init__()
+        self.action = action
+        self.journal_path = journal_path
+        self.signals = signals
+        self.data = data
+
+    def run(self):
+        try:
+            getattr(self, self.action)()
+        except Exception as e:
+            if self.action == "compact":
+                self.signals.compact_failed.emit(self.journal_path, str(e))
+            else:
+                print(f"Ошибка при записи журнала восстановления: {e}")
+
+    def write(self):
+        self.append('w')
+
+    def append(self, mode='a'):
+        with open(self.journal_path, mode, encoding='utf-8') as file:
+            file.write(self.data)
+            file.flush()
+            os.fsync(file.fileno())
+
+    def compact(self):
+        session_id, file_path, text = read_journal(self.journal_path)
+        temp_path = self.journal_path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            file.write(json.dumps({"session_id": session_id, "path": file_path,
+                                   "text": text}, ensure_ascii=False) + '\n')
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, self.journal_path)
+
+    def remove(self):
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+
+
+class _Journal:
+    # Состояние журнала одного документа в главном потоке
+    def __init__(self, document, text_document, journal_path):
+        self.document = document
+        self.text_document = text_document
+        self.journal_path = journal_path
+        self.edits = []
+        self.header = None
+        self.started = False
+        self.file_path = document.file_path
+        self.length = text_document.characterCount() - 1
+        self.records = 0
+        self.size = 0
+
+
+class AutosaveManager(QObject):
+    # Периодическое автосохранение несохраненных документов. В журнал
+    # документа дописываются только правки с прошлой записи, полный текст
+    # попадает туда лишь при сжатии журнала в фоновом потоке
+    def __init__(self, interval_ms=AUTOSAVE_INTERVAL_MS, directory=None, parent=None):
+        super().__init__(parent)
+        self.directory = directory or recovery_dir()
+        self.journals = {}
+
+        self.thread_pool = QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(1)
+
+        self.signals = _JournalSignals()
+        self.signals.compact_failed.connect(self.on_compact_failed)
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(max(1000, int(interval_ms)))
+        self.timer.timeout.connect(self.flush)
+
+        QCoreApplication.instance().aboutToQuit.connect(self.shutdown)
+
+    def start(self):
+        # Запись начинается после того, как журналы прошлого запуска разобраны
+        self.remove_stale_journals()
+        self.timer.start()
+
+    def shutdown(self):
+        self.timer.stop()
+        self.thread_pool.waitForDone()
+
+    def journal_path(self, document):
+        return os.path.join(self.directory, document.session_id + JOURNAL_SUFFIX)
+
+    def submit(self, action, journal_path, data=None):
+        self.thread_pool.start(_JournalTask(action, journal_path, self.signals, data))
+
+    def attach(self, document, text_document):
+        # Вызывается для каждого нового редактора документа
+        journal = self.journals.get(document)
+        if journal is not None and journal.started:
+            self.submit("remove", journal.journal_path)
+        journal = _Journal(document, text_document, self.journal_path(document))
+        self.journals[document] = journal
+        text_document.contentsChange.connect(
+            lambda position, removed, added: self.on_contents_change(
+                journal, position, removed, added))
+
+    def detach(self, document):
+        journal = self.journals.pop(document, None)
+        if journal is not None and journal.started:
+            self.submit("remove", journal.journal_path)
+
+    def reset(self, document):
+        # Документ совпадает с файлом: журнал больше не нужен
+        journal = self.journals.get(document)
+        if journal is None:
+            return
+        if journal.started:
+            self.submit("remove", journal.journal_path)
+        journal.started = False
+        journal.header = None
+        journal.edits = []
+        journal.length = journal.text_document.characterCount() - 1
+
+    def remove_stale_journals(self):
+        active = {journal.journal_path for journal in self.journals.values()
+                  if journal.started}
+        for journal_path in journal_files(self.directory):
+            if journal_path not in active:
+                self.submit("remove", journal_path)
+
+    def discard_all(self):
+        for document in list(self.journals):
+            self.detach(document)
+        self.remove_stale_journals()
+        self.thread_pool.waitForDone()
+
+    def on_contents_change(self, journal, position, removed, added):
+        if self.journals.get(journal.document) is not journal:
+            return
+
+        if not journal.started and journal.header is None:
+            # Первая правка после загрузки или сохранения: исходным текстом
+            # служит сам файл, пока его хэш известен
+            document = journal.document
+            if (document.file_path and document.content_hash is not None
+                    and not journal.text_document.isModified()):
+                journal.header = {"base_path": document.file_path,
+                                  "base_hash": document.content_hash}
+            else:
+                journal.header = {}
+
+        if journal.header == {} and not journal.started:
+            # Снимок будет сделан при записи, правки до него не нужны
+            return
+
+        # Qt иногда сообщает изменение с захватом завершающего блока,
+        # поэтому вставленный участок ограничивается концом документа
+        end = min(position + added, journal.text_document.characterCount() - 1)
+        inserted = ""
+        if end > position:
+            cursor = QTextCursor(journal.text_document)
+            cursor.setPosition(position)
+            cursor.setPosition(end, QTextCursor.MoveMode.KeepAnchor)
+            inserted = cursor.selectedText().replace('\u2029', '\n')
+        journal.length += utf16_length(inserted) - min(removed, journal.length - position)
+
+        # Набор текста подряд склеивается в одну правку. Позиции - в
+        # единицах UTF-16, как у QTextDocument
+        if journal.edits:
+            last = journal.edits[-1]
+            last_length = utf16_length(last[2])
+            if removed == 0 and position == last[0] + last_length:
+                last[2] += inserted
+                return
+            if (not inserted and removed <= last_length
+                    and position + removed == last[0] + last_length):
+                last[2] = last[2][:string_index(last[2], last_length - removed)]
+                return
+        journal.edits.append([position, removed, inserted])
+
+    def flush(self):
+        for journal in list(self.journals.values()):
+            document = journal.document
+            if not document.is_dirty:
+                if journal.started or journal.header is not None:
+                    self.reset(document)
+                continue
+            if journal.header is None:
+                continue
+            self.flush_journal(journal)
+
+    def flush_journal(self, journal):
+        text_document = journal.text_document
+        document = journal.document
+        length = text_document.characterCount() - 1
+        lines = []
+
+        if journal.started and journal.length == length:
+            if journal.file_path != document.file_path:
+                lines.append(json.dumps({"path": document.file_path}, ensure_ascii=False))
+            lines.extend(json.dumps(edit, ensure_ascii=False) for edit in journal.edits)
+            action = "append"
+        else:
+            # Журнал начинается заново: со ссылки на файл, если она есть, или
+            # с полного снимка, если накопленные правки разошлись с текстом
+            header = {"session_id": document.session_id, "path": document.file_path}
+            if not journal.started and journal.header and journal.length == length:
+                header.update(journal.header)
+                lines.append(json.dumps(header, ensure_ascii=False))
+                lines.extend(json.dumps(edit, ensure_ascii=False) for edit in journal.edits)
+            else:
+                header["text"] = text_document.toPlainText()
+                journal.header = {}
+                lines.append(json.dumps(header, ensure_ascii=False))
+            action = "write"
+            journal.records = 0
+            journal.size = 0
+
+        journal.file_path = document.file_path
+        journal.length = length
+        journal.edits = []
+        if not lines:
+            return
+
+        data = '\n'.join(lines) + '\n'
+        self.submit(action, journal.journal_path, data)
+        journal.started = True
+        journal.records += len(lines)
+        journal.size += len(data)
+
+        # Журнал со ссылкой на файл сразу пересобирается в снимок, чтобы
+        # не зависеть от последующих изменений файла
+        if ((action == "write" and journal.header)
+                or journal.records > JOURNAL_COMPACT_RECORDS
+                or journal.size > JOURNAL_COMPACT_BYTES):
+            self.submit("compact", journal.journal_path)
+            journal.records = 0
+            journal.size = 0
+
+    def on_compact_failed(self, journal_path, error):
+        # Журнал не удалось собрать: при следующей записи он начнется
+        # с полного снимка текста
+        print(f"Ошибка при сжатии журнала восстановления: {error}")
+        for journal in self.journals.values():
+            if journal.journal_path == journal_path:
+                journal.started = False
+                journal.header = {}
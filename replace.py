@@ -0,0 +1,536 @@
+import os
+import re
+import time
+import hashlib
+import threading
+import itertools
+import multiprocessing
+from concurrent.futures import (ProcessPoolExecutor, FIRST_COMPLETED, wait as wait_futures)
+from concurrent.futures.process import BrokenProcessPool
+
+from PyQt6.QtCore import (Qt, QCoreApplication, QObject, QRunnable, QThreadPool, pyqtSignal)
+from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QFormLayout, QLineEdit,
+                             QCheckBox, QPushButton, QLabel, QListWidget, QListWidgetItem,
+                             QPlainTextEdit, QProgressBar, QSplitter)
+
+from file_io import write_file_atomic
+from project_index import project_files
+
+# Число файлов, передаваемых процессу за раз
+REPLACE_CHUNK_SIZE = 32
+# Число порций в очереди на каждый процесс
+REPLACE_QUEUE_DEPTH = 2
+# Строк предпросмотра на файл
+REPLACE_PREVIEW_LINES = 50
+# Длина строки в предпросмотре, символов
+REPLACE_PREVIEW_WIDTH = 200
+# Период проверки отмены при ожидании процессов, с
+REPLACE_POLL_INTERVAL = 0.1
+
+
+def replace_options(find, replacement, use_regex, case_sensitive):
+    # Параметры замены в виде, пригодном для передачи процессам:
+    # (шаблон, флаги, замена, замена без подстановки групп).
+    # Ошибка в шаблоне или в ссылках на группы дает re.error
+    flags = re.MULTILINE if case_sensitive else re.MULTILINE | re.IGNORECASE
+    pattern = find if use_regex else re.escape(find)
+    regex = re.compile(pattern, flags)
+    if use_regex:
+        regex.sub(replacement, '')
+    return pattern, flags, replacement, not use_regex
+
+
+def preview_line(text, start, end):
+    line_start = text.rfind('\n', 0, start) + 1
+    line_end = text.find('\n', end)
+    if line_end < 0:
+        line_end = len(text)
+    return line_start, line_end
+
+
+def replace_all(text, options, preview_limit=0):
+    # Возвращает (новый текст, число замен, [(номер строки, было, стало)]);
+    # предпросмотр строится по позициям замен без сравнения текстов
+    pattern, flags, replacement, literal = options
+    regex = re.compile(pattern, flags)
+    spans = []
+    delta = 0
+
+    def substitute(match):
+        nonlocal delta
+        new = replacement if literal else match.expand(replacement)
+        if len(spans) < preview_limit:
+            new_start = match.start() + delta
+            spans.append((match.start(), match.end(), new_start, new_start + len(new)))
+        delta += len(new) - (match.end() - match.start())
+        return new
+
+    new_text, count = regex.subn(substitute, text)
+
+    preview = []
+    line_number, counted_to, last_line_end = 0, 0, -1
+    for start, end, new_start, new_end in spans:
+        line_start, line_end = preview_line(text, start, end)
+        if line_start <= last_line_end and preview:
+            continue  # замена в уже показанной строке
+        new_line_start, new_line_end = preview_line(new_text, new_start, new_end)
+        line_number += text.count('\n', counted_to, line_start)
+        counted_to = line_start
+        preview.append((line_number + 1,
+                        text[line_start:line_end][:REPLACE_PREVIEW_WIDTH],
+                        new_text[new_line_start:new_line_end][:REPLACE_PREVIEW_WIDTH]))
+        last_line_end = line_end
+    return new_text, count, preview
+
+
+def read_text(file_path):
+    # Текст и хэш содержимого файла; переводы строк приводятся к '\n'
+    with open(file_path, 'rb') as file:
+        data = file.read()
+    text = data.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+    return text, hashlib.sha1(data).hexdigest()
+
+
+def scan_files(chunk, options, max_size):
+    # Выполняется в процессе пула. chunk - [(путь, текст или None)]: текст
+    # передается для открытых вкладок, остальные файлы читаются с диска.
+    # Возвращает (просмотрено файлов, [(путь, замен, хэш, предпросмотр, ошибка)])
+    # только для файлов с совпадениями или ошибками
+    results = []
+    for file_path, text in chunk:
+        try:
+            digest = None
+            if text is None:
+                if os.path.getsize(file_path) > max_size:
+                    continue
+                text, digest = read_text(file_path)
+            _, count, preview = replace_all(text, options, REPLACE_PREVIEW_LINES)
+            if count:
+                results.append((file_path, count, digest, preview, None))
+        except Exception as e:
+            results.append((file_path, 0, None, [], str(e)))
+    return len(chunk), results
+
+
+def apply_files(chunk, options):
+    # Выполняется в процессе пула. chunk - [(путь, хэш при поиске)]; файл,
+    # изменившийся после поиска, не трогается.
+    # Возвращает (обработано файлов, [(путь, замен, ошибка)])
+    results = []
+    for file_path, digest in chunk:
+        try:
+            text, current_digest = read_text(file_path)
+            if current_digest != digest:
+                results.append((file_path, 0, "файл изменился после поиска"))
+                continue
+            new_text, count, _ = replace_all(text, options)
+            if count:
+                write_file_atomic(file_path, new_text)
+            results.append((file_path, count, None))
+        except Exception as e:
+            results.append((file_path, 0, str(e)))
+    return len(chunk), results
+
+
+def chunked(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class _ReplaceSignals(QObject):
+    results = pyqtSignal(int, object)
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal(int, int, float, bool)
+    failed = pyqtSignal(int, str)
+
+
+class _ReplaceTask(QRunnable):
+    # Раздает порции файлов процессам пула и передает результаты в главный
+    # поток по мере готовности. Порций в очереди не больше, чем нужно,
+    # чтобы процессы не простаивали: отмена не ждет всей очереди.
+    # При замене (wait_running) порции, которые процессы уже обрабатывают,
+    # дописывают файлы и после отмены, поэтому их результаты дожидаются
+    def __init__(self, service, generation, items, function, arguments, cancel_event,
+                 wait_running=False):
+        super().__init__()
+        self.wait_running = wait_running
+        self.service = service
+        self.generation = generation
+        self.items = items
+        self.function = function
+        self.arguments = arguments
+        self.signals = service.signals
+        self.cancel_event = cancel_event
+
+    def run(self):
+        started = time.perf_counter()
+        try:
+            done = self.process()
+        except BrokenProcessPool as e:
+            self.service.reset_executor()
+            self.signals.failed.emit(self.generation, f"процесс пула завершился аварийно: {e}")
+            return
+        except Exception as e:
+            self.signals.failed.emit(self.generation, str(e))
+            return
+        self.signals.finished.emit(self.generation, done, time.perf_counter() - started,
+                                   self.cancel_event.is_set())
+
+    def process(self):
+        executor = self.service.executor()
+        limit = self.service.jobs * REPLACE_QUEUE_DEPTH
+        futures = set()
+        done = 0
+
+        def collect(timeout):
+            nonlocal futures, done
+            finished, futures = wait_futures(futures, timeout, FIRST_COMPLETED)
+            for future in finished:
+                count, results = future.result()
+                done += count
+                if results:
+                    self.signals.results.emit(self.generation, results)
+            if finished:
+                self.signals.progress.emit(self.generation, done)
+
+        for chunk in chunked(self.items, REPLACE_CHUNK_SIZE):
+            while len(futures) >= limit and not self.cancel_event.is_set():
+                collect(REPLACE_POLL_INTERVAL)
+            if self.cancel_event.is_set():
+                break
+            futures.add(executor.submit(self.function, chunk, *self.arguments))
+
+        while futures and not self.cancel_event.is_set():
+            collect(REPLACE_POLL_INTERVAL)
+        for future in futures:
+            future.cancel()
+        if self.wait_running:
+            futures = {future for future in futures if not future.cancelled()}
+            while futures:
+                collect(None)
+        return done
+
+
+class ProjectReplace(QObject):
+    # Поиск и замена по файлам папки проекта в отдельных процессах.
+    # Результаты приходят порциями; запись - атомарная подмена файла.
+    # Открытые вкладки сюда передаются текстом и меняются через свои
+    # документы в главном потоке, а не перечитыванием файла
+    results_found = pyqtSignal(object)
+    progress = pyqtSignal(int)
+    finished = pyqtSignal(int, float, bool)
+    failed = pyqtSignal(str)
+    applied = pyqtSignal(object, float, bool)
+
+    def __init__(self, jobs=None, parent=None):
+        super().__init__(parent)
+        self.jobs = jobs or os.cpu_count() or 1
+        self.generation = 0
+        self.mode = None
+        self.applied_results = []
+        self.cancel_event = threading.Event()
+        self.executor_lock = threading.Lock()
+        self.process_pool = None
+
+        self.thread_pool = QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(1)
+
+        self.signals = _ReplaceSignals()
+        self.signals.results.connect(self.on_results)
+        self.signals.progress.connect(self.on_progress)
+        self.signals.finished.connect(self.on_finished)
+        self.signals.failed.connect(self.on_failed)
+
+        QCoreApplication.instance().aboutToQuit.connect(self.shutdown)
+
+    def executor(self):
+        # Процессы запускаются при первом поиске и живут до выхода
+        with self.executor_lock:
+            if self.process_pool is None:
+                self.process_pool = ProcessPoolExecutor(
+                    max_workers=self.jobs, mp_context=multiprocessing.get_context("spawn"))
+            return self.process_pool
+
+    def reset_executor(self):
+        with self.executor_lock:
+            if self.process_pool is not None:
+                self.process_pool.shutdown(wait=False, cancel_futures=True)
+                self.process_pool = None
+
+    def shutdown(self):
+        self.cancel()
+        self.thread_pool.waitForDone()
+        self.reset_executor()
+
+    def is_running(self):
+        return self.mode is not None
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def start(self, mode, items, function, arguments, applied_results=()):
+        self.cancel()
+        self.cancel_event = threading.Event()
+        self.generation += 1
+        self.mode = mode
+        self.applied_results = list(applied_results)
+        self.thread_pool.start(_ReplaceTask(
+            self, self.generation, items, function, arguments, self.cancel_event,
+            wait_running=mode == "apply"))
+
+    def scan(self, root, options, open_texts, max_size):
+        # open_texts - {путь: текст} открытых вкладок; файлы, которые
+        # открылись бы в просмотрщике (больше max_size), пропускаются
+        open_paths = {os.path.normcase(os.path.abspath(path)) for path in open_texts}
+        disk_files = (path for path in project_files(root)
+                      if os.path.normcase(os.path.abspath(path)) not in open_paths)
+        items = itertools.chain(open_texts.items(), ((path, None) for path in disk_files))
+        self.start("scan", items, scan_files, (options, max_size))
+
+    def apply(self, files, options, applied_results=()):
+        # files - [(путь, хэш при поиске)]; applied_results - уже выполненные
+        # замены в открытых вкладках, они приходят в applied вместе с остальными
+        self.start("apply", list(files), apply_files, (options,), applied_results)
+
+    def on_results(self, generation, results):
+        if generation != self.generation:
+            return
+        if self.mode == "apply":
+            self.applied_results.extend(results)
+        else:
+            self.results_found.emit(results)
+
+    def on_progress(self, generation, done):
+        if generation == self.generation:
+            self.progress.emit(done)
+
+    def on_finished(self, generation, done, seconds, cancelled):
+        if generation != self.generation:
+            return
+        mode, self.mode = self.mode, None
+        if mode == "apply":
+            self.applied.emit(self.applied_results, seconds, cancelled)
+        else:
+            self.finished.emit(done, seconds, cancelled)
+
+    def on_failed(self, generation, error):
+        if generation != self.generation:
+            return
+        self.mode = None
+        self.failed.emit(error)
+
+
+class ProjectReplaceDialog(QDialog):
+    # Поиск и замена по проекту: найденные файлы с флажками, предпросмотр
+    # изменений выбранного файла, замена в отмеченных файлах
+    search_requested = pyqtSignal(object)
+    replace_requested = pyqtSignal(object, object)
+    file_activated = pyqtSignal(str)
+
+    def __init__(self, replace_service, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Замена в проекте")
+        self.resize(900, 600)
+        self.replace_service = replace_service
+        self.root = ""
+        self.options = None
+        self.results = {}
+        self.match_count = 0
+        self.file_count = 0
+
+        self.find_edit = QLineEdit(self)
+        self.find_edit.setPlaceholderText("Найти")
+        self.replace_edit = QLineEdit(self)
+        self.replace_edit.setPlaceholderText("Заменить на")
+        self.regex_check = QCheckBox("Регулярное выражение", self)
+        self.case_check = QCheckBox("Учитывать регистр", self)
+        self.case_check.setChecked(True)
+
+        self.search_button = QPushButton("Найти", self)
+        self.search_button.setDefault(True)
+        self.search_button.clicked.connect(self.start_search)
+        self.cancel_button = QPushButton("Остановить", self)
+        self.cancel_button.setEnabled(False)
+        self.cancel_button.clicked.connect(replace_service.cancel)
+        self.replace_button = QPushButton("Заменить в отмеченных", self)
+        self.replace_button.setEnabled(False)
+        self.replace_button.clicked.connect(self.start_replace)
+        self.find_edit.returnPressed.connect(self.start_search)
+
+        self.progress_bar = QProgressBar(self)
+        self.progress_bar.setRange(0, 0)
+        self.progress_bar.hide()
+        self.status_label = QLabel(self)
+        self.status_label.setStyleSheet("color: gray;")
+
+        self.results_list = QListWidget(self)
+        self.results_list.currentItemChanged.connect(self.show_preview)
+        self.results_list.itemActivated.connect(
+            lambda item: self.file_activated.emit(item.data(Qt.ItemDataRole.UserRole)))
+        self.preview_edit = QPlainTextEdit(self)
+        self.preview_edit.setReadOnly(True)
+        self.preview_edit.setLineWrapMode(QPlainTextEdit.LineWrapMode.NoWrap)
+
+        form = QFormLayout()
+        form.addRow("Найти:", self.find_edit)
+        form.addRow("Заменить на:", self.replace_edit)
+
+        options_layout = QHBoxLayout()
+        options_layout.addWidget(self.regex_check)
+        options_layout.addWidget(self.case_check)
+        options_layout.addStretch()
+        options_layout.addWidget(self.search_button)
+        options_layout.addWidget(self.cancel_button)
+        options_layout.addWidget(self.replace_button)
+
+        splitter = QSplitter(Qt.Orientation.Horizontal, self)
+        splitter.addWidget(self.results_list)
+        splitter.addWidget(self.preview_edit)
+        splitter.setSizes([300, 600])
+
+        layout = QVBoxLayout(self)
+        layout.addLayout(form)
+        layout.addLayout(options_layout)
+        layout.addWidget(self.progress_bar)
+        layout.addWidget(self.status_label)
+        layout.addWidget(splitter)
+
+        replace_service.results_found.connect(self.add_results)
+        replace_service.progress.connect(self.on_progress)
+        replace_service.finished.connect(self.on_finished)
+        replace_service.failed.connect(self.on_failed)
+        replace_service.applied.connect(self.on_applied)
+
+    def focus_find(self):
+        self.find_edit.setFocus()
+        self.find_edit.selectAll()
+
+    def set_busy(self, busy):
+        self.progress_bar.setVisible(busy)
+        self.cancel_button.setEnabled(busy)
+        self.search_button.setEnabled(not busy)
+        self.replace_button.setEnabled(not busy and bool(self.results))
+
+    def start_search(self):
+        if not self.find_edit.text() or self.replace_service.is_running():
+            return
+        try:
+            self.options = replace_options(
+                self.find_edit.text(), self.replace_edit.text(),
+                self.regex_check.isChecked(), self.case_check.isChecked())
+        except re.error as e:
+            self.status_label.setText(f"Ошибка в шаблоне: {e}")
+            return
+
+        self.results.clear()
+        self.match_count = 0
+        self.file_count = 0
+        self.results_list.clear()
+        self.preview_edit.clear()
+        self.status_label.setText("Поиск...")
+        self.set_busy(True)
+        self.search_requested.emit(self.options)
+
+    def add_results(self, results):
+        for file_path, count, digest, preview, error in results:
+            self.results[file_path] = (count, digest, preview, error)
+            name = os.path.relpath(file_path, self.root) if self.root else file_path
+            if error is None:
+                item = QListWidgetItem(f"{name} ({count})")
+                item.setFlags(item.flags() | Qt.ItemFlag.ItemIsUserCheckable)
+                item.setCheckState(Qt.CheckState.Checked)
+                self.match_count += count
+                self.file_count += 1
+            else:
+                item = QListWidgetItem(f"{name}: {error}")
+                item.setForeground(Qt.GlobalColor.red)
+            item.setToolTip(file_path)
+            item.setData(Qt.ItemDataRole.UserRole, file_path)
+            self.results_list.addItem(item)
+
+    def on_progress(self, done):
+        self.status_label.setText(
+            f"Просмотрено файлов: {done}, совпадений: {self.match_count} "
+            f"в {self.file_count} файлах")
+
+    def on_finished(self, done, seconds, cancelled):
+        self.set_busy(False)
+        rate = done / seconds if seconds > 0 else 0
+        state = "Остановлено" if cancelled else "Готово"
+        self.status_label.setText(
+            f"{state}: просмотрено файлов {done} за {seconds:.2f} с ({rate:.0f} файлов/с), "
+            f"совпадений {self.match_count} в {self.file_count} файлах")
+
+    def on_failed(self, error):
+        self.set_busy(False)
+        self.status_label.setText(f"Ошибка: {error}")
+
+    def show_preview(self, item):
+        if item is None:
+            self.preview_edit.clear()
+            return
+        count, _, preview, error = self.results[item.data(Qt.ItemDataRole.UserRole)]
+        if error is not None:
+            self.preview_edit.setPlainText(error)
+            return
+        lines = []
+        for line_number, old_line, new_line in preview:
+            lines += [f"Строка {line_number}:", f"- {old_line}", f"+ {new_line}", ""]
+        if count > len(preview):
+            lines.append(f"... всего замен: {count}")
+        self.preview_edit.setPlainText('\n'.join(lines))
+
+    def checked_results(self):
+        # [(путь, хэш при поиске)] отмеченных файлов без ошибок
+        checked = []
+        for row in range(self.results_list.count()):
+            item = self.results_list.item(row)
+            if item.checkState() == Qt.CheckState.Checked:
+                file_path = item.data(Qt.ItemDataRole.UserRole)
+                checked.append((file_path, self.results[file_path][1]))
+        return checked
+
+    def start_replace(self):
+        files = self.checked_results()
+        if not files or self.replace_service.is_running():
+            return
+        self.status_label.setText("Замена...")
+        self.set_busy(True)
+        self.replace_requested.emit(files, self.options)
+
+    def on_applied(self, results, seconds, cancelled):
+        # Файлы, в которых выполнена замена, больше не отмечаются: для
+        # повторной замены нужен новый поиск
+        applied = {file_path: (count, error) for file_path, count, error in results}
+        replaced = 0
+        errors = 0
+        for row in range(self.results_list.count()):
+            item = self.results_list.item(row)
+            result = applied.get(item.data(Qt.ItemDataRole.UserRole))
+            if result is None:
+                continue
+            count, error = result
+            item.setFlags(item.flags() & ~Qt.ItemFlag.ItemIsUserCheckable)
+            item.setData(Qt.ItemDataRole.CheckStateRole, None)
+            if error is None:
+                replaced += count
+            else:
+                errors += 1
+                item.setText(f"{item.text()}: {error}")
+                item.setForeground(Qt.GlobalColor.red)
+
+        self.set_busy(False)
+        self.replace_button.setEnabled(False)
+        rate = len(results) / seconds if seconds > 0 else 0
+        message = "Остановлено. " if cancelled else ""
+        message += f"Заменено: {replaced} в {len(results) - errors} файлах за {seconds:.2f} с " \
+                  f"({rate:.0f} файлов/с)"
+        if errors:
+            message += f", ошибок: {errors}"
+        self.status_label.setText(message)
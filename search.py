@@ -0,0 +1,178 @@
+import os
+import re
+import sqlite3
+from functools import lru_cache
+
+from PyQt6.QtCore import (Qt, QTimer, pyqtSignal)
+from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QLineEdit, QLabel, QListWidget,
+                             QListWidgetItem)
+
+from project_index import ProjectIndex
+# Наибольшее число результатов поиска
+SEARCH_RESULTS_LIMIT = 200
+# Задержка поиска после ввода запроса, мс
+SEARCH_DELAY_MS = 150
+
+WORD_RE = re.compile(r'\w+')
+CYRILLIC_RE = re.compile(r'[а-я]')
+
+# Упрощенный стеммер Портера для русского языка (Snowball)
+RV_RE = re.compile(r'^(.*?[аеиоуыэюя])(.*)$')
+PERFECTIVE_GERUND_RE = re.compile(
+    r'((ив|ивши|ившись|ыв|ывши|ывшись)|((?<=[ая])(в|вши|вшись)))$')
+REFLEXIVE_RE = re.compile(r'(с[яь])$')
+ADJECTIVE_RE = re.compile(
+    r'(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых|ую|юю|ая|яя|ою|ею)$')
+PARTICIPLE_RE = re.compile(r'((ивш|ывш|ующ)|((?<=[ая])(ем|нн|вш|ющ|щ)))$')
+VERB_RE = re.compile(
+    r'((ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|ено|ят|ует|уют|ит|ыт|'
+    r'ены|ить|ыть|ишь|ую|ю)|((?<=[ая])(ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)))$')
+NOUN_RE = re.compile(
+    r'(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|ем|ам|ом|о|у|ах|иях|ях|'
+    r'ы|ь|ию|ью|ю|ия|ья|я)$')
+DERIVATIONAL_RE = re.compile(r'.*[^аеиоуыэюя]+[аеиоуыэюя].*ость?$')
+DERIVATIONAL_SUFFIX_RE = re.compile(r'ость?$')
+SUPERLATIVE_RE = re.compile(r'(ейше|ейш)$')
+
+
+@lru_cache(maxsize=65536)
+def stem(word):
+    word = word.lower().replace('ё', 'е')
+    if not CYRILLIC_RE.search(word):
+        return word
+    match = RV_RE.match(word)
+    if not match:
+        return word
+
+    prefix, rv = match.groups()
+    stripped = PERFECTIVE_GERUND_RE.sub('', rv, 1)
+    if stripped == rv:
+        rv = REFLEXIVE_RE.sub('', rv, 1)
+        stripped = ADJECTIVE_RE.sub('', rv, 1)
+        if stripped != rv:
+            rv = PARTICIPLE_RE.sub('', stripped, 1)
+        else:
+            stripped = VERB_RE.sub('', rv, 1)
+            rv = NOUN_RE.sub('', rv, 1) if stripped == rv else stripped
+    else:
+        rv = stripped
+
+    if rv.endswith('и'):
+        rv = rv[:-1]
+    if DERIVATIONAL_RE.match(rv):
+        rv = DERIVATIONAL_SUFFIX_RE.sub('', rv, 1)
+    if rv.endswith('ь'):
+        rv = rv[:-1]
+    else:
+        rv = SUPERLATIVE_RE.sub('', rv, 1)
+        if rv.endswith('нн'):
+            rv = rv[:-1]
+    return prefix + rv
+
+
+def tokenize(text):
+    return [stem(word) for word in WORD_RE.findall(text)]
+
+
+class SearchService(ProjectIndex):
+    # Полнотекстовый индекс папки проекта. Обратный индекс - таблица FTS5
+    # с уже приведенными к основе словами, поэтому склонения находятся
+    # без морфологии на стороне SQLite
+    kind = "search"
+
+    def create_tables(self, connection):
+        connection.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS terms
+            USING fts5(words, tokenize = 'unicode61 remove_diacritics 0')''')
+
+    def index_text(self, connection, file_id, file_path, text):
+        name = os.path.splitext(os.path.basename(file_path))[0]
+        words = ' '.join(tokenize(name + '\n' + text))
+        connection.execute("INSERT INTO terms (rowid, words) VALUES (?, ?)", (file_id, words))
+
+    def remove_entries(self, connection, file_id):
+        connection.execute("DELETE FROM terms WHERE rowid = ?", (file_id,))
+
+    def search(self, query, limit=SEARCH_RESULTS_LIMIT):
+        # Все слова запроса должны встретиться в файле; каждое слово
+        # ищется как префикс основы. Возвращает [(путь, оценка)]
+        words = tokenize(query)
+        if self.connection is None or not words:
+            return []
+        match = ' '.join(f'"{word}"*' for word in words)
+        try:
+            rows = self.connection.execute('''SELECT files.path, bm25(terms) AS rank
+                FROM terms JOIN files ON files.id = terms.rowid
+                WHERE terms MATCH ? ORDER BY rank LIMIT ?''', (match, limit))
+            return [(path, -rank) for path, rank in rows]
+        except sqlite3.Error as e:
+            print(f"Ошибка при поиске: {e}")
+            return []
+
+
+class SearchPanel(QWidget):
+    # Панель поиска по проекту: строка запроса и список найденных файлов
+    file_activated = pyqtSignal(str)
+
+    def __init__(self, search_service, parent=None):
+        super().__init__(parent)
+        self.search_service = search_service
+
+        self.query_edit = QLineEdit(self)
+        self.query_edit.setPlaceholderText("Поиск по проекту")
+        self.query_edit.setClearButtonEnabled(True)
+
+        self.status_label = QLabel(self)
+        self.status_label.setStyleSheet("color: gray;")
+
+        self.results_list = QListWidget(self)
+        self.results_list.itemActivated.connect(self.on_item_activated)
+        self.results_list.itemClicked.connect(self.on_item_activated)
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.query_edit)
+        layout.addWidget(self.status_label)
+        layout.addWidget(self.results_list)
+
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DELAY_MS)
+        self.search_timer.timeout.connect(self.run_search)
+        self.query_edit.textChanged.connect(self.search_timer.start)
+        self.query_edit.returnPressed.connect(self.run_search)
+
+        search_service.indexing_progress.connect(
+            lambda count: self.status_label.setText(f"Индексирование... {count}"))
+        search_service.indexing_finished.connect(self.on_indexing_finished)
+        search_service.indexing_failed.connect(
+            lambda error: self.status_label.setText(f"Ошибка индексирования: {error}"))
+
+    def focus_query(self):
+        self.query_edit.setFocus()
+        self.query_edit.selectAll()
+
+    def on_indexing_finished(self, count):
+        self.status_label.setText(f"Файлов в индексе: {count}")
+        if self.query_edit.text().strip():
+            self.run_search()
+
+    def run_search(self):
+        self.search_timer.stop()
+        self.results_list.clear()
+        query = self.query_edit.text()
+        if not query.strip():
+            return
+
+        root = self.search_service.root or ''
+        for file_path, _ in self.search_service.search(query):
+            item = QListWidgetItem(os.path.relpath(file_path, root))
+            item.setToolTip(file_path)
+            item.setData(Qt.ItemDataRole.UserRole, file_path)
+            self.results_list.addItem(item)
+        if self.results_list.count() == 0:
+            self.status_label.setText("Ничего не найдено")
+        else:
+            self.status_label.setText(f"Найдено файлов: {self.results_list.count()}")
+
+    def on_item_activated(self, item):
+        self.file_activated.emit(item.data(Qt.ItemDataRole.UserRole))
@@ -0,0 +1,85 @@
+import os
+import sqlite3
+
+from PyQt6.QtCore import (QSettings, QStandardPaths)
+
+# Задержка записи изменившихся вкладок, мс
+SESSION_SAVE_DELAY_MS = 2000
+
+
+def app_settings():
+    # Настройки приложения в формате по умолчанию: обычно это реестр или
+    # plist, а замер переключает его на INI-файл во временной папке
+    return QSettings(QSettings.defaultFormat(), QSettings.Scope.UserScope,
+                     "harakki", "PlantCareEditor")
+
+
+def app_data_dir():
+    # Каталог данных приложения рядом с настройками QSettings
+    base_dir = QStandardPaths.writableLocation(
+        QStandardPaths.StandardLocation.GenericDataLocation)
+    path = os.path.join(base_dir, "harakki", "PlantCareEditor")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+class SessionStore:
+    # Состояние открытых вкладок в SQLite. Для сохраненных файлов хранятся
+    # только путь, позиция курсора и прокрутки и хэш содержимого, текст
+    # записывается лишь для несохраненных буферов
+    def __init__(self, path=None):
+        if path is None:
+            path = os.path.join(app_data_dir(), "session.sqlite3")
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute('''CREATE TABLE IF NOT EXISTS tabs (
+            tab_id TEXT PRIMARY KEY,
+            position INTEGER NOT NULL,
+            path TEXT,
+            cursor INTEGER NOT NULL DEFAULT 0,
+            scroll INTEGER NOT NULL DEFAULT 0,
+            content_hash TEXT,
+            body TEXT)''')
+        self.connection.commit()
+
+    def load(self):
+        rows = self.connection.execute(
+            "SELECT tab_id, path, cursor, scroll, content_hash, body FROM tabs ORDER BY position")
+        return [dict(zip(("tab_id", "path", "cursor", "scroll", "content_hash", "body"), row))
+                for row in rows]
+
+    def save_tabs(self, tab_ids, changed_tabs):
+        # tab_ids - порядок всех открытых вкладок, changed_tabs - записи
+        # только для вкладок, изменившихся с прошлого сохранения. Запись
+        # без ключа body оставляет сохраненный ранее текст как есть
+        with self.connection:
+            placeholders = ",".join("?" * len(tab_ids))
+            self.connection.execute(
+                f"DELETE FROM tabs WHERE tab_id NOT IN ({placeholders})", tab_ids)
+            for tab in changed_tabs:
+                if "body" in tab:
+                    self.connection.execute('''INSERT INTO tabs
+                        (tab_id, position, path, cursor, scroll, content_hash, body)
+                        VALUES (:tab_id, 0, :path, :cursor, :scroll, :content_hash, :body)
+                        ON CONFLICT(tab_id) DO UPDATE SET path = excluded.path,
+                            cursor = excluded.cursor, scroll = excluded.scroll,
+                            content_hash = excluded.content_hash, body = excluded.body''', tab)
+                else:
+                    self.connection.execute('''INSERT INTO tabs
+                        (tab_id, position, path, cursor, scroll, content_hash)
+                        VALUES (:tab_id, 0, :path, :cursor, :scroll, :content_hash)
+                        ON CONFLICT(tab_id) DO UPDATE SET path = excluded.path,
+                            cursor = excluded.cursor, scroll = excluded.scroll,
+                            content_hash = excluded.content_hash''', tab)
+            self.connection.executemany(
+                "UPDATE tabs SET position = ? WHERE tab_id = ?",
+                enumerate(tab_ids))
+
+    def clear(self):
+        with self.connection:
+            self.connection.execute("DELETE FROM tabs")
+
+    def close(self):
+        self.connection.close()
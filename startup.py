@@ -0,0 +1,76 @@
+import sys
+import time
+
+from PyQt6.QtCore import (QEvent, QObject, QTimer, pyqtSignal)
+
+# Если окно не отрисовалось (например, запущено свернутым), отложенная
+# часть запуска начинается по таймеру, мс
+FIRST_PAINT_TIMEOUT_MS = 1000
+
+
+class StartupProfiler(QObject):
+    # Этапы запуска окна. Ловит первую отрисовку окна, после которой
+    # достраивается отложенная часть интерфейса. С enabled=True
+    # (--profile-startup) время этапов, время до первой отрисовки и до
+    # готовности к работе печатаются в stderr
+    first_paint = pyqtSignal()
+
+    def __init__(self, enabled=False, start_time=None, parent=None):
+        super().__init__(parent)
+        self.enabled = enabled
+        self.start_time = start_time if start_time is not None else time.perf_counter()
+        self.last_time = self.start_time
+        self.phases = []
+        self.paint_time = None
+        self.window = None
+        self.finished = False
+
+        self.paint_timer = QTimer(self)
+        self.paint_timer.setSingleShot(True)
+        self.paint_timer.setInterval(FIRST_PAINT_TIMEOUT_MS)
+        self.paint_timer.timeout.connect(self.on_first_paint)
+
+    def mark(self, phase):
+        # Завершение этапа: время с конца предыдущего этапа
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last_time))
+        self.last_time = now
+
+    def watch(self, window):
+        self.window = window
+        window.installEventFilter(self)
+        self.paint_timer.start()
+
+    def eventFilter(self, source, event):
+        if source is self.window and event.type() == QEvent.Type.Paint:
+            # Отложенная часть начнется после того, как отрисовка завершится
+            QTimer.singleShot(0, self.on_first_paint)
+            source.removeEventFilter(self)
+        return False
+
+    def on_first_paint(self):
+        if self.paint_time is not None:
+            return
+        self.paint_timer.stop()
+        self.mark("первая отрисовка")
+        self.paint_time = self.last_time
+        self.first_paint.emit()
+
+    def finish(self):
+        if self.finished:
+            return
+        self.finished = True
+        self.mark("готовность к работе")
+        if self.enabled:
+            self.report()
+
+    def report(self):
+        lines = ["Замер запуска:"]
+        for phase, duration in self.phases:
+            lines.append(f"  {phase:<34}{duration * 1000:9.1f} мс")
+        if self.paint_time is not None:
+            lines.append(f"  {'до первой отрисовки':<34}"
+                         f"{(self.paint_time - self.start_time) * 1000:9.1f} мс")
+        lines.append(f"  {'до готовности к работе':<34}"
+                     f"{(self.last_time - self.start_time) * 1000:9.1f} мс")
+        print('\n'.join(lines), file=sys.stderr)
@@ -0,0 +1,343 @@
+import os
+import re
+from datetime import date, timedelta
+
+from PyQt6.QtCore import (Qt, QCoreApplication, QDate, QObject, QRunnable, QThreadPool,
+                          pyqtSignal)
+from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QFormLayout, QLineEdit,
+                             QListWidget, QListWidgetItem, QPlainTextEdit, QLabel, QPushButton,
+                             QSpinBox, QDateEdit, QFileDialog, QDialogButtonBox, QSplitter)
+
+from file_io import write_file_atomic
+from metadata import FIELD_RE, HEADING_RE
+from session import app_data_dir
+
+# Папка шаблонов в каталогах приложения, пользователя и проекта
+TEMPLATES_DIR_NAME = "templates"
+# Шаблоны, поставляемые вместе с программой
+BUNDLED_TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                     TEMPLATES_DIR_NAME)
+# Имя файлов при массовом создании страниц по умолчанию
+DEFAULT_NAME_PATTERN = "{template}-{date}.md"
+# Наибольшее число страниц за одно массовое создание
+MAX_BULK_PAGES = 1000
+
+# Откуда взят шаблон; шаблон проекта заменяет одноименный шаблон
+# пользователя, а тот - встроенный
+SOURCE_BUNDLED = "встроенный"
+SOURCE_USER = "пользователя"
+SOURCE_PROJECT = "проекта"
+
+# Незаполненный заголовок с датой: "## Дата: "
+EMPTY_DATE_HEADING_RE = re.compile(r'^(#{1,6}[ \t]+Дата:)[ \t]*$', re.MULTILINE)
+
+
+def user_templates_dir():
+    return os.path.join(app_data_dir(), TEMPLATES_DIR_NAME)
+
+
+def template_fields(text):
+    # Незаполненные поля шаблона: "- **Дата полива:** " и "## Дата: "
+    fields = []
+    for line in text.split('\n'):
+        heading = HEADING_RE.match(line)
+        if heading:
+            label, colon, value = heading.group(2).partition(':')
+            if colon and not value.strip():
+                fields.append(label.strip())
+            continue
+        field = FIELD_RE.match(line)
+        if field and not field.group(2):
+            fields.append(field.group(1).strip())
+    return fields
+
+
+def fill_template(text, page_date, number):
+    # Подстановки для создаваемой страницы: {{date}} и {{n}} в тексте,
+    # а незаполненный заголовок "Дата:" получает дату страницы
+    value = page_date.strftime("%d.%m.%Y")
+    text = text.replace("{{date}}", value).replace("{{n}}", str(number))
+    return EMPTY_DATE_HEADING_RE.sub(lambda match: f"{match.group(1)} {value}", text)
+
+
+def page_file_name(pattern, template_name, page_date, number):
+    return pattern.format(template=template_name, date=page_date.isoformat(), n=number)
+
+
+class Template:
+    def __init__(self, name, file_path, source, mtime, size, text):
+        self.name = name
+        self.file_path = file_path
+        self.source = source
+        self.mtime = mtime
+        self.size = size
+        self.text = text
+        self.fields = template_fields(text)
+
+
+class _BulkSignals(QObject):
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal(object, object)
+
+
+class _BulkCreateTask(QRunnable):
+    # Запись страниц по шаблону. Существующие файлы не перезаписываются
+    def __init__(self, pages, signals):
+        super().__init__()
+        self.pages = pages
+        self.signals = signals
+
+    def run(self):
+        created, failed = [], []
+        for number, (file_path, content) in enumerate(self.pages, 1):
+            if os.path.exists(file_path):
+                failed.append((file_path, "файл уже существует"))
+            else:
+                try:
+                    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+                    write_file_atomic(file_path, content)
+                    created.append(file_path)
+                except OSError as e:
+                    failed.append((file_path, str(e)))
+            self.signals.progress.emit(number, len(self.pages))
+        self.signals.finished.emit(created, failed)
+
+
+class TemplateService(QObject):
+    # Каталог шаблонов из папок программы, пользователя и проекта.
+    # Прочитанные шаблоны и их поля хранятся в памяти и перечитываются,
+    # только если у файла изменились время изменения или размер
+    pages_progress = pyqtSignal(int, int)
+    pages_created = pyqtSignal(object, object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        # Путь к файлу -> Template
+        self.cache = {}
+
+        self.thread_pool = QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(1)
+        self.signals = _BulkSignals()
+        self.signals.progress.connect(self.pages_progress)
+        self.signals.finished.connect(self.pages_created)
+
+        QCoreApplication.instance().aboutToQuit.connect(self.shutdown)
+
+    def shutdown(self):
+        self.thread_pool.waitForDone()
+
+    def locations(self, project_root):
+        locations = [(BUNDLED_TEMPLATES_DIR, SOURCE_BUNDLED),
+                     (user_templates_dir(), SOURCE_USER)]
+        if project_root:
+            locations.append((os.path.join(project_root, TEMPLATES_DIR_NAME), SOURCE_PROJECT))
+        return locations
+
+    def templates(self, project_root=None):
+        # Шаблоны по имени в алфавитном порядке
+        catalog = {}
+        seen = set()
+        for directory, source in self.locations(project_root):
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            for entry in entries:
+                if not entry.name.lower().endswith(".md") or not entry.is_file():
+                    continue
+                template = self.load(entry, source)
+                if template is not None:
+                    seen.add(template.file_path)
+                    catalog[os.path.splitext(entry.name)[0]] = template
+
+        # Удаленные шаблоны забываются
+        for file_path in set(self.cache) - seen:
+            del self.cache[file_path]
+        return [catalog[name] for name in sorted(catalog, key=str.lower)]
+
+    def load(self, entry, source):
+        try:
+            stat = entry.stat()
+        except OSError:
+            return None
+        template = self.cache.get(entry.path)
+        if (template is not None and template.source == source
+                and (template.mtime, template.size) == (stat.st_mtime, stat.st_size)):
+            return template
+        try:
+            with open(entry.path, encoding='utf-8') as file:
+                text = file.read()
+        except (OSError, UnicodeDecodeError) as e:
+            print(f"Ошибка при чтении шаблона: {e}")
+            return None
+        template = Template(os.path.splitext(entry.name)[0], entry.path, source,
+                            stat.st_mtime, stat.st_size, text)
+        self.cache[entry.path] = template
+        return template
+
+    def create_pages(self, template, directory, name_pattern, count, start_date):
+        # Тексты страниц готовятся сразу, запись идет в фоне
+        pages = []
+        for number in range(1, count + 1):
+            page_date = start_date + timedelta(days=number - 1)
+            file_name = page_file_name(name_pattern, template.name, page_date, number)
+            pages.append((os.path.join(directory, file_name),
+                          fill_template(template.text, page_date, number)))
+        self.thread_pool.start(_BulkCreateTask(pages, self.signals))
+
+
+class TemplatePickerDialog(QDialog):
+    # Выбор шаблона из каталога с предпросмотром. Результат - шаблон
+    # и то, что с ним сделать: открыть новую вкладку или создать страницы
+    def __init__(self, templates, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Создать из шаблона")
+        self.resize(760, 480)
+        self.templates = templates
+        self.bulk = False
+
+        self.filter_edit = QLineEdit(self)
+        self.filter_edit.setPlaceholderText("Поиск шаблона")
+        self.filter_edit.textChanged.connect(self.apply_filter)
+
+        self.template_list = QListWidget(self)
+        for template in templates:
+            item = QListWidgetItem(f"{template.name} ({template.source})")
+            item.setData(Qt.ItemDataRole.UserRole, template)
+            item.setToolTip(template.file_path)
+            self.template_list.addItem(item)
+        self.template_list.currentItemChanged.connect(self.show_template)
+        self.template_list.itemActivated.connect(self.accept)
+
+        self.preview = QPlainTextEdit(self)
+        self.preview.setReadOnly(True)
+        self.fields_label = QLabel(self)
+        self.fields_label.setWordWrap(True)
+        self.fields_label.setStyleSheet("color: gray;")
+
+        preview_widget = QSplitter(Qt.Orientation.Vertical, self)
+        preview_widget.addWidget(self.preview)
+        preview_widget.addWidget(self.fields_label)
+
+        splitter = QSplitter(self)
+        splitter.addWidget(self.template_list)
+        splitter.addWidget(preview_widget)
+        splitter.setSizes([250, 510])
+
+        self.buttons = QDialogButtonBox(self)
+        self.create_button = self.buttons.addButton(
+            "Создать", QDialogButtonBox.ButtonRole.AcceptRole)
+        self.bulk_button = self.buttons.addButton(
+            "Создать несколько страниц...", QDialogButtonBox.ButtonRole.ActionRole)
+        self.buttons.addButton(QDialogButtonBox.StandardButton.Cancel)
+        self.buttons.accepted.connect(self.accept)
+        self.buttons.rejected.connect(self.reject)
+        self.bulk_button.clicked.connect(self.accept_bulk)
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.filter_edit)
+        layout.addWidget(splitter)
+        layout.addWidget(self.buttons)
+
+        if templates:
+            self.template_list.setCurrentRow(0)
+        self.update_buttons()
+        self.filter_edit.setFocus()
+
+    def selected_template(self):
+        item = self.template_list.currentItem()
+        if item is not None and not item.isHidden():
+            return item.data(Qt.ItemDataRole.UserRole)
+
+    def apply_filter(self, text):
+        text = text.strip().lower()
+        first_visible = None
+        for row in range(self.template_list.count()):
+            item = self.template_list.item(row)
+            hidden = text not in item.text().lower()
+            item.setHidden(hidden)
+            if not hidden and first_visible is None:
+                first_visible = item
+        current = self.template_list.currentItem()
+        if current is None or current.isHidden():
+            self.template_list.setCurrentItem(first_visible)
+        self.update_buttons()
+
+    def show_template(self, item):
+        template = item.data(Qt.ItemDataRole.UserRole) if item is not None else None
+        self.preview.setPlainText(template.text if template else "")
+        if template and template.fields:
+            self.fields_label.setText("Поля: " + ", ".join(dict.fromkeys(template.fields)))
+        else:
+            self.fields_label.clear()
+        self.update_buttons()
+
+    def update_buttons(self):
+        enabled = self.selected_template() is not None
+        self.create_button.setEnabled(enabled)
+        self.bulk_button.setEnabled(enabled)
+
+    def accept(self):
+        if self.selected_template() is not None:
+            super().accept()
+
+    def accept_bulk(self):
+        self.bulk = True
+        self.accept()
+
+
+class BulkCreateDialog(QDialog):
+    # Параметры массового создания страниц по шаблону
+    def __init__(self, template, directory, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(f"Страницы по шаблону '{template.name}'")
+
+        self.directory_edit = QLineEdit(directory, self)
+        browse_button = QPushButton("Обзор...", self)
+        browse_button.clicked.connect(self.choose_directory)
+        directory_layout = QHBoxLayout()
+        directory_layout.addWidget(self.directory_edit)
+        directory_layout.addWidget(browse_button)
+
+        self.pattern_edit = QLineEdit(DEFAULT_NAME_PATTERN, self)
+        self.pattern_edit.setToolTip(
+            "{template} - имя шаблона, {date} - дата страницы, {n} - номер страницы")
+
+        self.count_spin = QSpinBox(self)
+        self.count_spin.setRange(1, MAX_BULK_PAGES)
+
+        self.date_edit = QDateEdit(QDate.currentDate(), self)
+        self.date_edit.setCalendarPopup(True)
+        self.date_edit.setDisplayFormat("dd.MM.yyyy")
+
+        hint = QLabel("Каждая следующая страница получает следующую дату. Дата "
+                      "подставляется в пустой заголовок 'Дата:' и вместо {{date}}, "
+                      "номер страницы - вместо {{n}}.", self)
+        hint.setWordWrap(True)
+        hint.setStyleSheet("color: gray;")
+
+        buttons = QDialogButtonBox(
+            QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel, self)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+
+        form = QFormLayout()
+        form.addRow("Папка:", directory_layout)
+        form.addRow("Имя файла:", self.pattern_edit)
+        form.addRow("Число страниц:", self.count_spin)
+        form.addRow("Первая дата:", self.date_edit)
+
+        layout = QVBoxLayout(self)
+        layout.addLayout(form)
+        layout.addWidget(hint)
+        layout.addWidget(buttons)
+
+    def choose_directory(self):
+        directory = QFileDialog.getExistingDirectory(
+            self, "Папка для страниц", self.directory_edit.text())
+        if directory:
+            self.directory_edit.setText(directory)
+
+    def start_date(self):
+        value = self.date_edit.date()
+        return date(value.year(), value.month(), value.day())
@@ -0,0 +1,359 @@
+import os
+import re
+import mmap
+from bisect import bisect_right
+
+from PyQt6.QtCore import (Qt, QCoreApplication, QEvent, QObject, QRunnable, QThreadPool,
+                          pyqtSignal)
+from PyQt6.QtWidgets import (QWidget, QHBoxLayout, QVBoxLayout, QPlainTextEdit, QScrollBar,
+                             QComboBox, QLabel)
+
+# Файлы не меньше этого размера открываются только для просмотра, МБ
+VIEWER_THRESHOLD_MB = 64
+# Шаг индекса строк, байт: номер строки запоминается на границе каждого блока
+INDEX_BLOCK_BYTES = 1024 * 1024
+# Через сколько блоков индексатор передает найденные заголовки
+INDEX_BATCH_BLOCKS = 32
+# Наибольшее число заголовков в списке перехода
+MAX_HEADINGS = 20000
+# Длинные строки показываются обрезанными до этого числа байт
+MAX_LINE_BYTES = 4096
+# Прокрутка колесом мыши, строк на шаг
+WHEEL_SCROLL_LINES = 3
+
+# Заголовки Markdown и границы блоков кода, внутри которых заголовков нет
+HEADING_PATTERN = re.compile(rb'^(?:(`{3,}|~{3,})|(#{1,6})[ \t]+([^\r\n]*))', re.MULTILINE)
+
+
+class _IndexSignals(QObject):
+    indexed = pyqtSignal(int, object, object, object, int)
+    finished = pyqtSignal(int, int)
+
+
+class _IndexTask(QRunnable):
+    # Проход по файлу блоками: номер строки на границе каждого блока
+    # и заголовки вне блоков кода. Файл отображается в память заново,
+    # чтобы просмотрщик мог закрыть свое отображение в любой момент
+    def __init__(self, file_path, generation, signals):
+        super().__init__()
+        self.file_path = file_path
+        self.generation = generation
+        self.signals = signals
+        self.cancelled = False
+
+    def run(self):
+        try:
+            with open(self.file_path, 'rb') as file:
+                size = os.fstat(file.fileno()).st_size
+                if size == 0:
+                    self.signals.finished.emit(self.generation, 0)
+                    return
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    self.scan(data, size)
+        except (OSError, ValueError) as e:
+            print(f"Ошибка при индексации файла: {e}")
+
+    def scan(self, data, size):
+        line = 0
+        position = 0
+        fence = None
+        lines, offsets, headings = [], [], []
+        blocks = 0
+        while position < size:
+            if self.cancelled:
+                return
+            end = data.find(b'\n', position + INDEX_BLOCK_BYTES - 1)
+            end = size if end < 0 else end + 1
+            chunk = data[position:end]
+            lines.append(line)
+            offsets.append(position)
+            for match in HEADING_PATTERN.finditer(chunk):
+                if match.group(1):
+                    marker = match.group(1)[:1]
+                    if fence is None:
+                        fence = marker
+                    elif fence == marker:
+                        fence = None
+                elif fence is None:
+                    title = match.group(3).decode('utf-8', 'replace').strip().rstrip('#').strip()
+                    headings.append((position + match.start(), len(match.group(2)), title))
+            line += chunk.count(b'\n')
+            position = end
+
+            blocks += 1
+            if blocks % INDEX_BATCH_BLOCKS == 0:
+                self.signals.indexed.emit(self.generation, lines, offsets, headings, position)
+                lines, offsets, headings = [], [], []
+
+        self.signals.indexed.emit(self.generation, lines, offsets, headings, position)
+        # Последняя строка без перевода строки тоже считается
+        if data[size - 1:size] != b'\n':
+            line += 1
+        self.signals.finished.emit(self.generation, line)
+
+
+class LargeFileViewer(QWidget):
+    # Просмотр очень больших файлов только для чтения. Файл отображается
+    # в память (mmap), на экран и в превью выводятся только видимые
+    # строки; позиция прокрутки - смещение в байтах, поэтому открытие
+    # и прокрутка не ждут индекса. Индекс строк и заголовков строится
+    # в фоне и нужен только для номера строки и перехода по заголовкам
+    position_changed = pyqtSignal(int)
+
+    def __init__(self, file_path, position=0, parent=None):
+        super().__init__(parent)
+        self.file_path = file_path
+        self.file = None
+        self.data = None
+        self.size = 0
+        # Смещение первой видимой строки, байт
+        self.top = 0
+        # Единиц полосы прокрутки в байте: размер файла может не уместиться в int
+        self.scale = 1
+
+        # Индекс: номер строки в начале каждого блока и смещение блока
+        self.index_lines = []
+        self.index_offsets = []
+        self.indexed_size = 0
+        self.line_count = None
+        self.generation = 0
+        self.task = None
+
+        self.thread_pool = QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(1)
+        self.signals = _IndexSignals()
+        self.signals.indexed.connect(self.on_indexed)
+        self.signals.finished.connect(self.on_index_finished)
+        QCoreApplication.instance().aboutToQuit.connect(self.shutdown)
+
+        self.headings_box = QComboBox(self)
+        self.headings_box.setPlaceholderText("Переход к заголовку")
+        self.headings_box.setSizeAdjustPolicy(
+            QComboBox.SizeAdjustPolicy.AdjustToMinimumContentsLengthWithIcon)
+        self.headings_box.setMinimumContentsLength(30)
+        self.headings_box.activated.connect(self.jump_to_heading)
+
+        self.status_label = QLabel(self)
+        self.status_label.setStyleSheet("color: gray;")
+
+        self.source = QPlainTextEdit(self)
+        self.source.setReadOnly(True)
+        self.source.setLineWrapMode(QPlainTextEdit.LineWrapMode.NoWrap)
+        self.source.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.source.installEventFilter(self)
+        self.source.viewport().installEventFilter(self)
+
+        self.scroll_bar = QScrollBar(Qt.Orientation.Vertical, self)
+        self.scroll_bar.valueChanged.connect(self.on_scroll)
+
+        header_layout = QHBoxLayout()
+        header_layout.addWidget(self.headings_box)
+        header_layout.addStretch()
+        header_layout.addWidget(self.status_label)
+
+        content_layout = QHBoxLayout()
+        content_layout.setSpacing(0)
+        content_layout.addWidget(self.source)
+        content_layout.addWidget(self.scroll_bar)
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addLayout(header_layout)
+        layout.addLayout(content_layout)
+
+        self.open_file()
+        self.set_position(position)
+
+    def open_file(self):
+        self.close_file()
+        try:
+            self.file = open(self.file_path, 'rb')
+            self.size = os.fstat(self.file.fileno()).st_size
+            # Пустой файл отобразить в память нельзя
+            if self.size:
+                self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            print(f"Ошибка при открытии файла для просмотра: {e}")
+            self.size = 0
+
+        self.scale = max(1, -(-self.size // 0x7fffffff))
+        self.scroll_bar.blockSignals(True)
+        self.scroll_bar.setRange(0, max(self.size - 1, 0) // self.scale)
+        self.scroll_bar.blockSignals(False)
+        self.start_indexing()
+
+    def close_file(self):
+        self.cancel_indexing()
+        if self.data is not None:
+            self.data.close()
+            self.data = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.size = 0
+
+    def reload(self):
+        # Файл изменился на диске: позиция сохраняется, насколько возможно
+        position = self.top
+        self.open_file()
+        self.set_position(position)
+
+    def shutdown(self):
+        self.cancel_indexing()
+        self.thread_pool.waitForDone()
+
+    def start_indexing(self):
+        self.index_lines, self.index_offsets = [], []
+        self.indexed_size = 0
+        self.line_count = None
+        self.headings_box.clear()
+        self.generation += 1
+        if self.data is None:
+            self.line_count = 0
+            return
+        self.task = _IndexTask(self.file_path, self.generation, self.signals)
+        self.thread_pool.start(self.task)
+
+    def cancel_indexing(self):
+        self.generation += 1
+        if self.task is not None:
+            self.task.cancelled = True
+            self.task = None
+        self.thread_pool.clear()
+
+    def on_indexed(self, generation, lines, offsets, headings, indexed_size):
+        if generation != self.generation:
+            return
+        self.index_lines.extend(lines)
+        self.index_offsets.extend(offsets)
+        self.indexed_size = indexed_size
+        for offset, level, title in headings:
+            if self.headings_box.count() >= MAX_HEADINGS:
+                break
+            self.headings_box.addItem("    " * (level - 1) + title, offset)
+        self.update_status()
+
+    def on_index_finished(self, generation, line_count):
+        if generation != self.generation:
+            return
+        self.task = None
+        self.line_count = line_count
+        self.update_status()
+
+    def jump_to_heading(self, index):
+        offset = self.headings_box.itemData(index)
+        if offset is not None:
+            self.set_position(offset)
+            self.source.setFocus()
+
+    def line_start(self, offset):
+        if offset <= 0 or self.data is None:
+            return 0
+        return self.data.rfind(b'\n', 0, offset) + 1
+
+    def line_number(self, offset):
+        # Номер строки по индексу или None, если индекс еще не дошел до смещения
+        if offset >= self.indexed_size and self.line_count is None:
+            return None
+        block = bisect_right(self.index_offsets, offset) - 1
+        if block < 0:
+            return 0
+        return self.index_lines[block] + self.data[self.index_offsets[block]:offset].count(b'\n')
+
+    def visible_lines(self):
+        line_height = max(self.source.fontMetrics().lineSpacing(), 1)
+        return max(1, self.source.viewport().height() // line_height)
+
+    def read_lines(self, offset, count):
+        lines = []
+        position = offset
+        while len(lines) < count and position < self.size:
+            end = self.data.find(b'\n', position)
+            if end < 0:
+                end = self.size
+            text = self.data[position:min(end, position + MAX_LINE_BYTES)].decode(
+                'utf-8', 'replace').rstrip('\r')
+            if end - position > MAX_LINE_BYTES:
+                text += " …"
+            lines.append(text)
+            position = end + 1
+        return lines
+
+    def set_position(self, offset):
+        self.top = self.line_start(min(max(offset, 0), max(self.size - 1, 0)))
+        self.refresh()
+
+    def scroll_lines(self, count):
+        position = self.top
+        if count > 0:
+            for _ in range(count):
+                end = self.data.find(b'\n', position) if self.data is not None else -1
+                if end < 0 or end + 1 >= self.size:
+                    break
+                position = end + 1
+        else:
+            for _ in range(-count):
+                if position == 0:
+                    break
+                position = self.line_start(position - 1)
+        if position != self.top:
+            self.top = position
+            self.refresh()
+
+    def refresh(self):
+        text = '\n'.join(self.read_lines(self.top, self.visible_lines())) if self.data else ""
+        # Текст меняется только при сдвиге, иначе превью перерисовывалось бы зря
+        if text != self.source.toPlainText():
+            self.source.setPlainText(text)
+
+        self.scroll_bar.blockSignals(True)
+        self.scroll_bar.setPageStep(max(1, self.visible_lines() * 80 // self.scale))
+        self.scroll_bar.setValue(self.top // self.scale)
+        self.scroll_bar.blockSignals(False)
+        self.update_status()
+        self.position_changed.emit(self.top)
+
+    def update_status(self):
+        line = self.line_number(self.top) if self.data is not None else 0
+        if line is None:
+            status = f"Индексация: {self.indexed_size * 100 // max(self.size, 1)}%"
+        elif self.line_count is None:
+            status = f"Строка {line + 1}, индексация: {self.indexed_size * 100 // max(self.size, 1)}%"
+        else:
+            status = f"Строка {line + 1} из {self.line_count}"
+        self.status_label.setText(f"Только просмотр | {status}")
+
+    def on_scroll(self, value):
+        self.set_position(value * self.scale)
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.refresh()
+
+    def eventFilter(self, source, event):
+        if source is self.source.viewport() and event.type() == QEvent.Type.Wheel:
+            steps = event.angleDelta().y() // 120
+            if steps:
+                self.scroll_lines(-steps * WHEEL_SCROLL_LINES)
+            return True
+        if source is self.source and event.type() == QEvent.Type.KeyPress:
+            key = event.key()
+            page = max(1, self.visible_lines() - 1)
+            control = event.modifiers() & Qt.KeyboardModifier.ControlModifier
+            if key == Qt.Key.Key_PageDown:
+                self.scroll_lines(page)
+            elif key == Qt.Key.Key_PageUp:
+                self.scroll_lines(-page)
+            elif key == Qt.Key.Key_Down:
+                self.scroll_lines(1)
+            elif key == Qt.Key.Key_Up:
+                self.scroll_lines(-1)
+            elif key == Qt.Key.Key_Home and control:
+                self.set_position(0)
+            elif key == Qt.Key.Key_End and control:
+                self.set_position(self.size)
+                self.scroll_lines(-page)
+            else:
+                return False
+            return True
+        return super().eventFilter(source, event)
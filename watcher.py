@@ -0,0 +1,178 @@
+import os
+
+from PyQt6.QtCore import (QCoreApplication, QFileSystemWatcher, QObject, QRunnable, QThreadPool,
+                          QTimer, pyqtSignal)
+
+# Окно склейки событий файловой системы, мс
+WATCH_COALESCE_MS = 300
+
+
+def scan_directory(directory):
+    # Снимок папки: имя файла -> (mtime, размер) и список вложенных папок
+    files, subdirectories = {}, []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name.startswith('.'):
+                    continue
+                try:
+                    if entry.is_dir():
+                        subdirectories.append(entry.path)
+                    elif entry.is_file():
+                        stat = entry.stat()
+                        files[entry.name] = (stat.st_mtime, stat.st_size)
+                except OSError:
+                    continue
+    except OSError:
+        return None, []
+    return files, subdirectories
+
+
+def scan_tree(root):
+    snapshots = {}
+    directories = [root]
+    while directories:
+        directory = directories.pop()
+        files, subdirectories = scan_directory(directory)
+        if files is not None:
+            snapshots[directory] = files
+            directories.extend(subdirectories)
+    return snapshots
+
+
+class _ScanSignals(QObject):
+    finished = pyqtSignal(int, object)
+
+
+class _ScanTask(QRunnable):
+    def __init__(self, generation, root, signals):
+        super().__init__()
+        self.generation = generation
+        self.root = root
+        self.signals = signals
+
+    def run(self):
+        self.signals.finished.emit(self.generation, scan_tree(self.root))
+
+
+class FileWatcher(QObject):
+    # Наблюдение за папками проекта и открытыми файлами. События копятся и
+    # раз в WATCH_COALESCE_MS превращаются в один список измененных,
+    # добавленных и удаленных файлов. Изменения в папке определяются
+    # сравнением снимков mtime и размеров, содержимое файлов не читается
+    files_changed = pyqtSignal(list)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.root = None
+        self.generation = 0
+        self.snapshots = {}
+        self.watched_files = set()
+        self.pending_directories = set()
+        self.pending_files = set()
+
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self.on_directory_changed)
+        self.watcher.fileChanged.connect(self.on_file_changed)
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(WATCH_COALESCE_MS)
+        self.timer.timeout.connect(self.flush)
+
+        self.thread_pool = QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(1)
+
+        self.signals = _ScanSignals()
+        self.signals.finished.connect(self.on_scan_finished)
+
+        QCoreApplication.instance().aboutToQuit.connect(self.shutdown)
+
+    def shutdown(self):
+        self.timer.stop()
+        self.thread_pool.waitForDone()
+
+    def set_root(self, root):
+        root = os.path.abspath(root)
+        if root == self.root:
+            return
+        self.root = root
+        self.generation += 1
+        if self.snapshots:
+            self.watcher.removePaths(list(self.snapshots))
+        self.snapshots = {}
+        self.pending_directories.clear()
+        # Первый снимок дерева делается в фоне
+        self.thread_pool.start(_ScanTask(self.generation, root, self.signals))
+
+    def on_scan_finished(self, generation, snapshots):
+        if generation != self.generation:
+            return
+        self.snapshots = snapshots
+        if snapshots:
+            self.watcher.addPaths(list(snapshots))
+
+    def watch_file(self, file_path):
+        file_path = os.path.abspath(file_path)
+        self.watched_files.add(file_path)
+        if os.path.exists(file_path):
+            self.watcher.addPath(file_path)
+
+    def unwatch_file(self, file_path):
+        file_path = os.path.abspath(file_path)
+        self.watched_files.discard(file_path)
+        if file_path in self.watcher.files():
+            self.watcher.removePath(file_path)
+
+    def on_directory_changed(self, directory):
+        self.pending_directories.add(directory)
+        # Таймер не перезапускается, поэтому поток событий не откладывает
+        # обработку бесконечно
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def on_file_changed(self, file_path):
+        self.pending_files.add(file_path)
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def flush(self):
+        changed = set(self.pending_files)
+        self.pending_files.clear()
+
+        directories = list(self.pending_directories)
+        self.pending_directories.clear()
+        while directories:
+            directory = directories.pop()
+            old_files = self.snapshots.get(directory)
+            if old_files is None:
+                continue
+            files, subdirectories = scan_directory(directory)
+            if files is None:
+                # Папка удалена вместе с вложенными
+                prefix = os.path.join(directory, '')
+                for removed in [path for path in self.snapshots
+                                if path == directory or path.startswith(prefix)]:
+                    changed.update(os.path.join(removed, name) for name in self.snapshots[removed])
+                    del self.snapshots[removed]
+                continue
+
+            self.snapshots[directory] = files
+            for name in old_files.keys() | files.keys():
+                if old_files.get(name) != files.get(name):
+                    changed.add(os.path.join(directory, name))
+            for subdirectory in subdirectories:
+                if subdirectory not in self.snapshots:
+                    # Новая папка: ее файлы считаются добавленными
+                    self.snapshots[subdirectory] = {}
+                    self.watcher.addPath(subdirectory)
+                    directories.append(subdirectory)
+
+        # Файл, замененный переименованием, выпадает из наблюдения
+        watched = set(self.watcher.files())
+        for file_path in self.watched_files - watched:
+            if os.path.exists(file_path):
+                self.watcher.addPath(file_path)
+
+        if changed:
+            self.files_changed.emit(sorted(changed))